@@ -32,17 +32,16 @@ if len(clients) == 0:
     print('There are no clients to delete.')
     quit()
     
-for client in clients:
-    name = client['name']
-    print(f"Deleting client '{name}'")
-    greenlight.delete_client(client['id'])
+print(f"Deleting {len(clients)} clients")
+report = greenlight.delete_clients([client['id'] for client in clients], concurrency=8)
 
-clients_after = greenlight.get_admin_clients()
-if len(clients_after) == 0:
+# the report says what happened to each client, so there is no need to list them all again
+not_deleted = [client for client in clients if report[client['id']]['status'] == 'failed']
+if len(not_deleted) == 0:
     print('All clients successfully deleted.')
 else:
-    print(f'{len(clients_after)} of {len(clients)} not deleted:')
-    common.jsonprint(clients_after)
+    print(f'{len(not_deleted)} of {len(clients)} not deleted:')
+    common.jsonprint([{**client, 'error': report[client['id']]['error']} for client in not_deleted])
     raise ValueError('Delete failed')
 
 
@@ -0,0 +1,85 @@
+"""
+    Compare the JSON codecs on payloads shaped like the SDK's traffic.
+    Usage: python benchmarks/bench_codec.py [repeat]
+
+    Encodes shift batches (request bodies of bulk uploads) and decodes extended job records and
+    job list responses, with the standard library and, if it is installed, orjson.  Each timing
+    is the best of repeat runs (default 5).
+"""
+
+import os
+import sys
+import timeit
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from greenlight.codec import JsonCodec, OrjsonCodec, orjson
+
+
+def make_job_extended(i):
+    return {
+        'id': f'{i:032x}',
+        'ext_id_scope': 'scope',
+        'ext_id': f'job-{i}',
+        'title': f'Senior Widget Engineer {i}',
+        'status': 'active',
+        'client_id': f'{i * 7:032x}',
+        'position_id': f'{i * 11:032x}',
+        'contractor_id': f'{i * 13:032x}',
+        'start_date': '2020-01-06',
+        'end_date': '2020-07-06',
+        'projects': [{'project_id': f'{i * 17 + p:032x}', 'rate_currency': 'USD', 'rate': 85.5, 'project_value': None} for p in range(3)],
+        'onboarding': {
+            'status': 'in_progress',
+            'w2_path': {'background_check': 'passed', 'drug_check': 'n/a', 'i9': 'complete', 'w4': 'pending'},
+            'ic_path': {'classification': 'w2-or-ic', 'answers': [{'question_id': f'question-{q}', 'answer': q % 2 == 0} for q in range(12)]},
+            'documents': [{'name': f'Document {d}', 'signed': True, 'signed_at': '2020-01-02T15:04:05-05:00'} for d in range(6)]
+        },
+        'work_location_type': 'offsite',
+        'work_timezone': 'America/New_York',
+        'description': 'Builds and maintains widgets for the widget platform, working with the widget team. ' * 4
+    }
+
+def make_shift(i):
+    return {
+        'job_id': f'{i // 10:032x}',
+        'project_id': f'{i // 50:032x}',
+        'timesheet_id': f'{i // 10:032x}',
+        'time_in': f'2020-01-{6 + i % 5:02d}T08:30:00-05:00',
+        'minutes': 240 + i % 60,
+        'description': 'Regular shift'
+    }
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    codecs = [JsonCodec()] + ([OrjsonCodec()] if orjson is not None else [])
+    job_extended = make_job_extended(1)
+    job_list = [make_job_extended(i) for i in range(500)]
+    shifts = [make_shift(i) for i in range(500)]
+
+    baseline = codecs[0]
+    cases = [
+        ('encode 500 shifts', lambda codec: codec.dumps(shifts), 20),
+        ('decode extended job', lambda codec: codec.loads(encoded_job), 2000),
+        ('decode 500-job list', lambda codec: codec.loads(encoded_list), 5)
+    ]
+    encoded_job = baseline.dumps(job_extended)
+    encoded_list = baseline.dumps(job_list)
+    print(f'extended job {len(encoded_job)} bytes, job list {len(encoded_list) / 1024:.0f} KiB, shift batch {len(baseline.dumps(shifts)) / 1024:.0f} KiB')
+    if orjson is None: print('orjson is not installed; only the standard library is measured')
+
+    for codec in codecs[1:]:
+        for payload in (job_extended, job_list, shifts):
+            assert baseline.loads(codec.dumps(payload)) == payload and codec.loads(baseline.dumps(payload)) == payload
+
+    print(f'{"case":>22}' + ''.join(f'{codec.name + " us":>14}' for codec in codecs))
+    for label, run, number in cases:
+        timings = []
+        for codec in codecs:
+            seconds = min(timeit.repeat(lambda: run(codec), number=number, repeat=repeat))
+            timings.append(seconds / number * 1e6)
+        print(f'{label:>22}' + ''.join(f'{timing:>14.1f}' for timing in timings))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+    Compare grouping shifts into weekly timesheets row by row and with the columnar (numpy) path.
+    Usage: python benchmarks/bench_columnar.py [rows]
+
+    Generates rows (default 1,000,000) shifts over 2,000 jobs and a year of dates with mixed UTC
+    offsets, then times bulk's per-record grouping plus calculate_period_ending per group against
+    columnar.group_timesheet_columns, and checks both give the same groups.
+"""
+
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from greenlight.bulk import _group_partition
+from greenlight.columnar import group_timesheet_columns
+from greenlight.common import calculate_period_ending
+
+JOBS = 2000
+OFFSETS = np.array(['-08:00', '-05:00', '+00:00', '+05:30'])
+
+
+def make_columns(rows):
+    rng = np.random.default_rng(1)
+    days = np.datetime64('2020-01-01') + rng.integers(0, 365, rows).astype('timedelta64[D]')
+    minutes = rng.integers(0, 24 * 60, rows)
+    times = np.char.add(np.char.add(np.datetime_as_string(days, unit='D'), 'T'), np.char.add(
+        np.char.add(np.char.zfill((minutes // 60).astype(str), 2), ':'), np.char.zfill((minutes % 60).astype(str), 2)))
+    return {
+        'job_id': np.char.add('job-', rng.integers(0, JOBS, rows).astype(str)),
+        'time_in': np.char.add(np.char.add(times, ':00'), OFFSETS[rng.integers(0, len(OFFSETS), rows)]),
+        'minutes': rng.integers(30, 600, rows)
+    }
+
+def group_rows(columns):
+    records = ({'type': 'shift', 'job_id': job_id, 'time_in': time_in, 'minutes': minutes}
+        for job_id, time_in, minutes in zip(columns['job_id'].tolist(), columns['time_in'].tolist(), columns['minutes'].tolist()))
+    groups = list(_group_partition(records))
+    for group in groups:
+        group['period_ending'] = calculate_period_ending(shifts=group['shifts'])
+    return groups
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    columns = make_columns(rows)
+
+    started = time.perf_counter()
+    expected = group_rows(columns)
+    row_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    groups = group_timesheet_columns(shifts=columns)
+    columnar_seconds = time.perf_counter() - started
+
+    expected.sort(key=lambda group: (group['job_id'], group['week_ending']))
+    assert groups == expected
+    print(f'{rows} shifts, {len(groups)} timesheets')
+    print(f'{"row by row":>12} {row_seconds:>8.2f} s')
+    print(f'{"columnar":>12} {columnar_seconds:>8.2f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""
+    Compare round-trip time with and without connection pooling, against a local stand-in server.
+    Usage: python benchmarks/bench_pooling.py [requests] [connect_latency_ms]
+
+    The stand-in sleeps connect_latency_ms on every new connection, to approximate the handshake
+    cost of the real API (default 20ms).  Without keep-alive every call pays that cost.
+"""
+
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from greenlight import GreenLight
+from fakeserver import FakeGreenLightServer
+
+
+def run(server, requests_count, keep_alive):
+    connections_before = server.connections
+    with GreenLight('standin', 'apikey', base_url=server.base_url, keep_alive=keep_alive) as greenlight:
+        started = time.perf_counter()
+        for i in range(requests_count):
+            greenlight.get_api_hash()
+        elapsed = time.perf_counter() - started
+    return elapsed, server.connections - connections_before
+
+
+def main():
+    requests_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    connect_latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 20.0) / 1000
+
+    with FakeGreenLightServer(connect_latency=connect_latency) as server:
+        for label, keep_alive in [('no pooling', False), ('pooled', True)]:
+            elapsed, connections = run(server, requests_count, keep_alive)
+            per_request_ms = elapsed / requests_count * 1000
+            print(f'{label:>10}: {requests_count} requests in {elapsed:.3f}s, {per_request_ms:.2f}ms/request, {connections} connections')
+
+
+if __name__ == '__main__':
+    main()
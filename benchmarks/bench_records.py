@@ -0,0 +1,38 @@
+"""
+    Compare the memory held by job records in dict form and in compact (slotted) form.
+    Usage: python benchmarks/bench_records.py [records]
+"""
+
+import os
+import sys
+import tracemalloc
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from greenlight.records import JobRecord
+
+
+def make_job(i):
+    # fields as selected by get_client_active_jobs; values are distinct strings, as they would be from the API
+    return {'title': f'Job title {i}', 'id': f'{i:032x}', 'ext_id_scope': 'scope', 'ext_id': f'ext-{i}'}
+
+def measure(build, count):
+    tracemalloc.start()
+    records = [build(make_job(i)) for i in range(count)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, records
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    dict_bytes, _ = measure(lambda job: job, count)
+    compact_bytes, _ = measure(JobRecord.from_dict, count)
+
+    print(f'{count} job records')
+    print(f'     dict: {dict_bytes / 2**20:7.1f} MiB, {dict_bytes / count:6.0f} bytes/record')
+    print(f'  compact: {compact_bytes / 2**20:7.1f} MiB, {compact_bytes / count:6.0f} bytes/record')
+    print(f'  saving:  {1 - compact_bytes / dict_bytes:.0%}')
+
+
+if __name__ == '__main__':
+    main()
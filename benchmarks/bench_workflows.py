@@ -0,0 +1,116 @@
+"""
+    Throughput and latency of the SDK's main workflows against the local stand-in server.
+    Usage: python benchmarks/bench_workflows.py [--count N] [--concurrency N] [--latency MS] [--error-rate R] [--compression] [workflow ...]
+
+    Workflows are invite (invite_worker), timesheet (create_timesheet_with_shifts_expenses),
+    listing (get_admin_clients) and delete (delete_clients); all of them by default.  Operations
+    are spread over --concurrency threads sharing one GreenLight.  --latency and --jitter delay
+    every API call, --error-rate answers that fraction of calls with 429 (retried by a
+    RateController), to approximate the real API.  --compression turns on gzip in both directions.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import datetime
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from greenlight import GreenLight, RateController
+from greenlight.compression import Compression
+from fakeserver import FakeGreenLightServer
+
+WORKFLOWS = ('invite', 'timesheet', 'listing', 'delete')
+SHIFTS_PER_TIMESHEET = 5
+DELETE_BATCH = 20
+
+
+def percentile(latencies, fraction):
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def timed(operation):
+    def run(i):
+        started = time.perf_counter()
+        operation(i)
+        return time.perf_counter() - started
+    return run
+
+def measure(operation, count, concurrency):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(timed(operation), range(count)))
+    return time.perf_counter() - started, latencies
+
+
+def setup_invite(greenlight, count):
+    client = greenlight.create_client({'name': 'Bench client'}, None)
+    project_id = greenlight.create_project({'client_id': client['id'], 'name': 'Bench project'})['id']
+    position = {'client_id': client['id'], 'title': 'Bench position', 'start_date': datetime.date(2020, 1, 6)}
+    position['id'] = greenlight.create_position(position)['id']
+    pay_by_project = [{'project_id': project_id, 'rate_currency': 'USD', 'rate': 50}]
+
+    def invite(i):
+        worker = {'first_name': 'Bench', 'last_name': f'Worker {i}', 'email': f'worker{i}@example.com', 'phone': '+16175551212'}
+        address = {'street': '1 Main St', 'city': 'Boston', 'state': 'MA', 'zip': '02101', 'country': 'US'}
+        greenlight.invite_worker(position, {'worker': worker, 'address': address}, pay_by_project, f'bench-job-{i}')
+    return invite
+
+def setup_timesheet(greenlight, count):
+    def upload(i):
+        shifts = [{
+            'job_id': f'bench-job-{i}',
+            'time_in': f'2020-01-{day:02d}T09:00:00-05:00',
+            'minutes': 480
+        } for day in range(6, 6 + SHIFTS_PER_TIMESHEET)]
+        greenlight.create_timesheet_with_shifts_expenses({'shifts': shifts, 'expenses': []}, f'bench-timesheet-{i}')
+    return upload
+
+def setup_listing(greenlight, count):
+    return lambda i: greenlight.get_admin_clients()
+
+def setup_delete(greenlight, count):
+    # each operation deletes a batch of clients created up front
+    batches = [[greenlight.create_client({'name': f'Doomed {i}.{c}'}, None)['id'] for c in range(DELETE_BATCH)] for i in range(count)]
+    return lambda i: greenlight.delete_clients(batches[i])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark SDK workflows against a local stand-in server')
+    parser.add_argument('workflows', nargs='*', default=list(WORKFLOWS), help=f'any of {", ".join(WORKFLOWS)}')
+    parser.add_argument('--count', type=int, default=100, help='operations per workflow')
+    parser.add_argument('--concurrency', type=int, default=4, help='threads issuing operations')
+    parser.add_argument('--latency', type=float, default=5.0, help='server-side delay per call, ms')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra random delay per call, up to this many ms')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of calls answered with 429')
+    parser.add_argument('--compression', action='store_true', help='negotiate gzip request and response bodies')
+    parser.add_argument('--clients', type=int, default=200, help='clients seeded for the listing workflow')
+    args = parser.parse_args()
+    for workflow in args.workflows:
+        if workflow not in WORKFLOWS: parser.error(f'unknown workflow {workflow}')
+
+    with FakeGreenLightServer(latency=args.latency / 1000, latency_jitter=args.jitter / 1000, error_status=429, compression=args.compression) as server:
+        server.store.seed(clients=args.clients, jobs_per_client=0)
+        rate_controller = RateController(rate=10000, concurrency=args.concurrency, max_concurrency=args.concurrency, backoff_base=0.01) if args.error_rate else None
+        compression = Compression() if args.compression else None
+        with GreenLight('standin', 'apikey', base_url=server.base_url, pool_maxsize=args.concurrency, rate_controller=rate_controller, compression=compression) as greenlight:
+            greenlight.load_profile()
+
+            print(f'{"workflow":>10} {"ops":>6} {"calls":>7} {"ops/s":>8} {"p50 ms":>8} {"p99 ms":>8} {"sent KiB":>9} {"recv KiB":>9}')
+            for workflow in args.workflows:
+                operation = globals()[f'setup_{workflow}'](greenlight, args.count)
+                server.error_rate = args.error_rate
+                before = server.requests, server.request_bytes, server.response_bytes
+                elapsed, latencies = measure(operation, args.count, args.concurrency)
+                server.error_rate = 0.0
+                calls, sent, received = server.requests - before[0], server.request_bytes - before[1], server.response_bytes - before[2]
+                print(f'{workflow:>10} {args.count:>6} {calls:>7} {args.count / elapsed:>8.1f} '
+                    f'{percentile(latencies, 0.5) * 1000:>8.1f} {percentile(latencies, 0.99) * 1000:>8.1f} '
+                    f'{sent / 1024:>9.1f} {received / 1024:>9.1f}')
+            if args.error_rate:
+                print(f'{server.errors} injected errors, {rate_controller.stats()["retries"]} retries')
+
+
+if __name__ == '__main__':
+    main()
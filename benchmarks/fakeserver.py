@@ -0,0 +1,324 @@
+"""
+    A local stand-in for the GreenLight API, used by the benchmarks.
+    It speaks HTTP/1.1 with keep-alive, and can add a fixed delay whenever a new connection is
+    accepted, to approximate the TCP+TLS handshake cost of talking to the real API.
+
+    Records live in memory, so the endpoints GreenLight calls behave end to end: created clients,
+    positions, jobs, projects, addresses, timesheets and line items can be fetched (by id, or by
+    ext_id with ?scope=), listed, updated and deleted.  GETs carry ETags and honour If-None-Match
+    unless etags is off.  With compression on, it gzips responses of 1 KiB or more for clients that
+    accept gzip, takes gzip request bodies and advertises that with Accept-Encoding.  Each request
+    can be delayed by latency (plus up to latency_jitter) seconds, answered with error_status at
+    error_rate, or cut off halfway through its body at truncate_rate, to see how the SDK behaves
+    against a slow or flaky API; fail_next() makes specific requests fail, and truncate_next() cuts
+    off the next responses, for tests.  POST
+    /job_invite answers with the new job's id, or with invite_response='partial' also its
+    contractor_id, or with 'job' the whole job record.
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+import gzip
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+
+ADMIN = {
+    'id': 'admin-1',
+    'name': 'Stand-in Admin',
+    'ext_id_scope': 'standin',
+    'ext_id': None,
+    'countries': {'US': 'active', 'GB': 'active'},
+    'currencies': {'USD': 'active', 'GBP': 'active'}
+}
+PROFILE = {'role': 'gl_admin', 'resource': 'admin', 'resource_id': ADMIN['id'], 'user_id': 'user-1'}
+QUESTIONS = [
+    {'id': f'question-{i}', 'title': f'Question {i}', 'answer_type': 'boolean', 'help_text': f'Help for question {i}'}
+    for i in range(1, 6)
+]
+COLLECTIONS = ('admin', 'client', 'position', 'job', 'project', 'address', 'timesheet', 'shift', 'expense', 'deliverable')
+
+
+class FakeStore():
+    """Thread-safe in-memory records, one dict of id -> record per collection."""
+
+    def __init__(self):
+        self.records = {collection: {} for collection in COLLECTIONS}
+        self.records['admin'][ADMIN['id']] = dict(ADMIN)
+        self.lock = threading.Lock()
+
+    def get(self, collection, id, scope = None):
+        with self.lock:
+            if scope is None: return self.records[collection].get(id)
+            for record in self.records[collection].values():
+                if record.get('ext_id_scope') == scope and record.get('ext_id') == id: return record
+            return None
+
+    def find(self, collection, **fields):
+        with self.lock:
+            return [record for record in self.records[collection].values()
+                if all(record.get(key) == value for key, value in fields.items())]
+
+    def create(self, collection, record):
+        record = {'ext_id_scope': None, 'ext_id': None, **record, 'id': uuid.uuid4().hex}
+        with self.lock:
+            self.records[collection][record['id']] = record
+        return record
+
+    def update(self, collection, id, record):
+        with self.lock:
+            if id not in self.records[collection]: return False
+            self.records[collection][id] = dict(record, id=id)
+            return True
+
+    def delete(self, collection, id):
+        with self.lock:
+            return self.records[collection].pop(id, None) is not None
+
+    def seed(self, clients = 10, jobs_per_client = 5, projects_per_job = 2):
+        # populate the admin's inventory, for listing benchmarks
+        for c in range(clients):
+            client = self.create('client', {
+                'name': f'Client {c}', 'admin_id': ADMIN['id'], 'status': 'current',
+                'ext_id_scope': ADMIN['ext_id_scope'], 'ext_id': f'client-{c}'
+            })
+            self.create('address', {'ref_type': 'client', 'ref_id': client['id'], 'kind': 'l', 'name': 'HQ'})
+            projects = [self.create('project', {'client_id': client['id'], 'name': f'Project {c}.{p}'})
+                for p in range(projects_per_job)]
+            position = self.create('position', {'client_id': client['id'], 'title': f'Position {c}', 'status': 'approved'})
+            for j in range(jobs_per_client):
+                self.create('job', self.new_job(position, {
+                    'first_name': 'Worker', 'last_name': f'{c}.{j}', 'email': f'worker{c}.{j}@example.com',
+                    'projects': [{'project_id': project['id'], 'rate_currency': 'USD', 'rate': 50} for project in projects]
+                }))
+
+    def new_job(self, position, invite):
+        return {
+            'position_id': position['id'],
+            'client_id': position.get('client_id'),
+            'contractor_id': uuid.uuid4().hex,
+            'title': position.get('title'),
+            'status': 'active',
+            'first_name': invite.get('first_name'),
+            'last_name': invite.get('last_name'),
+            'email': invite.get('email'),
+            'start_date': invite.get('start_date'),
+            'end_date': invite.get('end_date'),
+            'projects': invite.get('projects') or [],
+            'ext_id_scope': None,
+            'ext_id': None,
+            'onboarding': {'w2_path': {'background_check': 'not_started'}}
+        }
+
+
+class FakeGreenLightHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    wbufsize = -1  # buffer headers and body into one segment; flushed after each request
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+        if self.server.connect_latency: time.sleep(self.server.connect_latency)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def do_PUT(self):
+        self.handle_request('PUT')
+
+    def do_DELETE(self):
+        self.handle_request('DELETE')
+
+    def handle_request(self, method):
+        server = self.server
+        length = int(self.headers.get('Content-Length') or 0)
+        data = self.rfile.read(length) if length else b''
+        server.requests += 1
+        server.request_bytes += len(data)
+        encoding = self.headers.get('Content-Encoding')
+        if encoding:
+            if encoding != 'gzip' or not server.compression:
+                return self.send_json(415, {'message': f'Unsupported content encoding {encoding}'})
+            data = gzip.decompress(data)
+        body = json.loads(data) if data else {}
+
+        if server.latency or server.latency_jitter:
+            time.sleep(server.latency + random.uniform(0, server.latency_jitter))
+        injected = server.take_failure(method, urlsplit(self.path).path)
+        if injected:
+            server.errors += 1
+            return self.send_json(injected, {'message': 'Injected error'})
+        if server.error_rate and random.random() < server.error_rate:
+            server.errors += 1
+            headers = {'Retry-After': str(server.retry_after)} if server.retry_after is not None else {}
+            return self.send_json(server.error_status, {'message': 'Injected error'}, headers)
+
+        parts = urlsplit(self.path)
+        path = parts.path.strip('/').split('/')
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        try:
+            status, payload = self.route(method, path, query, body)
+        except KeyError as err:
+            status, payload = 400, {'message': f'Missing field {err}'}
+
+        # successful GETs carry an ETag, and a matching If-None-Match is answered with 304 Not Modified
+        if method == 'GET' and status == 200 and server.etags:
+            etag = '"' + hashlib.sha1(json.dumps(payload).encode()).hexdigest()[:16] + '"'
+            if self.headers.get('If-None-Match') == etag: return self.send_json(304, None, {'ETag': etag})
+            return self.send_json(status, payload, {'ETag': etag})
+        self.send_json(status, payload)
+
+    def route(self, method, path, query, body):
+        store = self.server.store
+        collection = path[0]
+
+        if method == 'GET':
+            if path == ['version']: return 200, {'git_hash': 'standin'}
+            if path == ['profile']: return 200, [PROFILE]
+            if path == ['question']: return 200, QUESTIONS
+            if len(path) == 3 and path[:1] == ['admin'] and path[2] == 'clients':
+                return 200, store.find('client', admin_id=path[1])
+            if len(path) == 3 and path[:1] == ['client'] and path[2] == 'jobs':
+                return 200, store.find('job', client_id=path[1], status=query.get('status', 'active'))
+            if len(path) == 3 and path[:1] == ['client'] and path[2] == 'addresses':
+                return 200, store.find('address', ref_type='client', ref_id=path[1])
+            if len(path) == 3 and path[:1] == ['job'] and path[2] == 'projects':
+                job = store.get('job', path[1])
+                if job is None: return 404, {'message': f'Job {path[1]} not found'}
+                project_ids = [pay['project_id'] for pay in job['projects']]
+                return 200, [project for project in (store.get('project', id) for id in project_ids) if project]
+            if len(path) == 2 and collection in COLLECTIONS:
+                record = store.get(collection, path[1], query.get('scope'))
+                if record is None: return 404, {'message': f'{collection} {path[1]} not found'}
+                if collection == 'job' and query.get('extended') != 'true':
+                    record = {key: value for key, value in record.items() if key != 'onboarding'}
+                return 200, record
+
+        if method == 'POST':
+            if path == ['job_invite']:
+                position = store.get('position', body['position_id'])
+                if position is None: return 404, {'message': f"Position {body['position_id']} not found"}
+                job = store.create('job', store.new_job(position, body))
+                if self.server.invite_response == 'job': return 201, {key: value for key, value in job.items() if key != 'onboarding'}
+                if self.server.invite_response == 'partial': return 201, {'id': job['id'], 'contractor_id': job['contractor_id']}
+                return 201, {'id': job['id']}
+            if len(path) == 4 and path[2] == 'action' and collection in COLLECTIONS:
+                record = store.get(collection, path[1])
+                if record is None: return 404, {'message': f'{collection} {path[1]} not found'}
+                record['status'] = {'approve': 'approved', 'submit': 'submitted'}.get(path[3], path[3])
+                return 200, {'id': path[1], 'status': record['status']}
+            if len(path) == 1 and collection in COLLECTIONS:
+                if collection in ('shift', 'expense', 'deliverable') and store.get('timesheet', body['timesheet_id']) is None:
+                    return 404, {'message': f"Timesheet {body['timesheet_id']} not found"}
+                if collection == 'position': body = dict(body, status='draft', classify_client_result='w2-or-ic')
+                if collection == 'client': body = dict(body, status='current')
+                if collection == 'timesheet': body = dict(body, status='draft')
+                return 201, {'id': store.create(collection, body)['id']}
+
+        if method == 'PUT' and len(path) == 2 and collection in COLLECTIONS:
+            if store.update(collection, path[1], body): return 204, None
+            return 404, {'message': f'{collection} {path[1]} not found'}
+
+        if method == 'DELETE' and len(path) == 2 and collection in COLLECTIONS:
+            if store.delete(collection, path[1]): return 204, None
+            return 404, {'message': f'{collection} {path[1]} not found'}
+
+        return 404, {'message': f'Not found: {method} {self.path}'}
+
+    def send_json(self, status, payload, headers = {}):
+        body = json.dumps(payload).encode() if payload is not None else b''
+        self.send_response(status)
+        if payload is not None: self.send_header('Content-Type', 'application/json')
+        if self.server.compression:
+            self.send_header('Accept-Encoding', 'gzip')
+            if len(body) >= 1024 and 'gzip' in self.headers.get('Accept-Encoding', ''):
+                body = gzip.compress(body)
+                self.send_header('Content-Encoding', 'gzip')
+        self.server.response_bytes += len(body)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in headers.items(): self.send_header(key, value)
+        if body and (self.server.take_truncation() or (self.server.truncate_rate and random.random() < self.server.truncate_rate)):
+            # the connection drops before the declared length is sent
+            self.server.errors += 1
+            self.close_connection = True
+            body = body[:len(body) // 2]
+        if self.close_connection: self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeGreenLightServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, port=0, connect_latency=0.0, latency=0.0, latency_jitter=0.0, error_rate=0.0, error_status=503, retry_after=None, truncate_rate=0.0, etags=True, compression=False, invite_response='id'):
+        super().__init__(('127.0.0.1', port), FakeGreenLightHandler)
+        self.connect_latency = connect_latency
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.truncate_rate = truncate_rate
+        self.etags = etags
+        self.compression = compression
+        self.invite_response = invite_response
+        self.store = FakeStore()
+        self.failures = []
+        self.truncations = 0
+        self.failures_lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.errors = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.thread = None
+
+    def fail_next(self, method, path, count = 1, status = 503):
+        # answer the next count requests for method whose path starts with path with status, before they take effect
+        with self.failures_lock:
+            self.failures.append([method, path, count, status])
+
+    def truncate_next(self, count = 1):
+        # cut off the body of the next count responses that have one
+        with self.failures_lock:
+            self.truncations += count
+
+    def take_truncation(self):
+        with self.failures_lock:
+            if not self.truncations: return False
+            self.truncations -= 1
+            return True
+
+    def take_failure(self, method, path):
+        with self.failures_lock:
+            for failure in self.failures:
+                if failure[0] == method and path.startswith(failure[1]):
+                    failure[2] -= 1
+                    if not failure[2]: self.failures.remove(failure)
+                    return failure[3]
+        return None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address
+        return f'http://{host}:{port}'
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
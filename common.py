@@ -194,9 +194,9 @@ def choose_existing_job(greenlight):
         if len(clients) == 0:
             print("There are no clients.  Add a client and try again.")
             quit()
-        for client in clients:
-            selected_job = choose_client_job(greenlight, client['id'])
-            if selected_job: return selected_job
+        # clients are searched concurrently; stop at the first one that has an active job
+        for client, active_jobs in greenlight.iter_admin_active_jobs(clients=clients):
+            if len(active_jobs): return random.choice(active_jobs)
 
         print("There are no active jobs for any client.  Onboard & approve a worker then try again.")
         quit()
@@ -1 +1,14 @@
-from .greenlight import GreenLight, get_glapi_from_env
\ No newline at end of file
+from .greenlight import GreenLight, GreenLightHTTPError, LineItemUploadError, get_glapi_from_env
+from .async_greenlight import AsyncGreenLight, get_async_glapi_from_env
+from .cache import RecordCache, ConditionalCache
+from .idindex import IdIndex
+from .mirror import Mirror
+from .journal import Journal
+from .checkpoints import Checkpoints
+from .singleflight import SingleFlight
+from .ratelimit import RateController, TokenBucket
+from .metrics import MetricsHook, MetricsAggregator
+from .records import ClientRecord, JobRecord, ProjectRecord
+from .tracing import Tracer, Span, RecordingTracer
+from .codec import JsonCodec, OrjsonCodec
+from .compression import Compression
@@ -0,0 +1,48 @@
+"""
+    Command line entry point: python -m greenlight <command>
+    Requires environment variables GL_STAGE and GL_APIKEY to be set.
+"""
+
+import argparse
+import sys
+from .greenlight import get_glapi_from_env
+from .bulk import bulk_upload_files
+from .ratelimit import RateController
+
+
+def bulk_upload_command(args):
+    rate_controller = RateController(rate=args.rate, concurrency=args.concurrency, max_concurrency=args.concurrency * args.line_item_concurrency)
+    with get_glapi_from_env(rate_controller=rate_controller) as greenlight, open(args.manifest, 'w') as manifest:
+        summary = bulk_upload_files(
+            greenlight,
+            args.files,
+            partitions=args.partitions,
+            concurrency=args.concurrency,
+            max_pending=args.max_pending,
+            manifest=manifest,
+            approve=args.approve,
+            line_item_concurrency=args.line_item_concurrency
+        )
+    print(f"Uploaded {summary['uploaded']} timesheets, {summary['failed']} failed.  Manifest written to {args.manifest}")
+    return 1 if summary['failed'] else 0
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(prog='python -m greenlight')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    bulk = commands.add_parser('bulk-upload', help='upload shifts, expenses and deliverables from CSV or NDJSON files as weekly timesheets')
+    bulk.add_argument('files', nargs='+', help='.csv or .ndjson files, one shift/expense/deliverable per row')
+    bulk.add_argument('--manifest', default='manifest.ndjson', help='where to write the ext_id -> timesheet_id manifest')
+    bulk.add_argument('--concurrency', type=int, default=4, help='timesheets uploaded in parallel')
+    bulk.add_argument('--max-pending', type=int, default=0, help='timesheets held in memory at once (default 2 * concurrency)')
+    bulk.add_argument('--line-item-concurrency', type=int, default=1, help='line items posted in parallel within each timesheet')
+    bulk.add_argument('--rate', type=float, default=10, help='initial requests per second; adapts to throttling and latency')
+    bulk.add_argument('--partitions', type=int, default=64, help='spill partitions used to group records by job')
+    bulk.add_argument('--approve', action='store_true', help='approve timesheets after submitting them')
+    bulk.set_defaults(run=bulk_upload_command)
+
+    args = parser.parse_args(argv)
+    return args.run(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,891 @@
+from .common import get_base_url, format_date, calculate_period_ending
+from . import greenlight as _greenlight
+from .greenlight import GreenLightHTTPError, LineItemUploadError, PROFILE_SNAPSHOT_VERSION, JOB_RECORD_FIELDS
+from .greenlight import client_fields, job_fields, question_fields, questions_path
+from .cache import RecordCache, ConditionalCache
+from .idindex import IdIndex, carries_ext_id, index_entry
+from .mirror import Mirror
+from .checkpoints import Checkpoints, NOOP_CHECKPOINT, line_item_step
+from .singleflight import SingleFlight, request_key
+from .ratelimit import RateController
+from .metrics import MetricsHook, endpoint_template
+from .records import ClientRecord, JobRecord, ProjectRecord
+from .streaming import JsonArrayParser, STREAM_CHUNK_SIZE
+from .tracing import Tracer, NOOP_TRACER
+from .codec import JsonCodec, default_codec
+from .compression import Compression
+from urllib.parse import urlencode
+import asyncio
+import os
+import time
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+async def get_async_glapi_from_env(**kwargs):
+    glapi = AsyncGreenLight(os.environ['GL_STAGE'], os.environ['GL_APIKEY'], **kwargs)
+    await glapi.open()
+    return glapi
+
+class AsyncGreenLight():
+    """GreenLight API client for asyncio, mirroring GreenLight.
+
+    Construct it, then load the profile with `await glapi.open()`, or use it as an async context manager:
+        async with AsyncGreenLight(stage, apikey) as glapi:
+            client = await glapi.get_client(client_id)
+
+    Pass profile_snapshot (from export_profile() on either client) to open without any profile calls.
+    """
+
+    def __init__(
+        self,
+        stage: str,
+        apikey: str = '',
+        base_url: str = None,
+        pool_maxsize: int = 100,
+        pool_maxsize_per_host: int = 0,
+        keep_alive: bool = True,
+        keepalive_timeout: float = 15,
+        cache: RecordCache = None,
+        conditional_cache: ConditionalCache = None,
+        id_index: IdIndex = None,
+        mirror: Mirror = None,
+        checkpoints: Checkpoints = None,
+        single_flight: SingleFlight = None,
+        profile_snapshot: dict = None,
+        rate_controller: RateController = None,
+        metrics: MetricsHook = None,
+        tracer: Tracer = None,
+        codec: JsonCodec = None,
+        compression: Compression = None
+    ):
+        if aiohttp is None:
+            raise ImportError('AsyncGreenLight requires the aiohttp package')
+        self.stage = stage
+        self.apikey = apikey
+        self.base_url = base_url or get_base_url(stage)
+        self.admin = {}
+        self.client = {}
+        self.profile = None
+        self.session = None
+        self.cache = cache
+        self.conditional_cache = conditional_cache
+        self.rate_controller = rate_controller
+        self.metrics = metrics
+        self.tracer = tracer or NOOP_TRACER
+        self.codec = codec or default_codec()
+        self.compression = compression
+        self.id_index = id_index
+        self.mirror = mirror
+        self.checkpoints = checkpoints
+        self.single_flight = single_flight
+        # pool_maxsize bounds connections in total, pool_maxsize_per_host per host (0 = no per-host limit)
+        self.__pool_maxsize = pool_maxsize
+        self.__pool_maxsize_per_host = pool_maxsize_per_host
+        self.__keep_alive = keep_alive
+        self.__keepalive_timeout = keepalive_timeout
+        if profile_snapshot: self.import_profile(profile_snapshot)
+
+    async def open(self):
+        if self.session is None:
+            self.session = self.__create_session()
+        if self.apikey and self.profile is None:
+            self.profile = await self.__get_profile()
+        return self
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        try:
+            return await self.open()
+        except BaseException:
+            await self.close()
+            raise
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def export_profile(self):
+        return {
+            'version': PROFILE_SNAPSHOT_VERSION,
+            'stage': self.stage,
+            'profile': self.profile,
+            'admin': self.admin,
+            'client': self.client
+        }
+
+    def import_profile(self, snapshot):
+        if snapshot.get('version') != PROFILE_SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported profile snapshot version {snapshot.get('version')}")
+        if snapshot['stage'] != self.stage:
+            raise ValueError(f"Profile snapshot was taken on stage {snapshot['stage']}, not {self.stage}")
+        self.profile, self.admin, self.client = snapshot['profile'], snapshot['admin'], snapshot['client']
+
+    def role_type(self):
+        role = self.profile['role']
+        if (role[0:2] == 'gl'): return "admin"
+        if (role[0:2] == 'cl'): return "client"
+        return None
+
+    def scope(self):
+        if self.role_type() == 'admin':
+            return self.admin['ext_id_scope']
+        if self.role_type() == 'client':
+            return self.client['ext_id_scope']
+        return None
+
+    def stats(self):
+        stats = {}
+        if self.cache: stats['cache'] = self.cache.stats()
+        if self.conditional_cache: stats['conditional_cache'] = self.conditional_cache.stats()
+        if self.compression: stats['compression'] = self.compression.stats()
+        if self.id_index: stats['id_index'] = self.id_index.stats()
+        if self.mirror: stats['mirror'] = self.mirror.stats()
+        if self.checkpoints: stats['checkpoints'] = self.checkpoints.stats()
+        if self.single_flight: stats['single_flight'] = self.single_flight.stats()
+        if self.rate_controller: stats['rate_controller'] = self.rate_controller.stats()
+        if hasattr(self.metrics, 'snapshot'): stats['metrics'] = self.metrics.snapshot()
+        return stats
+
+    async def get_api_hash(self):
+        version_json = await self.__request('/version')
+        return version_json['git_hash']
+
+    async def get_position(self, id, scope = None): return await self.__fetch_endpoint('position', id, scope)
+    async def get_client(self, id, scope = None): return await self.__fetch_endpoint('client', id, scope)
+    async def get_admin(self, id, scope = None): return await self.__fetch_endpoint('admin', id, scope)
+    async def get_project(self, id, scope = None): return await self.__fetch_endpoint('project', id, scope)
+    async def get_job(self, id, scope = None): return await self.__fetch_endpoint('job', id, scope)
+    async def get_timesheet(self, id, scope = None): return await self.__fetch_endpoint('timesheet', id, scope)
+    async def get_job_extended(self, id): return await self.__fetch_endpoint('job', id, None, {'extended': 'true'})
+
+    async def resolve_id(self, endpoint, id, scope):
+        # the GreenLight id of the record with ext_id id in scope, e.g. for update_job or get_job_projects;
+        # taken from the id index without a request when it has it, so it may belong to a record since
+        # deleted (a 404) or given another ext_id
+        return self.__indexed_id(endpoint, id, scope) or (await self.__fetch_endpoint(endpoint, id, scope))['id']
+
+    async def delete_client(self, id):
+        resp = await self.__request(f'/client/{id}', method='DELETE')
+        self.__invalidate('client', id)
+        return resp
+
+    async def delete_clients(self, ids, concurrency = 8):
+        # same report as GreenLight.delete_clients
+        async def delete(id):
+            try:
+                await self.delete_client(id)
+                return {'status': 'deleted'}
+            except GreenLightHTTPError as err:
+                if err.status_code != 404: return {'status': 'failed', 'error': str(err)}
+                self.__invalidate('client', id)
+                return {'status': 'already_deleted'}
+            except Exception as err:
+                return {'status': 'failed', 'error': str(err)}
+
+        with self.tracer.span('delete_clients', {'count': len(ids)}):
+            results = {id: result async for id, result in self.__fan_out(delete, ids, concurrency)}
+        return {id: results[id] for id in ids}
+
+    # list endpoints as in GreenLight: iter_ methods are async generators parsing the response incrementally,
+    # the list-returning get_ methods read it whole so single flight can share it
+    async def get_admin_clients(self, compact = False):
+        admin_id = self.admin['id']
+        full_clients = await self.__request(f'/admin/{admin_id}/clients', queryparams={'status': 'current'})
+        if self.id_index: self.id_index.remember_all('client', full_clients)
+        return [ClientRecord.from_dict(client) if compact else client_fields(client) for client in full_clients]
+
+    async def iter_admin_clients(self, compact = False):
+        admin_id = self.admin['id']
+        indexed = []
+        try:
+            async for full_client in self.__request_stream(f'/admin/{admin_id}/clients', queryparams={'status': 'current'}):
+                if self.id_index: indexed.append(index_entry(full_client))
+                yield ClientRecord.from_dict(full_client) if compact else client_fields(full_client)
+        finally:
+            # indexed in one batch, however far the caller read
+            if indexed: self.id_index.put_many('client', indexed)
+
+    async def get_client_active_jobs(self, client_id, compact = False):
+        full_jobs = await self.__request(f'/client/{client_id}/jobs', queryparams={'status': 'active'})
+        if self.id_index: self.id_index.remember_all('job', full_jobs)
+        return [JobRecord.from_dict(job) if compact else job_fields(job) for job in full_jobs]
+
+    async def iter_client_active_jobs(self, client_id, compact = False):
+        indexed = []
+        try:
+            async for full_job in self.__request_stream(f'/client/{client_id}/jobs', queryparams={'status': 'active'}):
+                if self.id_index: indexed.append(index_entry(full_job))
+                yield JobRecord.from_dict(full_job) if compact else job_fields(full_job)
+        finally:
+            if indexed: self.id_index.put_many('job', indexed)
+
+    async def get_questions_for_client(self, position_id = None):
+        return [question_fields(question) for question in await self.__request(questions_path(self.admin['id'], position_id))]
+
+    async def iter_questions_for_client(self, position_id = None):
+        async for full_question in self.__request_stream(questions_path(self.admin['id'], position_id)):
+            yield question_fields(full_question)
+
+    async def get_job_projects(self, job_id, compact = False):
+        full_projects = await self.__request(f'/job/{job_id}/projects')
+        if compact: return [ProjectRecord.from_dict(project) for project in full_projects]
+        return full_projects
+
+    # Admin-wide fan-out, as in GreenLight: iter_ methods are async generators yielding results as they arrive
+    async def iter_admin_active_jobs(self, concurrency = 8, clients = None, compact = False):
+        clients = await self.get_admin_clients() if clients is None else clients
+        async for result in self.__fan_out(lambda client: self.get_client_active_jobs(client['id'], compact), clients, concurrency):
+            yield result
+
+    async def get_admin_active_jobs(self, concurrency = 8, clients = None, compact = False):
+        return {client['id']: jobs async for client, jobs in self.iter_admin_active_jobs(concurrency, clients, compact)}
+
+    async def iter_admin_client_addresses(self, concurrency = 8, clients = None):
+        clients = await self.get_admin_clients() if clients is None else clients
+        async for result in self.__fan_out(lambda client: self.get_client_addresses(client['id']), clients, concurrency):
+            yield result
+
+    async def get_admin_client_addresses(self, concurrency = 8, clients = None):
+        return {client['id']: addresses async for client, addresses in self.iter_admin_client_addresses(concurrency, clients)}
+
+    async def iter_admin_job_projects(self, concurrency = 8, clients = None, compact = False):
+        # each client's jobs are queued for their projects as soon as they arrive, under the same limit
+        semaphore = asyncio.Semaphore(concurrency)
+        async def bounded(coroutine):
+            async with semaphore:
+                return await coroutine
+
+        clients = await self.get_admin_clients() if clients is None else clients
+        pending = {asyncio.ensure_future(bounded(self.get_client_active_jobs(client['id'], compact))): ('client', client) for client in clients}
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    kind, item = pending.pop(task)
+                    if kind == 'client':
+                        for job in task.result():
+                            pending[asyncio.ensure_future(bounded(self.get_job_projects(job['id'], compact)))] = ('job', job)
+                    else:
+                        yield item, task.result()
+        finally:
+            for task in pending: task.cancel()
+
+    async def get_admin_job_projects(self, concurrency = 8, clients = None, compact = False):
+        return {job['id']: projects async for job, projects in self.iter_admin_job_projects(concurrency, clients, compact)}
+
+    async def get_background_check_status(self, job_id, scope = None):
+        job_extended = await self.__get_job_extended(job_id, scope)
+        onboarding = job_extended['onboarding']
+        w2_path = onboarding['w2_path']
+        background_check_status = w2_path['background_check']
+        return background_check_status
+
+    async def create_client(self, client, your_client_id):
+        if (self.role_type() != 'admin'):
+            raise ValueError('Logged in user does not have sufficient permission to create client')
+
+        client['admin_id'] = self.admin['id']
+        if your_client_id:
+            client['ext_id'] = your_client_id
+            client['ext_id_scope'] = self.scope()
+
+        resp = await self.__request('/client', method='POST', body=client)
+        self.__invalidate('client', resp.get('id'), your_client_id)
+        self.__remember('client', resp.get('id'), client)
+        return resp
+
+    async def create_project(self, project):
+        resp = await self.__request('/project', method='POST', body=project)
+        self.__invalidate('project', resp.get('id'), project.get('ext_id'))
+        self.__remember('project', resp.get('id'), project)
+        return resp
+
+    async def update_job(self, job):
+        id = job['id']
+        resp = await self.__request(f'/job/{id}', method='PUT', body=job)
+        self.__invalidate('job', id, job.get('ext_id'))
+        self.__remember('job', id, job)
+        return resp
+
+    async def create_position(self, position, your_position_id = None):
+        return await self.__create_position(position, your_position_id, {})
+
+    async def create_positions(self, positions, your_position_ids = None, answers = None, concurrency = 8):
+        # same report as GreenLight.create_positions
+        your_position_ids = your_position_ids or [None] * len(positions)
+        answers = answers or [None] * len(positions)
+        async def create(i):
+            progress = {'step': 'create'}
+            try:
+                position_id = (await self.__create_position(positions[i], your_position_ids[i], progress))['id']
+                if answers[i] is not None:
+                    progress['step'] = 'answers'
+                    # answers are PUT with the whole position, so start from the record the server now holds
+                    await self.add_position_answers(await self.get_position(position_id), answers[i])
+                return {'status': 'created', 'id': position_id}
+            except Exception as err:
+                return {'status': 'failed', 'step': progress['step'], 'error': str(err), 'id': progress.get('id')}
+
+        with self.tracer.span('create_positions', {'count': len(positions)}):
+            results = {i: result async for i, result in self.__fan_out(create, range(len(positions)), concurrency)}
+        return [results[i] for i in range(len(positions))]
+
+    async def add_position_answers(self, position, answers):
+        position['classify_client_answers'] = {'answers': answers}
+        position_id = position['id']
+        resp_put = await self.__request(f'/position/{position_id}', method='PUT', body=position)
+        self.__invalidate('position', position_id, position.get('ext_id'))
+        return resp_put
+
+    async def invite_worker(self, position, worker_details, pay_by_project, your_job_id = None):
+        return await self.__invite_worker(position, worker_details, pay_by_project, your_job_id, {})
+
+    async def invite_workers(self, position, workers, pay_by_project, your_job_ids = None, concurrency = 8):
+        # same report as GreenLight.invite_workers
+        your_job_ids = your_job_ids or [None] * len(workers)
+        async def invite(i):
+            progress = {}
+            try:
+                return {'status': 'invited', 'job': await self.__invite_worker(position, workers[i], pay_by_project, your_job_ids[i], progress)}
+            except Exception as err:
+                return {'status': 'failed', 'error': str(err), 'job_id': progress.get('job_id')}
+
+        with self.tracer.span('invite_workers', {'position_id': position['id'], 'count': len(workers)}):
+            results = {i: result async for i, result in self.__fan_out(invite, range(len(workers)), concurrency)}
+        return [results[i] for i in range(len(workers))]
+
+    async def create_address(self, address, ref_type, ref_id):
+        address['ref_type'] = ref_type
+        address['ref_id'] = ref_id
+        address['kind'] = 'l'
+        address['name'] = 'Mailing'
+        address_id = (await self.__request('/address', method='POST', body=address))['id']
+        if self.conditional_cache: self.conditional_cache.invalidate(f'/{ref_type}/{ref_id}/addresses')
+        return address_id
+
+    async def get_client_addresses(self, client_id):
+        return await self.__request(f'/client/{client_id}/addresses', method='GET')
+
+    async def create_timesheet_with_shifts_expenses(self, shifts_expenses, your_timesheet_id = None, approve=False, max_concurrency = 1):
+        shifts = shifts_expenses['shifts']
+        expenses = shifts_expenses['expenses']
+        period_ending = calculate_period_ending(shifts=shifts)
+        job_id = shifts[0]['job_id']
+        checkpoint = self.__checkpoint('timesheet', your_timesheet_id)
+        with self.tracer.span('create_timesheet_with_shifts_expenses', {'ext_id': your_timesheet_id, 'job_id': job_id}) as span:
+            timesheet_id = await self.__resume_timesheet(checkpoint, job_id, period_ending, your_timesheet_id)
+            span.set_attribute('timesheet_id', timesheet_id)
+            line_items = [('shift', i, shift, self.__add_shift_to_timesheet) for i, shift in enumerate(shifts)]
+            line_items += [('expense', i, expense, self.__add_expense_to_timesheet) for i, expense in enumerate(expenses)]
+            await self.__add_line_items(self.__remaining_line_items(checkpoint, line_items), timesheet_id, max_concurrency)
+            await self.__finish_timesheet(checkpoint, timesheet_id, approve, your_timesheet_id)
+        return timesheet_id
+
+    async def create_timesheet_with_deliverables(self, deliverables, your_timesheet_id = None, approve=False, max_concurrency = 1):
+        period_ending = calculate_period_ending(deliverables=deliverables)
+        job_id = deliverables[0]['job_id']
+        checkpoint = self.__checkpoint('timesheet', your_timesheet_id)
+        with self.tracer.span('create_timesheet_with_deliverables', {'ext_id': your_timesheet_id, 'job_id': job_id}) as span:
+            timesheet_id = await self.__resume_timesheet(checkpoint, job_id, period_ending, your_timesheet_id)
+            span.set_attribute('timesheet_id', timesheet_id)
+            line_items = [('deliverable', i, deliverable, self.__add_deliverable_to_timesheet) for i, deliverable in enumerate(deliverables)]
+            await self.__add_line_items(self.__remaining_line_items(checkpoint, line_items), timesheet_id, max_concurrency)
+            await self.__finish_timesheet(checkpoint, timesheet_id, approve, your_timesheet_id)
+        return timesheet_id
+
+    ## private methods
+    def __checkpoint(self, operation, key):
+        return self.checkpoints.begin(operation, key) if self.checkpoints else NOOP_CHECKPOINT
+
+    async def __resume_timesheet(self, checkpoint, job_id, period_ending, your_timesheet_id):
+        # as in GreenLight: reuse the timesheet an earlier attempt created
+        timesheet_id = checkpoint.get('timesheet_id')
+        if timesheet_id is None and checkpoint.done('create'):
+            timesheet_id = await self.__find_id('timesheet', your_timesheet_id)
+        if timesheet_id is None:
+            checkpoint.mark('create')
+            timesheet_id = await self.__create_timesheet(job_id, period_ending, your_timesheet_id)
+            checkpoint.set('timesheet_id', timesheet_id)
+        return timesheet_id
+
+    def __remaining_line_items(self, checkpoint, line_items):
+        def checkpointed(add_to_timesheet, step):
+            async def add(item, timesheet_id):
+                id = await add_to_timesheet(item, timesheet_id)
+                checkpoint.mark(step)
+                return id
+            return add
+
+        if checkpoint is NOOP_CHECKPOINT: return line_items
+        remaining = []
+        for type, index, item, add_to_timesheet in line_items:
+            step = line_item_step(type, index, item)
+            if not checkpoint.done(step):
+                remaining.append((type, index, item, checkpointed(add_to_timesheet, step)))
+        return remaining
+
+    async def __finish_timesheet(self, checkpoint, timesheet_id, approve, your_timesheet_id):
+        if not checkpoint.done('submit'):
+            await self.__submit_timesheet(timesheet_id, your_timesheet_id)
+            checkpoint.mark('submit')
+        if approve:
+            await self.__approve_timesheet(timesheet_id, your_timesheet_id)
+        checkpoint.complete()
+
+    async def __find_id(self, endpoint, your_id):
+        try:
+            return (await self.__fetch_endpoint(endpoint, your_id, self.scope()))['id']
+        except GreenLightHTTPError as err:
+            if err.status_code == 404: return None
+            raise
+
+    async def __create_timesheet(self, job_id, period_ending, your_timesheet_id):
+        timesheet = {
+            'job_id': job_id,
+            'period_ending': period_ending
+        }
+        if your_timesheet_id:
+            timesheet['ext_id'] = your_timesheet_id
+            timesheet['ext_id_scope'] = self.scope()
+
+        timesheet_id = (await self.__request('/timesheet', method='POST', body=timesheet))['id']
+        self.__invalidate('timesheet', timesheet_id, your_timesheet_id)
+        self.__remember('timesheet', timesheet_id, timesheet)
+        return timesheet_id
+
+    async def __add_line_items(self, line_items, timesheet_id, max_concurrency):
+        # same contract as GreenLight: serial raises on first failure, concurrent reports every failure
+        with self.tracer.span('add_line_items', {'count': len(line_items), 'max_concurrency': max_concurrency}):
+            failures = await self.__upload_line_items(line_items, timesheet_id, max_concurrency)
+
+        if failures:
+            raise LineItemUploadError(timesheet_id, failures)
+
+    async def __upload_line_items(self, line_items, timesheet_id, max_concurrency):
+        if max_concurrency <= 1:
+            for _, _, item, add_to_timesheet in line_items:
+                await add_to_timesheet(item, timesheet_id)
+            return []
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+        async def add_bounded(item, add_to_timesheet):
+            async with semaphore:
+                return await add_to_timesheet(item, timesheet_id)
+
+        results = await asyncio.gather(
+            *[add_bounded(item, add_to_timesheet) for _, _, item, add_to_timesheet in line_items],
+            return_exceptions=True
+        )
+        failures = [{'type': type, 'index': index, 'item': item, 'error': result}
+            for (type, index, item, _), result in zip(line_items, results) if isinstance(result, Exception)]
+        return failures
+
+    async def __fan_out(self, fetch, items, concurrency):
+        # yields (item, await fetch(item)) in completion order; leaving early cancels the rest
+        semaphore = asyncio.Semaphore(concurrency)
+        async def bounded(item):
+            async with semaphore:
+                return await fetch(item)
+
+        pending = {asyncio.ensure_future(bounded(item)): item for item in items}
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield pending.pop(task), task.result()
+        finally:
+            for task in pending: task.cancel()
+
+    async def __create_position(self, position, your_position_id, progress):
+        position['start_date'] = format_date(position['start_date'])
+        if 'end_date' in position: position['end_date'] = format_date(position['end_date'])
+        if your_position_id:
+            position['ext_id'] = your_position_id
+            position['ext_id_scope'] = self.scope()
+        with self.tracer.span('create_position', {'ext_id': your_position_id}) as span:
+            resp_add = await self.__request('/position', method='POST', body=position)
+            position_id = progress['id'] = resp_add['id']
+            span.set_attribute('position_id', position_id)
+            progress['step'] = 'approve'
+            await self.__request(f'/position/{position_id}/action/approve', method='POST', expected_status=200)
+        self.__invalidate('position', position_id, your_position_id)
+        self.__remember('position', position_id, position)
+        return resp_add
+
+    async def __invite_worker(self, position, worker_details, pay_by_project, your_job_id, progress):
+        worker = worker_details['worker']
+        address = worker_details['address'] if 'address' in worker_details else None
+        invite = {
+            'position_id': position['id'],
+            'start_date': position['start_date'],
+            'first_name': worker['first_name'],
+            'last_name': worker['last_name'],
+            'email': worker['email'],
+            'phone': worker['phone'],
+            'projects': pay_by_project
+        }
+        if 'end_date' in position: invite['end_date'] = position['end_date']
+
+        checkpoint = self.__checkpoint('invite', your_job_id)
+        with self.tracer.span('invite_worker', {'position_id': position['id'], 'ext_id': your_job_id}) as span:
+            gl_job_id = checkpoint.get('job_id')
+            if gl_job_id is None:
+                if checkpoint.get('invite') == 'sent':
+                    # the job only gets our ext_id after the invite, so a lost answer cannot be looked up
+                    raise ValueError(f'The invite for job {your_job_id} may have been sent by an interrupted attempt; check the position before inviting again')
+                checkpoint.set('invite', 'sent')
+                try:
+                    resp = await self.__request('/job_invite', method='POST', body=invite)
+                except GreenLightHTTPError as err:
+                    # a 4xx answer means no job was created
+                    if err.status_code < 500: checkpoint.set('invite', 'refused')
+                    raise
+                gl_job_id = resp['id']
+                checkpoint.set('job_id', gl_job_id)
+                job = resp if all(field in resp for field in JOB_RECORD_FIELDS) else await self.get_job(gl_job_id)
+            else:
+                job = await self.get_job(gl_job_id)
+            progress['job_id'] = gl_job_id
+            span.set_attribute('job_id', gl_job_id)
+            if self.mirror: self.mirror.touch('job', gl_job_id, client_id=position.get('client_id'))
+
+            # add ext_id into the job if provided
+            if your_job_id and not checkpoint.done('ext_id'):
+                job['ext_id_scope'] = self.scope()
+                job['ext_id'] = your_job_id
+                await self.update_job(job)
+                checkpoint.mark('ext_id')
+
+            # persist contractor address if provided
+            if address and not checkpoint.done('address'):
+                contractor_id = job['contractor_id']
+                await self.create_address(address, "contractor", contractor_id)
+                checkpoint.mark('address')
+
+        checkpoint.complete()
+        return job
+
+    async def __submit_timesheet(self, timesheet_id, your_timesheet_id = None):
+        resp = await self.__request(f'/timesheet/{timesheet_id}/action/submit', method='POST', expected_status=200)
+        self.__invalidate('timesheet', timesheet_id, your_timesheet_id)
+        return resp
+
+    async def __approve_timesheet(self, timesheet_id, your_timesheet_id = None):
+        resp = await self.__request(f'/timesheet/{timesheet_id}/action/approve', method='POST', expected_status=200)
+        self.__invalidate('timesheet', timesheet_id, your_timesheet_id)
+        return resp
+
+    async def __add_shift_to_timesheet(self, shift, timesheet_id):
+        shift['timesheet_id'] = timesheet_id
+        return (await self.__request('/shift', method='POST', body=shift))['id']
+
+    async def __add_expense_to_timesheet(self, expense, timesheet_id):
+        expense['timesheet_id'] = timesheet_id
+        return (await self.__request('/expense', method='POST', body=expense))['id']
+
+    async def __add_deliverable_to_timesheet(self, deliverable, timesheet_id):
+        deliverable['timesheet_id'] = timesheet_id
+        return (await self.__request('/deliverable', method='POST', body=deliverable))['id']
+
+    async def __get_job_extended(self, job_id, scope):
+        # with a scope, job_id is your ext_id: its GreenLight id comes from the id index if it has it,
+        # saving the get_job call, otherwise from get_job
+        if not scope: return await self.get_job_extended(job_id)
+        gl_job_id = self.__indexed_id('job', job_id, scope)
+        if gl_job_id:
+            try:
+                job_extended = await self.get_job_extended(gl_job_id)
+                if carries_ext_id(job_extended, scope, job_id): return job_extended
+            except GreenLightHTTPError as err:
+                if err.status_code != 404: raise
+            # the job was deleted or given another ext_id since it was indexed
+            self.id_index.forget('job', scope, job_id)
+        return await self.get_job_extended((await self.get_job(job_id, scope))['id'])
+
+    def __indexed_id(self, endpoint, id, scope):
+        if not self.id_index: return None
+        gl_id = self.id_index.get(endpoint, scope, id)
+        if self.metrics: self.metrics.on_cache('id_index', endpoint, gl_id is not None)
+        return gl_id
+
+    async def __fetch_endpoint(self, endpoint, id, scope = None, queryparams = {}):
+        if self.cache:
+            record = self.cache.get(endpoint, id, scope, queryparams)
+            if self.metrics: self.metrics.on_cache('record', endpoint, record is not None)
+            if record is not None: return record
+
+        allparams = queryparams.copy()
+        if scope: allparams['scope'] = scope
+        record = await self.__request(f'/{endpoint}/{id}', queryparams=allparams)
+        if self.cache: self.cache.put(endpoint, id, scope, queryparams, record)
+        if self.id_index: self.id_index.remember(endpoint, record)
+
+        # in future this will return only relevant fields; for now it returns everything
+        return record
+
+    def __invalidate(self, endpoint, *ids):
+        if self.cache: self.cache.invalidate(endpoint, *ids)
+        if self.conditional_cache: self.conditional_cache.invalidate(*[f'/{endpoint}/{id}' for id in ids if id is not None])
+        if self.mirror: self.mirror.touch(endpoint, *ids)
+
+    def __remember(self, endpoint, id, record):
+        if self.id_index: self.id_index.put(endpoint, record.get('ext_id_scope'), record.get('ext_id'), id)
+
+    def __create_session(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.__pool_maxsize,
+            limit_per_host=self.__pool_maxsize_per_host,
+            keepalive_timeout=self.__keepalive_timeout if self.__keep_alive else None,
+            force_close=not self.__keep_alive
+        )
+        # aiohttp decodes gzip and deflate responses itself
+        headers = {'Accept-Encoding': self.compression.accept_encoding or 'gzip, deflate'} if self.compression else None
+        return aiohttp.ClientSession(connector=connector, headers=headers)
+
+    def __get_api_url(self, path_relative: str, queryparams: dict):
+        url = self.base_url.strip('/') + '/' + path_relative.strip('/')
+        querystring = ('?' + urlencode(queryparams)) if queryparams else ''
+        return url + querystring
+
+    async def __request(
+        self,
+        path_relative: str,
+        method: str = 'GET',
+        queryparams: dict = {},
+        expected_status: int = 0,
+        body: dict = {}
+    ):
+        url = self.__get_api_url(path_relative, queryparams)
+        headers = {'x-api-key': self.apikey}
+        method = method.upper()
+
+        if _greenlight.VERBOSE: print(method, url)
+
+        if ('ext_id' in body) and not ('ext_id_scope' in body and body['ext_id_scope']):
+            body['ext_id_scope'] = self.scope()
+
+        if self.session is None:
+            self.session = self.__create_session()
+
+        if method == 'GET':
+            if expected_status == 0: expected_status = 200
+        elif method == 'POST':
+            if expected_status == 0: expected_status = 201
+        elif method == 'DELETE':
+            if expected_status == 0: expected_status = 204
+        elif method == 'PUT':
+            if expected_status == 0: expected_status = 204
+        else:
+            raise ValueError(f'Unsupported http method {method}')
+
+        # conditional cache as in GreenLight
+        conditional_cache = self.conditional_cache if method == 'GET' else None
+        if conditional_cache:
+            cache_key = url[len(self.base_url.strip('/')):]
+            cached = conditional_cache.lookup(cache_key)
+            if cached:
+                if not cached[1]: return self.codec.loads(cached[0])
+                headers.update(cached[1])
+
+        data = raw_data = None
+        if method in ('POST', 'PUT'):
+            data = raw_data = self.codec.dumps(body)
+            headers['Content-Type'] = 'application/json'
+            if self.compression:
+                data, encoding = self.compression.encode(raw_data)
+                if encoding: headers['Content-Encoding'] = encoding
+        if method == 'GET' and self.single_flight:
+            # concurrent identical GETs share one response, as in GreenLight
+            resp, content = await self.single_flight.do_async(request_key(method, url, headers), lambda: self.__send(method, url, headers, None, 0))
+        else:
+            resp, content = await self.__send(method, url, headers, data, len(raw_data or b''))
+        if resp.status == 415 and 'Content-Encoding' in headers:
+            self.compression.reject(headers.pop('Content-Encoding'))
+            resp, content = await self.__send(method, url, headers, raw_data, len(raw_data))
+
+        if conditional_cache and cached and resp.status == 304:
+            return self.codec.loads(conditional_cache.revalidated_body(cache_key, cached[0]))
+        if (resp.status != expected_status):
+            raise GreenLightHTTPError(method, url, resp.status, content.decode(errors='replace'))
+        if conditional_cache: conditional_cache.store(cache_key, resp.headers, content)
+
+        return self.codec.loads(content) if resp.status != 204 else {}
+
+    async def __request_stream(self, path_relative: str, queryparams: dict = {}):
+        # GET a JSON array and yield its elements as they are parsed off the wire; retried like __send
+        # until the response status arrives, but not once the body has started
+        url = self.__get_api_url(path_relative, queryparams)
+        headers = {'x-api-key': self.apikey}
+
+        if _greenlight.VERBOSE: print('GET', url)
+
+        if self.session is None:
+            self.session = self.__create_session()
+
+        conditional_cache = self.conditional_cache
+        cache_key = cached = None
+        if conditional_cache:
+            cache_key = url[len(self.base_url.strip('/')):]
+            cached = conditional_cache.lookup(cache_key)
+            if cached:
+                if not cached[1]:
+                    for element in self.__parse_array(cached[0]):
+                        yield element
+                    return
+                headers.update(cached[1])
+
+        # streams are not coalesced by single flight, as in GreenLight
+        async for element in self.__stream_array(url, headers, cache_key, cached):
+            yield element
+
+    async def __stream_array(self, url, headers, cache_key, cached):
+        # yields the elements of a streamed JSON array, retried like __send until the response status arrives
+        conditional_cache = self.conditional_cache if cache_key else None
+        rate_controller = self.rate_controller
+        attempt = 0
+        while True:
+            if rate_controller: await rate_controller.acquire_async()
+            with self.tracer.span('HTTP GET', {'path': url[len(self.base_url.strip('/')):], 'attempt': attempt}) as span:
+                started = time.monotonic()
+                status = latency = resp = None
+                try:
+                    resp = await self.session.get(url, headers=headers)
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    latency = time.monotonic() - started
+                    event = self.__record_request('GET', url, None, latency, 0, 0, None, None, attempt)
+                    if not rate_controller or not rate_controller.should_retry('GET', None, attempt): raise
+                    self.__record_retry(event)
+                    delay = rate_controller.retry_delay(attempt)
+                else:
+                    latency = time.monotonic() - started
+                    status = resp.status
+                    span.set_attribute('status', status)
+                finally:
+                    # the slot covers the request up to its status, as in __send
+                    if rate_controller: rate_controller.release(status, latency)
+            if resp is None:
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            async with resp:
+                event = self.__record_request('GET', url, resp.status, latency, 0, 0, resp.content_length, None, attempt)
+                if rate_controller and resp.status != 200 and rate_controller.should_retry('GET', resp.status, attempt):
+                    self.__record_retry(event)
+                    delay = rate_controller.retry_delay(attempt, resp.headers.get('Retry-After'))
+                    resp.release()
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+
+                if conditional_cache and cached and resp.status == 304:
+                    for element in self.__parse_array(conditional_cache.revalidated_body(cache_key, cached[0])):
+                        yield element
+                    return
+                if (resp.status != 200):
+                    raise GreenLightHTTPError('GET', url, resp.status, await resp.text())
+                parser = JsonArrayParser()
+                chunks = [] if conditional_cache else None
+                raw_bytes = 0
+                async for chunk in resp.content.iter_chunked(STREAM_CHUNK_SIZE):
+                    raw_bytes += len(chunk)
+                    if chunks is not None: chunks.append(chunk)
+                    for element in parser.feed(chunk):
+                        yield element
+                for element in parser.close():
+                    yield element
+                if conditional_cache: conditional_cache.store(cache_key, resp.headers, b''.join(chunks))
+                if self.compression:
+                    self.compression.learn(resp.headers)
+                    self.compression.record(0, 0, raw_bytes, resp.content_length if resp.content_length is not None else raw_bytes)
+                return
+
+    def __parse_array(self, content):
+        parser = JsonArrayParser()
+        return parser.feed(content) + parser.close()
+
+    async def __send(self, method, url, headers, data, raw_size):
+        # same retry and pacing rules as GreenLight; returns the response and its fully read body
+        rate_controller = self.rate_controller
+        attempt = 0
+        while True:
+            if rate_controller: await rate_controller.acquire_async()
+            with self.tracer.span(f'HTTP {method}', {'path': url[len(self.base_url.strip('/')):], 'attempt': attempt}) as span:
+                started = time.monotonic()
+                status = latency = None
+                try:
+                    async with self.session.request(method, url, data=data, headers=headers) as resp:
+                        content = await resp.read()
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    latency = time.monotonic() - started
+                    event = self.__record_request(method, url, None, latency, len(data or b''), raw_size, None, None, attempt)
+                    if not rate_controller or not rate_controller.should_retry(method, None, attempt): raise
+                    self.__record_retry(event)
+                    delay = rate_controller.retry_delay(attempt)
+                else:
+                    latency = time.monotonic() - started
+                    status = resp.status
+                    span.set_attribute('status', status)
+                    # the body is decoded as it is read, so its wire size is known only from Content-Length
+                    response_bytes = resp.content_length if resp.content_length is not None else len(content)
+                    if self.compression:
+                        self.compression.learn(resp.headers)
+                        self.compression.record(raw_size, len(data or b''), len(content), response_bytes)
+                    event = self.__record_request(method, url, status, latency, len(data or b''), raw_size, response_bytes, len(content), attempt)
+                    if not rate_controller or not rate_controller.should_retry(method, status, attempt): return resp, content
+                    self.__record_retry(event)
+                    delay = rate_controller.retry_delay(attempt, resp.headers.get('Retry-After'))
+                finally:
+                    # as in GreenLight, including when the task is cancelled
+                    if rate_controller: rate_controller.release(status, latency)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def __record_request(self, method, url, status, latency, request_bytes, request_raw_bytes, response_bytes, response_raw_bytes, attempt):
+        if not self.metrics: return None
+        event = {
+            'method': method,
+            'endpoint': endpoint_template(url[len(self.base_url.strip('/')):]),
+            'url': url,
+            'status': status,
+            'latency': latency,
+            'request_bytes': request_bytes,
+            'request_raw_bytes': request_raw_bytes,
+            'response_bytes': response_bytes,
+            'response_raw_bytes': response_raw_bytes,
+            'attempt': attempt
+        }
+        self.metrics.on_request(event)
+        return event
+
+    def __record_retry(self, event):
+        if event: self.metrics.on_retry(event)
+
+    async def __get_profile(self):
+        profiles_json = await self.__request('/profile')
+        if (len(profiles_json) != 1):
+            raise ValueError(f'Your API user has {len(profiles_json)} profiles, but should have exactly 1.  Please contact support.')
+        full_profile = profiles_json[0]
+        profile = {
+            'role': full_profile['role'],
+            'resource': full_profile['resource'],
+            'resource_id': full_profile['resource_id'],
+            'user_id': full_profile['user_id'] if 'user_id' in full_profile else None
+        }
+
+        if (profile['resource'] == 'admin'):
+            self.admin = await self.get_admin(profile['resource_id'])
+            self.client = {}
+        elif (profile['resource'] == 'client'):
+            self.client = await self.get_client(profile['resource_id'])
+            self.admin = await self.get_admin(self.client['admin_id'])
+        else:
+            raise ValueError('API is only supported for admin or client user types')
+
+        return profile
@@ -0,0 +1,175 @@
+"""
+    Streaming bulk upload of shifts, expenses and deliverables from CSV or NDJSON files.
+
+    Records are read lazily and grouped into one timesheet per job and week, using the same week
+    (first Sunday on or after the record's local date) that calculate_period_ending computes.
+    Grouping spills records to partition files by job_id, so memory is bounded by the largest
+    partition rather than the whole input, whatever order the input is in.
+"""
+
+from .common import calculate_period_ending
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+import csv
+import json
+import os
+import tempfile
+import threading
+import zlib
+
+RECORD_TYPES = ('shift', 'expense', 'deliverable')
+DATE_FIELDS = {'shift': 'time_in', 'expense': 'expense_date', 'deliverable': 'date'}
+INT_FIELDS = ('minutes',)
+NUMBER_FIELDS = ('amount', 'rate')
+CONTROL_FIELDS = ('type', 'your_timesheet_id')
+
+
+def read_records(path):
+    """Yield records one at a time from a .csv or .ndjson/.jsonl file."""
+    if path.endswith('.csv'):
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                yield _from_csv_row(row)
+    else:
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+def record_type(record):
+    if 'type' in record:
+        if record['type'] not in RECORD_TYPES:
+            raise ValueError(f"Unknown record type {record['type']}, expected one of {', '.join(RECORD_TYPES)}")
+        return record['type']
+    if 'time_in' in record: return 'shift'
+    if 'expense_date' in record: return 'expense'
+    if 'date' in record: return 'deliverable'
+    raise ValueError(f'Cannot tell whether record is a shift, expense or deliverable: {record}')
+
+def week_ending(record, type = None):
+    type = type or record_type(record)
+    local_date = date.fromisoformat(record[DATE_FIELDS[type]][:10])
+    return local_date + timedelta(6 - local_date.weekday())
+
+def group_timesheets(records, partitions = 64, tmpdir = None):
+    """Yield one group per (job_id, kind, week): {'job_id', 'kind', 'week_ending', 'your_timesheet_id', 'shifts', 'expenses', 'deliverables'}.
+
+    kind is 'hours' for shifts and expenses, or 'deliverables'; each kind becomes its own timesheet.
+    """
+    with tempfile.TemporaryDirectory(dir=tmpdir) as spill_dir:
+        paths = [os.path.join(spill_dir, f'{i}.ndjson') for i in range(partitions)]
+        files = [open(path, 'w') for path in paths]
+        try:
+            for record in records:
+                partition = zlib.crc32(str(record['job_id']).encode()) % partitions
+                files[partition].write(json.dumps(record) + '\n')
+        finally:
+            for f in files: f.close()
+
+        for path in paths:
+            yield from _group_partition(read_records(path))
+            os.remove(path)
+
+def bulk_upload(greenlight, groups, concurrency = 4, max_pending = 0, manifest = None, approve = False, line_item_concurrency = 1):
+    """Upload timesheet groups concurrently, and return {'uploaded': n, 'failed': n}.
+
+    At most max_pending groups (default 2 * concurrency) are held in memory at once; the groups
+    iterable is only advanced when a slot frees up.  If manifest is an open file, one JSON line
+    per group is written mapping its ext_id to the GreenLight timesheet id, or to the error.
+    """
+    slots = threading.BoundedSemaphore(max_pending or 2 * concurrency)
+    lock = threading.Lock()
+    summary = {'uploaded': 0, 'failed': 0}
+
+    def upload(group):
+        try:
+            try:
+                result = _upload_group(greenlight, group, approve, line_item_concurrency)
+            except Exception as err:
+                result = _manifest_entry(group, error=err)
+            with lock:
+                summary['uploaded' if result['status'] == 'ok' else 'failed'] += 1
+                if manifest: manifest.write(json.dumps(result) + '\n')
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for group in groups:
+            slots.acquire()
+            executor.submit(upload, group)
+
+    return summary
+
+def bulk_upload_files(greenlight, paths, partitions = 64, **kwargs):
+    def all_records():
+        for path in paths:
+            yield from read_records(path)
+    return bulk_upload(greenlight, group_timesheets(all_records(), partitions), **kwargs)
+
+
+## private functions
+def _from_csv_row(row):
+    record = {key: value for key, value in row.items() if value not in ('', None)}
+    for key in INT_FIELDS:
+        if key in record: record[key] = int(record[key])
+    for key in NUMBER_FIELDS:
+        if key in record:
+            number = float(record[key])
+            record[key] = int(number) if number.is_integer() else number
+    return record
+
+def _group_partition(records):
+    groups = {}
+    for record in records:
+        type = record_type(record)
+        kind = 'deliverables' if type == 'deliverable' else 'hours'
+        key = (record['job_id'], kind, week_ending(record, type))
+        if key not in groups:
+            groups[key] = {
+                'job_id': key[0],
+                'kind': kind,
+                'week_ending': key[2].isoformat(),
+                'your_timesheet_id': None,
+                'shifts': [],
+                'expenses': [],
+                'deliverables': []
+            }
+        group = groups[key]
+        if not group['your_timesheet_id'] and record.get('your_timesheet_id'):
+            group['your_timesheet_id'] = record['your_timesheet_id']
+        item = {field: value for field, value in record.items() if field not in CONTROL_FIELDS}
+        group[type + 's'].append(item)
+
+    for group in groups.values():
+        if not group['your_timesheet_id']:
+            suffix = '-d' if group['kind'] == 'deliverables' else ''
+            group['your_timesheet_id'] = f"{group['job_id']}-{group['week_ending']}{suffix}"
+        yield group
+
+def _upload_group(greenlight, group, approve, line_item_concurrency):
+    if group['kind'] == 'deliverables':
+        timesheet_id = greenlight.create_timesheet_with_deliverables(
+            group['deliverables'], group['your_timesheet_id'], approve=approve, max_concurrency=line_item_concurrency)
+        return _manifest_entry(group, timesheet_id)
+
+    if not group['shifts']:
+        raise ValueError('Expenses can only be uploaded on a timesheet with at least one shift')
+    shifts_expenses = {'shifts': group['shifts'], 'expenses': group['expenses']}
+    timesheet_id = greenlight.create_timesheet_with_shifts_expenses(
+        shifts_expenses, group['your_timesheet_id'], approve=approve, max_concurrency=line_item_concurrency)
+    return _manifest_entry(group, timesheet_id)
+
+def _manifest_entry(group, timesheet_id = None, error = None):
+    if group['kind'] == 'deliverables':
+        period_ending = calculate_period_ending(deliverables=group['deliverables'])
+    else:
+        period_ending = calculate_period_ending(shifts=group['shifts']) if group['shifts'] else None
+    entry = {
+        'ext_id': group['your_timesheet_id'],
+        'timesheet_id': timesheet_id,
+        'job_id': group['job_id'],
+        'period_ending': period_ending,
+        'status': 'error' if error else 'ok'
+    }
+    if error: entry['error'] = str(error)
+    return entry
@@ -0,0 +1,180 @@
+from collections import OrderedDict
+import copy
+import threading
+import time
+
+DEFAULT_TTL = 300
+
+# reference data that changes rarely, and may be reused without revalidation when it has no validators
+REFERENCE_TTLS = {'question': DEFAULT_TTL, 'version': DEFAULT_TTL}
+
+
+class RecordCache():
+    """In-memory LRU cache for records fetched by id, with per-endpoint TTLs.
+
+    Entries are keyed on (endpoint, id, scope, queryparams).  Each entry is also indexed under its
+    GreenLight id and ext_id, so a write to a record drops every cached variant of it (by either id,
+    with or without extended=true).  Records are copied in and out, so callers may mutate them freely.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = DEFAULT_TTL, ttls: dict = {}):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.ttls = dict(ttls)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.__entries = OrderedDict()   # key -> (expires_at, record, index_ids)
+        self.__index = {}                # (endpoint, id) -> set of keys
+        self.__lock = threading.RLock()
+
+    def get(self, endpoint, id, scope = None, queryparams = {}):
+        key = self.__key(endpoint, id, scope, queryparams)
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.__entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry[1])
+            if entry: self.__remove(key)
+            self.misses += 1
+            return None
+
+    def put(self, endpoint, id, scope, queryparams, record):
+        ttl = self.ttls.get(endpoint, self.ttl)
+        if not ttl or not self.maxsize: return
+        key = self.__key(endpoint, id, scope, queryparams)
+        index_ids = {(endpoint, str(id))}
+        if isinstance(record, dict):
+            for field in ('id', 'ext_id'):
+                if record.get(field): index_ids.add((endpoint, str(record[field])))
+
+        with self.__lock:
+            if key in self.__entries: self.__remove(key)
+            self.__entries[key] = (time.monotonic() + ttl, copy.deepcopy(record), index_ids)
+            for index_id in index_ids:
+                self.__index.setdefault(index_id, set()).add(key)
+            while len(self.__entries) > self.maxsize:
+                self.__remove(next(iter(self.__entries)))
+                self.evictions += 1
+
+    def invalidate(self, endpoint, *ids):
+        with self.__lock:
+            for id in ids:
+                if id is None: continue
+                for key in list(self.__index.get((endpoint, str(id)), ())):
+                    self.__remove(key)
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+            self.__index.clear()
+
+    def stats(self):
+        with self.__lock:
+            return {
+                'size': len(self.__entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+    def __key(self, endpoint, id, scope, queryparams):
+        return (endpoint, str(id), scope, tuple(sorted(queryparams.items())))
+
+    def __remove(self, key):
+        _, _, index_ids = self.__entries.pop(key)
+        for index_id in index_ids:
+            keys = self.__index.get(index_id)
+            if keys is None: continue
+            keys.discard(key)
+            if not keys: del self.__index[index_id]
+
+
+class ConditionalCache():
+    """LRU cache of GET response bodies for conditional requests, keyed by request path and query.
+
+    Responses carrying an ETag or Last-Modified are revalidated on every use, by sending
+    If-None-Match / If-Modified-Since; a 304 Not Modified is answered from the cache.  Responses
+    without validators are served from the cache, unchecked, for the TTL of their endpoint (the first
+    path segment) in ttls, or ttl for the others.  By default that is only reference data
+    (REFERENCE_TTLS); records like jobs and timesheets are not kept, since a stale status would be
+    served for the whole TTL.  Bodies are kept as raw bytes, so each caller decodes its own copy.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 0, ttls: dict = REFERENCE_TTLS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.ttls = dict(ttls)
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_saved = 0
+        self.__entries = OrderedDict()   # key -> (expires_at or None, conditional_headers, body)
+        self.__lock = threading.Lock()
+
+    def lookup(self, key):
+        # returns (body, conditional_headers) or None; empty conditional_headers mean the body is fresh as it is
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, conditional_headers, body = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self.__entries[key]
+                self.misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            if expires_at is not None:
+                self.hits += 1
+                self.bytes_saved += len(body)
+            return body, conditional_headers
+
+    def revalidated_body(self, key, body):
+        # the server answered 304 for a body returned by lookup()
+        with self.__lock:
+            self.revalidated += 1
+            self.bytes_saved += len(body)
+        return body
+
+    def store(self, key, headers, body):
+        conditional_headers = {}
+        if headers.get('ETag'): conditional_headers['If-None-Match'] = headers['ETag']
+        if headers.get('Last-Modified'): conditional_headers['If-Modified-Since'] = headers['Last-Modified']
+        ttl = self.ttls.get(key.split('?', 1)[0].strip('/').split('/')[0], self.ttl)
+        if not self.maxsize or not (conditional_headers or ttl): return
+        expires_at = None if conditional_headers else time.monotonic() + ttl
+
+        with self.__lock:
+            self.__entries.pop(key, None)
+            self.__entries[key] = (expires_at, conditional_headers, body)
+            while len(self.__entries) > self.maxsize:
+                self.__entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *paths):
+        # drops the responses for each path, with any query, and for the paths beneath it
+        with self.__lock:
+            for key in list(self.__entries):
+                path = key.split('?', 1)[0]
+                if any(path == prefix or path.startswith(prefix + '/') for prefix in paths):
+                    del self.__entries[key]
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+
+    def stats(self):
+        with self.__lock:
+            return {
+                'size': len(self.__entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'revalidated': self.revalidated,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'bytes_saved': self.bytes_saved
+            }
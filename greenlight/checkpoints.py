@@ -0,0 +1,147 @@
+import hashlib
+import json
+import sqlite3
+import threading
+
+
+class Checkpoint():
+    """Progress of one multi-step operation: named values (e.g. the created timesheet id) and finished steps.
+
+    This base class records nothing, for operations that are not checkpointed.
+    """
+
+    def get(self, name):
+        return None
+
+    def set(self, name, value):
+        pass
+
+    def done(self, step):
+        return False
+
+    def mark(self, step):
+        pass
+
+    def complete(self):
+        pass
+
+NOOP_CHECKPOINT = Checkpoint()
+
+
+class StoredCheckpoint(Checkpoint):
+    def __init__(self, store, operation, key, values):
+        self.store = store
+        self.operation = operation
+        self.key = key
+        self.values = values
+
+    def get(self, name):
+        return self.values.get(name)
+
+    def set(self, name, value):
+        self.values[name] = value
+        self.store._save(self.operation, self.key, name, value)
+
+    def done(self, step):
+        if step in self.values:
+            self.store._skipped()
+            return True
+        return False
+
+    def mark(self, step):
+        self.set(step, True)
+
+    def complete(self):
+        self.store.discard(self.operation, self.key)
+
+
+class Checkpoints():
+    """Step-level checkpoints for the SDK's multi-step operations, keyed by your id for them.
+
+    With GreenLight(checkpoints=Checkpoints()), create_timesheet_with_shifts_expenses and
+    create_timesheet_with_deliverables (keyed by your_timesheet_id) and invite_worker (keyed by
+    your_job_id) record each step as it succeeds.  Calling them again with the same id after a
+    failure reuses the timesheet or job already created and skips the line items and steps already
+    done; a checkpoint is dropped once its operation completes.  Held in memory; give it a path to
+    keep them in SQLite, so a later process can resume.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path
+        self.resumed = 0
+        self.steps_skipped = 0
+        self.__checkpoints = {}
+        self.__lock = threading.Lock()
+        self.__db = None
+        if path:
+            self.__db = sqlite3.connect(path, check_same_thread=False)
+            self.__db.execute('''CREATE TABLE IF NOT EXISTS checkpoints (
+                operation TEXT NOT NULL,
+                key TEXT NOT NULL,
+                name TEXT NOT NULL,
+                value TEXT NOT NULL,
+                PRIMARY KEY (operation, key, name)
+            )''')
+            self.__db.commit()
+
+    def begin(self, operation, key):
+        if not key: return NOOP_CHECKPOINT
+        id = (operation, str(key))
+        with self.__lock:
+            values = self.__checkpoints.get(id)
+            if values is None and self.__db:
+                rows = self.__db.execute('SELECT name, value FROM checkpoints WHERE operation = ? AND key = ?', id).fetchall()
+                values = {name: json.loads(value) for name, value in rows} or None
+            if values is None:
+                values = {}
+            else:
+                self.resumed += 1
+            self.__checkpoints[id] = values
+        return StoredCheckpoint(self, operation, str(key), values)
+
+    def has(self, operation, key):
+        id = (operation, str(key))
+        with self.__lock:
+            if self.__checkpoints.get(id): return True
+            if not self.__db: return False
+            return self.__db.execute('SELECT 1 FROM checkpoints WHERE operation = ? AND key = ? LIMIT 1', id).fetchone() is not None
+
+    def discard(self, operation, key):
+        id = (operation, str(key))
+        with self.__lock:
+            self.__checkpoints.pop(id, None)
+            if self.__db:
+                self.__db.execute('DELETE FROM checkpoints WHERE operation = ? AND key = ?', id)
+                self.__db.commit()
+
+    def pending(self):
+        # (operation, key) of every checkpoint left by an operation that has not completed
+        with self.__lock:
+            ids = {id for id, values in self.__checkpoints.items() if values}
+            if self.__db: ids.update(self.__db.execute('SELECT DISTINCT operation, key FROM checkpoints').fetchall())
+        return sorted(ids)
+
+    def stats(self):
+        return {'pending': len(self.pending()), 'resumed': self.resumed, 'steps_skipped': self.steps_skipped}
+
+    def close(self):
+        if self.__db:
+            self.__db.close()
+            self.__db = None
+
+    def _save(self, operation, key, name, value):
+        if not self.__db: return
+        with self.__lock:
+            self.__db.execute('INSERT OR REPLACE INTO checkpoints (operation, key, name, value) VALUES (?, ?, ?, ?)',
+                (operation, key, name, json.dumps(value)))
+            self.__db.commit()
+
+    def _skipped(self):
+        with self.__lock:
+            self.steps_skipped += 1
+
+
+def line_item_step(type, index, item):
+    # identifies a line item by its position and content, so a changed list does not skip the wrong items
+    content = json.dumps({key: value for key, value in item.items() if key != 'timesheet_id'}, sort_keys=True, default=str)
+    return f'{type}:{index}:{hashlib.sha1(content.encode()).hexdigest()[:16]}'
@@ -0,0 +1,71 @@
+import json
+import math
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class JsonCodec():
+    """Encodes request bodies to bytes and decodes response bodies, with the standard library.
+
+    Encoding matches what requests does for json=: UTF-8 bytes, ASCII-escaped, NaN and infinity refused.
+    """
+
+    name = 'json'
+
+    def dumps(self, obj) -> bytes:
+        return json.dumps(obj, allow_nan=False).encode('utf-8')
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class OrjsonCodec(JsonCodec):
+    """JsonCodec using orjson, several times faster on large bodies.  Opt in with codec=OrjsonCodec().
+
+    The bytes differ (compact, not ASCII-escaped) but decode to the same values.  Dates, dataclasses,
+    integers beyond 64 bits and NaN or infinity (which orjson would write as null) go through JsonCodec
+    instead, so they fail or succeed as they would without orjson.  Other types orjson encodes natively
+    and the standard library refuses are encoded: UUIDs as their string, Enums as their value, numpy
+    arrays as lists.
+    """
+
+    name = 'orjson'
+
+    def __init__(self):
+        if orjson is None:
+            raise ImportError('OrjsonCodec requires the orjson package')
+        self.__options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+    def dumps(self, obj) -> bytes:
+        try:
+            data = orjson.dumps(obj, default=_unsupported, option=self.__options)
+        except orjson.JSONEncodeError:
+            return super().dumps(obj)
+        # orjson writes NaN and infinity as null, so only a body with nulls can hide one
+        if b'null' in data and _has_non_finite(obj): return super().dumps(obj)
+        return data
+
+    def loads(self, data):
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # e.g. NaN tokens or integers beyond 64 bits, which the standard library accepts
+            return super().loads(data)
+
+
+def default_codec():
+    """JsonCodec, whether or not orjson is installed, so the bodies a GreenLight accepts do not depend on it."""
+    return JsonCodec()
+
+
+def _unsupported(obj):
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+def _has_non_finite(obj):
+    if isinstance(obj, float): return not math.isfinite(obj)
+    if isinstance(obj, dict): return any(_has_non_finite(value) for value in obj.values())
+    if isinstance(obj, (list, tuple)): return any(_has_non_finite(value) for value in obj)
+    return False
@@ -0,0 +1,154 @@
+"""
+    Vectorized timesheet grouping for columnar shifts, expenses and deliverables (requires numpy).
+
+    Each record type is given as a mapping of column name -> array (a dict of numpy arrays or lists,
+    or a pandas DataFrame), one row per record, with at least job_id and its date column (time_in,
+    expense_date or date).  Rows are bucketed by the first Sunday on or after their local date, the
+    date as written before the offset, exactly as calculate_period_ending and bulk.group_timesheets
+    do: a shift at 2020-01-12T23:30:00-08:00 belongs to the week ending 2020-01-12 although it is
+    Monday in UTC.  The groups have the shape group_timesheets yields, so bulk_upload takes them.
+"""
+
+from .bulk import DATE_FIELDS, CONTROL_FIELDS
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DELIVERABLE_OFFSET = '-05:00'  # calculate_period_ending's offset when there are no shifts
+
+
+def week_endings(dates):
+    """First Sunday on or after each date, as datetime64[D].
+
+    dates are ISO 8601 strings (only the leading YYYY-MM-DD is read) or datetime64 values.
+    """
+    _require_numpy()
+    days = _local_days(dates)
+    # 1970-01-01 was a Thursday, so the Monday-based weekday is (days + 3) % 7
+    weekdays = (days.astype(np.int64) + 3) % 7
+    return days + (6 - weekdays).astype('timedelta64[D]')
+
+def group_timesheet_columns(shifts = None, expenses = None, deliverables = None):
+    """Return one group per (job_id, kind, week), like bulk.group_timesheets, from columnar records.
+
+    Groups are ordered by job_id, kind ('hours' first) and week, and line items keep their input
+    order.  Each group also carries the period_ending calculate_period_ending gives for its line
+    items (None for an hours group without shifts, which cannot be uploaded).
+    """
+    _require_numpy()
+    tables = [(type, _columns(type, table)) for type, table in (('shift', shifts), ('expense', expenses), ('deliverable', deliverables))
+        if table is not None]
+    sizes = [len(columns[DATE_FIELDS[type]]) for type, columns in tables]
+    if not sum(sizes): return []
+
+    job_ids = np.concatenate([columns['job_id'].astype(str) for type, columns in tables])
+    weeks = np.concatenate([week_endings(columns[DATE_FIELDS[type]]) for type, columns in tables])
+    # shifts and expenses share an 'hours' timesheet, deliverables get their own
+    kinds = np.concatenate([np.full(size, type == 'deliverable') for (type, columns), size in zip(tables, sizes)])
+    times = np.concatenate([columns['time_in'].astype(str) if type == 'shift' else np.full(size, '')
+        for (type, columns), size in zip(tables, sizes)])
+
+    job_names, job_codes = _factorize(job_ids)
+    # lexsort is stable and sorts by its last key first, so rows keep their input order within a group
+    order = np.lexsort((weeks, kinds, job_codes))
+    codes, sorted_kinds, sorted_weeks = job_codes[order], kinds[order], weeks[order]
+    changes = (codes[1:] != codes[:-1]) | (sorted_kinds[1:] != sorted_kinds[:-1]) | (sorted_weeks[1:] != sorted_weeks[:-1])
+    starts = np.concatenate(([0], np.flatnonzero(changes) + 1))
+    group_of = np.empty(len(order), dtype=np.int64)
+    group_of[order] = np.cumsum(np.concatenate(([0], changes)))
+
+    # each group's latest time_in, compared as strings like calculate_period_ending's max(); rows that
+    # are not shifts count as ''.  max() over list slices beats sorting a million strings in numpy
+    sorted_times = times[order].tolist()
+    latest = [max(sorted_times[start:end]) for start, end in zip(starts.tolist(), np.append(starts[1:], len(order)).tolist())]
+    your_timesheet_ids = _first_per_group(tables, sizes, order, group_of, len(starts))
+
+    groups = []
+    names = job_names[codes[starts]].tolist()
+    week_strings = np.datetime_as_string(sorted_weeks[starts], unit='D').tolist()
+    for job_id, deliverable, week_ending, last_time_in, your_timesheet_id in zip(
+            names, sorted_kinds[starts].tolist(), week_strings, latest, your_timesheet_ids):
+        if deliverable:
+            period_ending = f'{week_ending}T22:59:59{DELIVERABLE_OFFSET}'
+        else:
+            period_ending = f'{week_ending}T22:59:59{last_time_in[-6:]}' if last_time_in else None
+        groups.append({
+            'job_id': job_id,
+            'kind': 'deliverables' if deliverable else 'hours',
+            'week_ending': week_ending,
+            'your_timesheet_id': your_timesheet_id or f"{job_id}-{week_ending}{'-d' if deliverable else ''}",
+            'shifts': [],
+            'expenses': [],
+            'deliverables': [],
+            'period_ending': period_ending
+        })
+
+    offset = 0
+    for (type, columns), size in zip(tables, sizes):
+        type_groups = group_of[offset:offset + size]
+        type_order = np.argsort(type_groups, kind='stable')
+        items = _items(columns, type_order)
+        group_ids, group_starts = np.unique(type_groups[type_order], return_index=True)
+        for group_id, start, end in zip(group_ids.tolist(), group_starts.tolist(), np.append(group_starts[1:], size).tolist()):
+            groups[group_id][type + 's'] = items[start:end]
+        offset += size
+    return groups
+
+
+## private functions
+def _require_numpy():
+    if np is None:
+        raise ImportError('Columnar timesheet grouping requires the numpy package')
+
+def _local_days(dates):
+    dates = np.asarray(dates)
+    if np.issubdtype(dates.dtype, np.datetime64):
+        return dates.astype('datetime64[D]')
+    return dates.astype(str).astype('U10').astype('datetime64[D]')
+
+def _columns(type, table):
+    date_field = DATE_FIELDS[type]
+    columns = {name: np.asarray(table[name]) for name in table.keys()}
+    for required in ('job_id', date_field):
+        if required not in columns:
+            raise ValueError(f'{type} columns need a {required} column')
+    if type == 'shift' and np.issubdtype(columns['time_in'].dtype, np.datetime64):
+        raise ValueError('time_in must be ISO 8601 strings with their UTC offset, not datetime64')
+    if np.issubdtype(columns[date_field].dtype, np.datetime64):
+        columns[date_field] = np.datetime_as_string(columns[date_field], unit='D')
+    return columns
+
+def _factorize(values):
+    # (sorted unique values, code per row); a dict pass is several times faster than np.unique on strings
+    codes = {}
+    row_codes = np.fromiter((codes.setdefault(value, len(codes)) for value in values.tolist()), dtype=np.int64, count=len(values))
+    names = np.array(list(codes), dtype=values.dtype)
+    rank = np.empty(len(names), dtype=np.int64)
+    rank[np.argsort(names, kind='stable')] = np.arange(len(names))
+    return np.sort(names), rank[row_codes]
+
+def _items(columns, order):
+    # line item dicts in the given row order; None values are left out, as empty CSV fields are
+    names = [name for name in columns if name not in CONTROL_FIELDS]
+    values = [columns[name][order] for name in names]
+    items = [dict(zip(names, row)) for row in zip(*(column.tolist() for column in values))]
+    for name, column in zip(names, values):
+        if column.dtype == object:
+            for index in np.flatnonzero(np.equal(column, None)).tolist():
+                del items[index][name]
+    return items
+
+def _first_per_group(tables, sizes, order, group_of, count):
+    # the first your_timesheet_id given in each group, or None
+    if not any('your_timesheet_id' in columns for type, columns in tables): return [None] * count
+    given = np.concatenate([columns['your_timesheet_id'] if 'your_timesheet_id' in columns else np.full(size, None, dtype=object)
+        for (type, columns), size in zip(tables, sizes)]).astype(object)
+    present = np.array([bool(value) for value in given[order].tolist()], dtype=bool)
+    firsts = [None] * count
+    rows = order[present]
+    group_ids, first = np.unique(group_of[rows], return_index=True)
+    for group_id, value in zip(group_ids.tolist(), given[rows[first]].tolist()):
+        firsts[group_id] = value
+    return firsts
@@ -1,4 +1,5 @@
 import json
+from datetime import date, timedelta
 
 def get_base_url(stage):
     URLS = {
@@ -22,3 +23,34 @@ def format_date(date):
 def jsonprint(x):
     print(json.dumps(x, indent=2))
 
+
+def calculate_period_ending(shifts=[], deliverables=[]):
+    def first_sunday_on_or_after(dt):
+        days_to_go = 6 - dt.weekday()
+        if days_to_go:
+            dt += timedelta(days_to_go)
+        return dt
+
+    if len(shifts):
+        last_time_in = max([shift['time_in'] for shift in shifts])
+
+    if len(deliverables):        
+        last_deliverable = max([deliverable['date'] for deliverable in deliverables])
+
+    if len(shifts) and len(deliverables):
+        last_date_string = max([last_time_in, last_deliverable])
+    elif len(shifts):
+        last_date_string = last_time_in
+    elif len(deliverables):
+        last_date_string = last_deliverable
+    else:
+        return "2019-12-31T22:59:59"
+
+    last_date = date.fromisoformat(last_date_string[:10])
+    timezone_offset = last_time_in[-6:] if len(shifts) else "-05:00"
+    period_ending_date = first_sunday_on_or_after(last_date)
+
+    # This sample application does not handle DST, so we cheat and set period_ending
+    # to 10:59pm Sunday rather than 11:59.  That way it's still within the week when DST is active.
+    period_ending = period_ending_date.isoformat() + "T22:59:59" + timezone_offset
+    return period_ending
@@ -0,0 +1,93 @@
+import gzip
+import threading
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+REQUEST_ENCODINGS = ('gzip', 'zstd')
+
+
+class Compression():
+    """Content-encoding negotiation for the request layer.
+
+    Every request sends Accept-Encoding with the codings the HTTP library can decode (or
+    accept_encoding, if given).  Request bodies of at least threshold bytes are compressed with
+    request_encoding ('gzip', or 'zstd' with the zstandard package) once the server has advertised
+    that coding in an Accept-Encoding response header, or from the start with assume_supported.
+    A 415 answer to a compressed body turns request compression off for that coding.
+
+    stats() totals the raw and on-the-wire bytes of requests and responses; per-request counts are
+    in the metrics events (request_raw_bytes and response_raw_bytes beside the wire counts).
+    """
+
+    def __init__(
+        self,
+        request_encoding: str = 'gzip',
+        threshold: int = 1024,
+        level: int = None,
+        assume_supported: bool = False,
+        accept_encoding: str = None
+    ):
+        if request_encoding not in REQUEST_ENCODINGS + (None,):
+            raise ValueError(f'Unsupported request encoding {request_encoding}')
+        if request_encoding == 'zstd' and zstandard is None:
+            raise ImportError('zstd request compression requires the zstandard package')
+        self.request_encoding = request_encoding
+        self.threshold = threshold
+        self.level = level
+        self.accept_encoding = accept_encoding
+        self.server_encodings = set(REQUEST_ENCODINGS) if assume_supported else set()
+        self.requests_compressed = 0
+        self.request_raw_bytes = 0
+        self.request_bytes = 0
+        self.response_raw_bytes = 0
+        self.response_bytes = 0
+        self.__lock = threading.Lock()
+
+    def encode(self, data: bytes):
+        # returns (body to send, content coding or None)
+        encoding = self.request_encoding
+        if not encoding or len(data) < self.threshold or encoding not in self.server_encodings:
+            return data, None
+        if encoding == 'zstd':
+            compressed = zstandard.ZstdCompressor(level=self.level or 3).compress(data)
+        else:
+            compressed = gzip.compress(data, compresslevel=self.level or 6)
+        if len(compressed) >= len(data): return data, None
+        with self.__lock:
+            self.requests_compressed += 1
+        return compressed, encoding
+
+    def learn(self, headers):
+        # a server may list the codings it accepts for request bodies in its responses (RFC 7694)
+        advertised = headers.get('Accept-Encoding')
+        if not advertised: return
+        encodings = {token.split(';')[0].strip().lower() for token in advertised.split(',')}
+        if not encodings <= self.server_encodings:
+            with self.__lock:
+                self.server_encodings |= encodings & set(REQUEST_ENCODINGS)
+
+    def reject(self, encoding):
+        with self.__lock:
+            self.server_encodings.discard(encoding)
+
+    def record(self, request_raw_bytes, request_bytes, response_raw_bytes, response_bytes):
+        with self.__lock:
+            self.request_raw_bytes += request_raw_bytes
+            self.request_bytes += request_bytes
+            self.response_raw_bytes += response_raw_bytes
+            self.response_bytes += response_bytes
+
+    def stats(self):
+        with self.__lock:
+            return {
+                'request_encoding': self.request_encoding,
+                'server_encodings': sorted(self.server_encodings),
+                'requests_compressed': self.requests_compressed,
+                'request_raw_bytes': self.request_raw_bytes,
+                'request_bytes': self.request_bytes,
+                'response_raw_bytes': self.response_raw_bytes,
+                'response_bytes': self.response_bytes
+            }
@@ -1,11 +1,28 @@
-from .common import get_base_url, format_date, jsonprint
+from .common import get_base_url, format_date, jsonprint, calculate_period_ending
+from .cache import RecordCache, ConditionalCache
+from .idindex import IdIndex, carries_ext_id, index_entry
+from .mirror import Mirror
+from .checkpoints import Checkpoints, NOOP_CHECKPOINT, line_item_step
+from .singleflight import SingleFlight, request_key
+from .ratelimit import RateController
+from .metrics import MetricsHook, endpoint_template
+from .records import ClientRecord, JobRecord, ProjectRecord
+from .streaming import iter_json_array, STREAM_CHUNK_SIZE
+from .tracing import Tracer, NOOP_TRACER
+from .codec import JsonCodec, default_codec
+from .compression import Compression
 from urllib.parse import urlencode
 from urllib.error import HTTPError
 import os
 import sys
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
 import json
-from datetime import date, timedelta
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 VERBOSE = False
 
@@ -19,9 +36,46 @@ DEFAULT_JOB_POLICIES = {
     'drug_check': False
 }
 
-def get_glapi_from_env():
+PROFILE_SNAPSHOT_VERSION = 1
+
+# an invite response carrying all of these is the job record itself, and needs no follow-up fetch
+JOB_RECORD_FIELDS = ('id', 'position_id', 'client_id', 'contractor_id', 'status', 'projects', 'ext_id_scope', 'ext_id')
+
+
+# the fields the list methods project out of each record
+def client_fields(client):
+    return {
+        'name': client['name'],
+        'id': client['id'],
+        'ext_id_scope': client['ext_id_scope'],
+        'ext_id': client['ext_id']
+    }
+
+def job_fields(job):
+    return {
+        'title': job['title'],
+        'id': job['id'],
+        'ext_id_scope': job['ext_id_scope'],
+        'ext_id': job['ext_id']
+    }
+
+def question_fields(question):
+    return {
+        'title': question['title'],
+        'answer_type': question['answer_type'],
+        'help_text': question['help_text'],
+        'id': question['id']
+    }
+
+def questions_path(admin_id, position_id):
+    path = f'/question?form_type=job_classification_client&admin={admin_id}'
+    if position_id: path += f'&position={position_id}'
+    return path
+
+def get_glapi_from_env(lazy_profile = False, **kwargs):
     try:
-        glapi = GreenLight(os.environ['GL_STAGE'], os.environ['GL_APIKEY'])
+        glapi = GreenLight(os.environ['GL_STAGE'], os.environ['GL_APIKEY'], **kwargs)
+        if not lazy_profile: glapi.load_profile()
         return glapi
 
     except (KeyError, ValueError) as err:
@@ -29,15 +83,126 @@ def get_glapi_from_env():
         print("Error code was:", err)
         sys.exit(1)
 
-class GreenLight():
-    """GreenLight API client"""
+class GreenLightHTTPError(ValueError):
+    """Raised when the API answers with a status other than the one expected."""
+
+    def __init__(self, method, url, status_code, text):
+        self.method = method
+        self.url = url
+        self.status_code = status_code
+        self.text = text
+        super().__init__(f'Unexpected status code {status_code} returned from {method} {url}: {text}')
+
+class LineItemUploadError(ValueError):
+    """Raised when some line items could not be added to a timesheet; the timesheet is left unsubmitted.
 
-    def __init__(self, stage: str, apikey: str = ''):
+    failures lists one {'type', 'index', 'item', 'error'} dict per failed shift, expense or deliverable,
+    where index is the item's position in the list it was passed in.
+    """
+
+    def __init__(self, timesheet_id, failures):
+        self.timesheet_id = timesheet_id
+        self.failures = failures
+        failed = ', '.join(f"{failure['type']} {failure['index']}" for failure in failures)
+        super().__init__(f'{len(failures)} line items failed to upload to timesheet {timesheet_id}: {failed}')
+
+class GreenLight():
+    """GreenLight API client
+
+    The profile, admin and client records are loaded on first use, or restored without any
+    network calls from a snapshot taken earlier with export_profile().
+    """
+
+    def __init__(
+        self,
+        stage: str,
+        apikey: str = '',
+        base_url: str = None,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        pool_block: bool = False,
+        keep_alive: bool = True,
+        cache: RecordCache = None,
+        conditional_cache: ConditionalCache = None,
+        id_index: IdIndex = None,
+        mirror: Mirror = None,
+        checkpoints: Checkpoints = None,
+        single_flight: SingleFlight = None,
+        profile_snapshot: dict = None,
+        rate_controller: RateController = None,
+        metrics: MetricsHook = None,
+        tracer: Tracer = None,
+        codec: JsonCodec = None,
+        compression: Compression = None
+    ):
         self.stage = stage
         self.apikey = apikey
-        self.admin = {}
-        self.client = {}
-        if apikey: self.profile = self.__get_profile()
+        self.base_url = base_url or get_base_url(stage)
+        self.__profile = None
+        self.__admin = {}
+        self.__client = {}
+        self.__profile_lock = threading.Lock()
+        self.cache = cache
+        self.conditional_cache = conditional_cache
+        self.rate_controller = rate_controller
+        self.metrics = metrics
+        self.tracer = tracer or NOOP_TRACER
+        self.codec = codec or default_codec()
+        self.compression = compression
+        self.id_index = id_index
+        self.mirror = mirror
+        self.checkpoints = checkpoints
+        self.single_flight = single_flight
+        self.session = self.__create_session(pool_connections, pool_maxsize, pool_block, keep_alive)
+        if profile_snapshot: self.import_profile(profile_snapshot)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def profile(self):
+        self.load_profile()
+        return self.__profile
+
+    @property
+    def admin(self):
+        self.load_profile()
+        return self.__admin
+
+    @property
+    def client(self):
+        self.load_profile()
+        return self.__client
+
+    def load_profile(self):
+        if self.__profile is not None or not self.apikey: return
+        with self.__profile_lock:
+            if self.__profile is None:
+                self.__profile, self.__admin, self.__client = self.__get_profile()
+
+    def export_profile(self):
+        self.load_profile()
+        return {
+            'version': PROFILE_SNAPSHOT_VERSION,
+            'stage': self.stage,
+            'profile': self.__profile,
+            'admin': self.__admin,
+            'client': self.__client
+        }
+
+    def import_profile(self, snapshot):
+        if snapshot.get('version') != PROFILE_SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported profile snapshot version {snapshot.get('version')}")
+        if snapshot['stage'] != self.stage:
+            raise ValueError(f"Profile snapshot was taken on stage {snapshot['stage']}, not {self.stage}")
+        with self.__profile_lock:
+            self.__profile, self.__admin, self.__client = snapshot['profile'], snapshot['admin'], snapshot['client']
 
     def role_type(self):
         role = self.profile['role']
@@ -52,6 +217,19 @@ class GreenLight():
             return self.client['ext_id_scope']
         return None
 
+    def stats(self):
+        stats = {}
+        if self.cache: stats['cache'] = self.cache.stats()
+        if self.conditional_cache: stats['conditional_cache'] = self.conditional_cache.stats()
+        if self.compression: stats['compression'] = self.compression.stats()
+        if self.id_index: stats['id_index'] = self.id_index.stats()
+        if self.mirror: stats['mirror'] = self.mirror.stats()
+        if self.checkpoints: stats['checkpoints'] = self.checkpoints.stats()
+        if self.single_flight: stats['single_flight'] = self.single_flight.stats()
+        if self.rate_controller: stats['rate_controller'] = self.rate_controller.stats()
+        if hasattr(self.metrics, 'snapshot'): stats['metrics'] = self.metrics.snapshot()
+        return stats
+
     def get_api_hash(self):
         version_json = self.__request('/version')
         return version_json['git_hash']
@@ -61,63 +239,125 @@ class GreenLight():
     def get_admin(self, id, scope = None): return self.__fetch_endpoint('admin', id, scope)
     def get_project(self, id, scope = None): return self.__fetch_endpoint('project', id, scope)
     def get_job(self, id, scope = None): return self.__fetch_endpoint('job', id, scope)
+    def get_timesheet(self, id, scope = None): return self.__fetch_endpoint('timesheet', id, scope)
     def get_job_extended(self, id): return self.__fetch_endpoint('job', id, None, {'extended': 'true'})
 
+    def resolve_id(self, endpoint, id, scope):
+        # the GreenLight id of the record with ext_id id in scope, e.g. for update_job or get_job_projects;
+        # taken from the id index without a request when it has it, so it may belong to a record since
+        # deleted (a 404) or given another ext_id
+        return self.__indexed_id(endpoint, id, scope) or self.__fetch_endpoint(endpoint, id, scope)['id']
+
     def delete_client(self, id):
         resp = self.__request(f'/client/{id}', method='DELETE')
+        self.__invalidate('client', id)
         return resp
 
-    def get_admin_clients(self):
-        def client_fields(client):
-            return {
-                'name': client['name'],
-                'id': client['id'],
-                'ext_id_scope': client['ext_id_scope'],
-                'ext_id': client['ext_id']
-            }
+    def delete_clients(self, ids, concurrency = 8):
+        # returns {id: {'status': 'deleted' | 'already_deleted' | 'failed', 'error': message if failed}}
+        def delete(id):
+            try:
+                self.delete_client(id)
+                return {'status': 'deleted'}
+            except GreenLightHTTPError as err:
+                if err.status_code != 404: return {'status': 'failed', 'error': str(err)}
+                self.__invalidate('client', id)
+                return {'status': 'already_deleted'}
+            except Exception as err:
+                return {'status': 'failed', 'error': str(err)}
+
+        with self.tracer.span('delete_clients', {'count': len(ids)}):
+            results = {id: result for id, result in self.__fan_out(delete, ids, concurrency)}
+        return {id: results[id] for id in ids}
+
+    # The list endpoints below come in two forms.  iter_ methods parse the response incrementally and yield
+    # one projected record at a time, so peak memory scales with a single record rather than the whole
+    # response.  The list-returning get_ methods read the whole response, which single flight can share.
+    def get_admin_clients(self, compact = False):
         admin_id = self.admin['id']
         full_clients = self.__request(f'/admin/{admin_id}/clients', queryparams={'status': 'current'})
-        clients = [client_fields(client) for client in full_clients]
-        return clients
-
-    def get_client_active_jobs(self, client_id):
-        def job_fields(job):
-            return {
-                'title': job['title'],
-                'id': job['id'],
-                'ext_id_scope': job['ext_id_scope'],
-                'ext_id': job['ext_id']
-            }
+        if self.id_index: self.id_index.remember_all('client', full_clients)
+        return [ClientRecord.from_dict(client) if compact else client_fields(client) for client in full_clients]
+
+    def iter_admin_clients(self, compact = False):
+        admin_id = self.admin['id']
+        indexed = []
+        try:
+            for full_client in self.__request_stream(f'/admin/{admin_id}/clients', queryparams={'status': 'current'}):
+                if self.id_index: indexed.append(index_entry(full_client))
+                yield ClientRecord.from_dict(full_client) if compact else client_fields(full_client)
+        finally:
+            # indexed in one batch, however far the caller read
+            if indexed: self.id_index.put_many('client', indexed)
+
+    def get_client_active_jobs(self, client_id, compact = False):
         full_jobs = self.__request(f'/client/{client_id}/jobs', queryparams={'status': 'active'})
-        jobs = [job_fields(job) for job in full_jobs]
-        return jobs
+        if self.id_index: self.id_index.remember_all('job', full_jobs)
+        return [JobRecord.from_dict(job) if compact else job_fields(job) for job in full_jobs]
+
+    def iter_client_active_jobs(self, client_id, compact = False):
+        indexed = []
+        try:
+            for full_job in self.__request_stream(f'/client/{client_id}/jobs', queryparams={'status': 'active'}):
+                if self.id_index: indexed.append(index_entry(full_job))
+                yield JobRecord.from_dict(full_job) if compact else job_fields(full_job)
+        finally:
+            if indexed: self.id_index.put_many('job', indexed)
 
     def get_questions_for_client(self, position_id = None):
-        def question_fields(question):
-            return {
-                'title': question['title'],
-                'answer_type': question['answer_type'],
-                'help_text': question['help_text'],
-                'id': question['id']
-            }
-        admin_id = self.admin['id']
-        path = f'/question?form_type=job_classification_client&admin={admin_id}'
-        if position_id: path += f'&position={position_id}'
-        full_questions = self.__request(path)
-        questions = [question_fields(question) for question in full_questions]
+        return [question_fields(question) for question in self.__request(questions_path(self.admin['id'], position_id))]
 
-        return questions
+    def iter_questions_for_client(self, position_id = None):
+        for full_question in self.__request_stream(questions_path(self.admin['id'], position_id)):
+            yield question_fields(full_question)
 
-    def get_job_projects(self, job_id):
+    def get_job_projects(self, job_id, compact = False):
         full_projects = self.__request(f'/job/{job_id}/projects')
+        if compact: return [ProjectRecord.from_dict(project) for project in full_projects]
         return full_projects
 
+    # Admin-wide fan-out: per-client (and per-job) requests run concurrently, at most `concurrency` at a time,
+    # over `clients` (default: get_admin_clients()).  The iter_ methods yield results as they arrive;
+    # the get_ methods merge them into a dict keyed by client or job id.  compact returns JobRecord/ProjectRecord.
+    # Keep concurrency <= pool_maxsize, or the extra connections are not reused.
+    def iter_admin_active_jobs(self, concurrency = 8, clients = None, compact = False):
+        clients = self.get_admin_clients() if clients is None else clients
+        yield from self.__fan_out(lambda client: self.get_client_active_jobs(client['id'], compact), clients, concurrency)
+
+    def get_admin_active_jobs(self, concurrency = 8, clients = None, compact = False):
+        return {client['id']: jobs for client, jobs in self.iter_admin_active_jobs(concurrency, clients, compact)}
+
+    def iter_admin_client_addresses(self, concurrency = 8, clients = None):
+        clients = self.get_admin_clients() if clients is None else clients
+        yield from self.__fan_out(lambda client: self.get_client_addresses(client['id']), clients, concurrency)
+
+    def get_admin_client_addresses(self, concurrency = 8, clients = None):
+        return {client['id']: addresses for client, addresses in self.iter_admin_client_addresses(concurrency, clients)}
+
+    def iter_admin_job_projects(self, concurrency = 8, clients = None, compact = False):
+        # each client's jobs are queued for their projects as soon as they arrive, in the same pool
+        clients = self.get_admin_clients() if clients is None else clients
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        pending = {self.__submit(executor, self.get_client_active_jobs, client['id'], compact): ('client', client) for client in clients}
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    kind, item = pending.pop(future)
+                    if kind == 'client':
+                        for job in future.result():
+                            pending[self.__submit(executor, self.get_job_projects, job['id'], compact)] = ('job', job)
+                    else:
+                        yield item, future.result()
+        finally:
+            for future in pending: future.cancel()
+            executor.shutdown()
+
+    def get_admin_job_projects(self, concurrency = 8, clients = None, compact = False):
+        return {job['id']: projects for job, projects in self.iter_admin_job_projects(concurrency, clients, compact)}
+
     def get_background_check_status(self, job_id, scope = None):
-        if scope:
-            gl_job_id = self.get_job(job_id, scope=scope)['id']
-        else:
-            gl_job_id = job_id
-        job_extended = self.get_job_extended(gl_job_id)
+        job_extended = self.__get_job_extended(job_id, scope)
         onboarding = job_extended['onboarding']
         w2_path = onboarding['w2_path']
         background_check_status = w2_path['background_check']
@@ -133,104 +373,162 @@ class GreenLight():
             client['ext_id_scope'] = self.scope()
 
         resp = self.__request('/client', method='POST', body=client)
+        self.__invalidate('client', resp.get('id'), your_client_id)
+        self.__remember('client', resp.get('id'), client)
         return resp
 
     def create_project(self, project):
         resp = self.__request('/project', method='POST', body=project)
+        self.__invalidate('project', resp.get('id'), project.get('ext_id'))
+        self.__remember('project', resp.get('id'), project)
         return resp
 
     def update_job(self, job):
         id = job['id']
         resp = self.__request(f'/job/{id}', method='PUT', body=job)
+        self.__invalidate('job', id, job.get('ext_id'))
+        self.__remember('job', id, job)
         return resp
 
     def create_position(self, position, your_position_id = None):
-        position['start_date'] = format_date(position['start_date'])
-        if 'end_date' in position: position['end_date'] = format_date(position['end_date'])
-        if your_position_id:
-            position['ext_id'] = your_position_id
-            position['ext_id_scope'] = self.scope()
-        resp_add = self.__request('/position', method='POST', body=position)
-        position_id = resp_add['id']
-        self.__request(f'/position/{position_id}/action/approve', method='POST', expected_status=200)
-        return resp_add
+        return self.__create_position(position, your_position_id, {})
+
+    def create_positions(self, positions, your_position_ids = None, answers = None, concurrency = 8):
+        # creates and approves each position, then adds its classification answers if answers[i] is given, running
+        # at most `concurrency` positions at a time; your_position_ids and answers (if given) line up with positions.
+        # Returns one {'status': 'created', 'id': id} or {'status': 'failed', 'step': 'create' | 'approve' | 'answers',
+        # 'error': message, 'id': id or None} per position, in the order given; id is set once the position exists.
+        your_position_ids = your_position_ids or [None] * len(positions)
+        answers = answers or [None] * len(positions)
+        def create(i):
+            progress = {'step': 'create'}
+            try:
+                position_id = (self.__create_position(positions[i], your_position_ids[i], progress))['id']
+                if answers[i] is not None:
+                    progress['step'] = 'answers'
+                    # answers are PUT with the whole position, so start from the record the server now holds
+                    self.add_position_answers(self.get_position(position_id), answers[i])
+                return {'status': 'created', 'id': position_id}
+            except Exception as err:
+                return {'status': 'failed', 'step': progress['step'], 'error': str(err), 'id': progress.get('id')}
+
+        with self.tracer.span('create_positions', {'count': len(positions)}):
+            results = dict(self.__fan_out(create, range(len(positions)), concurrency))
+        return [results[i] for i in range(len(positions))]
 
     def add_position_answers(self, position, answers):
         position['classify_client_answers'] = {'answers': answers}
         position_id = position['id']
         resp_put = self.__request(f'/position/{position_id}', method='PUT', body=position)
+        self.__invalidate('position', position_id, position.get('ext_id'))
         return resp_put
 
     def invite_worker(self, position, worker_details, pay_by_project, your_job_id = None):
-        worker = worker_details['worker']
-        address = worker_details['address'] if 'address' in worker_details else None
-        invite = {
-            'position_id': position['id'],
-            'start_date': position['start_date'],
-            'first_name': worker['first_name'],
-            'last_name': worker['last_name'],
-            'email': worker['email'],
-            'phone': worker['phone'],
-            'projects': pay_by_project
-        }
-        if 'end_date' in position: invite['end_date'] = position['end_date']
-
-        resp = self.__request('/job_invite', method='POST', body=invite)
-        gl_job_id = resp['id']
-        job = self.get_job(gl_job_id)
-
-        # add ext_id into the job if provided
-        if your_job_id:
-            job['ext_id_scope'] = self.scope()
-            job['ext_id'] = your_job_id
-            self.update_job(job)
-
-        # persist contractor address if provided
-        if address:
-            contractor_id = job['contractor_id']
-            self.create_address(address, "contractor", contractor_id)
-
-        return job
+        return self.__invite_worker(position, worker_details, pay_by_project, your_job_id, {})
+
+    def invite_workers(self, position, workers, pay_by_project, your_job_ids = None, concurrency = 8):
+        # invites a cohort to one position, running each worker's steps as in invite_worker and at most `concurrency`
+        # workers at a time.  workers are worker_details dicts, your_job_ids (if given) line up with them.
+        # Returns one {'status': 'invited', 'job': job} or {'status': 'failed', 'error': message, 'job_id': id or None}
+        # per worker, in the order given; job_id is set when the invite was sent but a later step failed.
+        your_job_ids = your_job_ids or [None] * len(workers)
+        def invite(i):
+            progress = {}
+            try:
+                return {'status': 'invited', 'job': self.__invite_worker(position, workers[i], pay_by_project, your_job_ids[i], progress)}
+            except Exception as err:
+                return {'status': 'failed', 'error': str(err), 'job_id': progress.get('job_id')}
+
+        with self.tracer.span('invite_workers', {'position_id': position['id'], 'count': len(workers)}):
+            results = dict(self.__fan_out(invite, range(len(workers)), concurrency))
+        return [results[i] for i in range(len(workers))]
 
     def create_address(self, address, ref_type, ref_id):
         address['ref_type'] = ref_type
         address['ref_id'] = ref_id 
         address['kind'] = 'l'
         address['name'] = 'Mailing'
-        return self.__request('/address', method='POST', body=address)['id']
+        address_id = self.__request('/address', method='POST', body=address)['id']
+        if self.conditional_cache: self.conditional_cache.invalidate(f'/{ref_type}/{ref_id}/addresses')
+        return address_id
 
     def get_client_addresses(self, client_id):
         return self.__request(f'/client/{client_id}/addresses', method='GET')
 
-    def create_timesheet_with_shifts_expenses(self, shifts_expenses, your_timesheet_id = None, approve=False):
+    def create_timesheet_with_shifts_expenses(self, shifts_expenses, your_timesheet_id = None, approve=False, max_concurrency = 1):
         shifts = shifts_expenses['shifts']
         expenses = shifts_expenses['expenses']
         period_ending = self.__calculate_period_ending(shifts=shifts)
         job_id = shifts[0]['job_id']
-        timesheet_id = self.__create_timesheet(job_id, period_ending, your_timesheet_id)
-        for shift in shifts:
-            self.__add_shift_to_timesheet(shift, timesheet_id)
-        for expense in expenses:
-            self.__add_expense_to_timesheet(expense, timesheet_id)
-
-        self.__submit_timesheet(timesheet_id)
-        if approve:
-            self.__approve_timesheet(timesheet_id)
+        checkpoint = self.__checkpoint('timesheet', your_timesheet_id)
+        with self.tracer.span('create_timesheet_with_shifts_expenses', {'ext_id': your_timesheet_id, 'job_id': job_id}) as span:
+            timesheet_id = self.__resume_timesheet(checkpoint, job_id, period_ending, your_timesheet_id)
+            span.set_attribute('timesheet_id', timesheet_id)
+            line_items = [('shift', i, shift, self.__add_shift_to_timesheet) for i, shift in enumerate(shifts)]
+            line_items += [('expense', i, expense, self.__add_expense_to_timesheet) for i, expense in enumerate(expenses)]
+            self.__add_line_items(self.__remaining_line_items(checkpoint, line_items), timesheet_id, max_concurrency)
+            self.__finish_timesheet(checkpoint, timesheet_id, approve, your_timesheet_id)
         return timesheet_id
 
-    def create_timesheet_with_deliverables(self, deliverables, your_timesheet_id = None, approve=False):
+    def create_timesheet_with_deliverables(self, deliverables, your_timesheet_id = None, approve=False, max_concurrency = 1):
         period_ending = self.__calculate_period_ending(deliverables=deliverables)
         job_id = deliverables[0]['job_id']
-        timesheet_id = self.__create_timesheet(job_id, period_ending, your_timesheet_id)
-        for deliverable in deliverables:
-            self.__add_deliverable_to_timesheet(deliverable, timesheet_id)
-
-        self.__submit_timesheet(timesheet_id)
-        if approve:
-            self.__approve_timesheet(timesheet_id)
+        checkpoint = self.__checkpoint('timesheet', your_timesheet_id)
+        with self.tracer.span('create_timesheet_with_deliverables', {'ext_id': your_timesheet_id, 'job_id': job_id}) as span:
+            timesheet_id = self.__resume_timesheet(checkpoint, job_id, period_ending, your_timesheet_id)
+            span.set_attribute('timesheet_id', timesheet_id)
+            line_items = [('deliverable', i, deliverable, self.__add_deliverable_to_timesheet) for i, deliverable in enumerate(deliverables)]
+            self.__add_line_items(self.__remaining_line_items(checkpoint, line_items), timesheet_id, max_concurrency)
+            self.__finish_timesheet(checkpoint, timesheet_id, approve, your_timesheet_id)
         return timesheet_id
 
     ## private methods
+    def __checkpoint(self, operation, key):
+        return self.checkpoints.begin(operation, key) if self.checkpoints else NOOP_CHECKPOINT
+
+    def __resume_timesheet(self, checkpoint, job_id, period_ending, your_timesheet_id):
+        timesheet_id = checkpoint.get('timesheet_id')
+        if timesheet_id is None and checkpoint.done('create'):
+            # the create was sent but its answer never recorded: the timesheet may exist under our ext_id
+            timesheet_id = self.__find_id('timesheet', your_timesheet_id)
+        if timesheet_id is None:
+            checkpoint.mark('create')
+            timesheet_id = self.__create_timesheet(job_id, period_ending, your_timesheet_id)
+            checkpoint.set('timesheet_id', timesheet_id)
+        return timesheet_id
+
+    def __remaining_line_items(self, checkpoint, line_items):
+        # drops line items a previous attempt already added, and checkpoints the rest as they are added
+        def checkpointed(add_to_timesheet, step):
+            def add(item, timesheet_id):
+                id = add_to_timesheet(item, timesheet_id)
+                checkpoint.mark(step)
+                return id
+            return add
+
+        if checkpoint is NOOP_CHECKPOINT: return line_items
+        remaining = []
+        for type, index, item, add_to_timesheet in line_items:
+            step = line_item_step(type, index, item)
+            if not checkpoint.done(step):
+                remaining.append((type, index, item, checkpointed(add_to_timesheet, step)))
+        return remaining
+
+    def __finish_timesheet(self, checkpoint, timesheet_id, approve, your_timesheet_id):
+        if not checkpoint.done('submit'):
+            self.__submit_timesheet(timesheet_id, your_timesheet_id)
+            checkpoint.mark('submit')
+        if approve:
+            self.__approve_timesheet(timesheet_id, your_timesheet_id)
+        checkpoint.complete()
+
+    def __find_id(self, endpoint, your_id):
+        try:
+            return self.__fetch_endpoint(endpoint, your_id, self.scope())['id']
+        except GreenLightHTTPError as err:
+            if err.status_code == 404: return None
+            raise
+
     def __create_timesheet(self, job_id, period_ending, your_timesheet_id):
         timesheet = {
             'job_id': job_id,
@@ -240,13 +538,132 @@ class GreenLight():
             timesheet['ext_id'] = your_timesheet_id
             timesheet['ext_id_scope'] = self.scope()
 
-        return self.__request('/timesheet', method='POST', body=timesheet)['id']
+        timesheet_id = (self.__request('/timesheet', method='POST', body=timesheet))['id']
+        self.__invalidate('timesheet', timesheet_id, your_timesheet_id)
+        self.__remember('timesheet', timesheet_id, timesheet)
+        return timesheet_id
     
-    def __submit_timesheet(self, timesheet_id):
-        return self.__request(f'/timesheet/{timesheet_id}/action/submit', method='POST', expected_status=200)
+    def __add_line_items(self, line_items, timesheet_id, max_concurrency):
+        # line_items are (type, index, item, add_function) tuples.  Serially, the first failure raises as before;
+        # with max_concurrency > 1 every item is attempted and all failures are reported together.
+        # Keep max_concurrency <= pool_maxsize, or the extra connections are not reused.
+        with self.tracer.span('add_line_items', {'count': len(line_items), 'max_concurrency': max_concurrency}):
+            failures = self.__upload_line_items(line_items, timesheet_id, max_concurrency)
+
+        if failures:
+            raise LineItemUploadError(timesheet_id, failures)
+
+    def __upload_line_items(self, line_items, timesheet_id, max_concurrency):
+        if max_concurrency <= 1:
+            for _, _, item, add_to_timesheet in line_items:
+                add_to_timesheet(item, timesheet_id)
+            return []
+
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            futures = [(self.__submit(executor, add_to_timesheet, item, timesheet_id), type, index, item)
+                for type, index, item, add_to_timesheet in line_items]
+            failures = [{'type': type, 'index': index, 'item': item, 'error': future.exception()}
+                for future, type, index, item in futures if future.exception()]
+        return failures
+
+    def __fan_out(self, fetch, items, concurrency):
+        # yields (item, fetch(item)) in completion order; leaving early cancels what has not started
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        pending = {self.__submit(executor, fetch, item): item for item in items}
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+        finally:
+            for future in pending: future.cancel()
+            executor.shutdown()
+
+    def __create_position(self, position, your_position_id, progress):
+        position['start_date'] = format_date(position['start_date'])
+        if 'end_date' in position: position['end_date'] = format_date(position['end_date'])
+        if your_position_id:
+            position['ext_id'] = your_position_id
+            position['ext_id_scope'] = self.scope()
+        with self.tracer.span('create_position', {'ext_id': your_position_id}) as span:
+            resp_add = self.__request('/position', method='POST', body=position)
+            position_id = progress['id'] = resp_add['id']
+            span.set_attribute('position_id', position_id)
+            progress['step'] = 'approve'
+            self.__request(f'/position/{position_id}/action/approve', method='POST', expected_status=200)
+        self.__invalidate('position', position_id, your_position_id)
+        self.__remember('position', position_id, position)
+        return resp_add
+
+    def __invite_worker(self, position, worker_details, pay_by_project, your_job_id, progress):
+        worker = worker_details['worker']
+        address = worker_details['address'] if 'address' in worker_details else None
+        invite = {
+            'position_id': position['id'],
+            'start_date': position['start_date'],
+            'first_name': worker['first_name'],
+            'last_name': worker['last_name'],
+            'email': worker['email'],
+            'phone': worker['phone'],
+            'projects': pay_by_project
+        }
+        if 'end_date' in position: invite['end_date'] = position['end_date']
+
+        checkpoint = self.__checkpoint('invite', your_job_id)
+        with self.tracer.span('invite_worker', {'position_id': position['id'], 'ext_id': your_job_id}) as span:
+            gl_job_id = checkpoint.get('job_id')
+            if gl_job_id is None:
+                if checkpoint.get('invite') == 'sent':
+                    # the job only gets our ext_id after the invite, so a lost answer cannot be looked up
+                    raise ValueError(f'The invite for job {your_job_id} may have been sent by an interrupted attempt; check the position before inviting again')
+                checkpoint.set('invite', 'sent')
+                try:
+                    resp = self.__request('/job_invite', method='POST', body=invite)
+                except GreenLightHTTPError as err:
+                    # a 4xx answer means no job was created
+                    if err.status_code < 500: checkpoint.set('invite', 'refused')
+                    raise
+                gl_job_id = resp['id']
+                checkpoint.set('job_id', gl_job_id)
+                # the follow-up fetch is only needed when the invite response is not the whole job record,
+                # which update_job writes back and invite_worker returns
+                job = resp if all(field in resp for field in JOB_RECORD_FIELDS) else self.get_job(gl_job_id)
+            else:
+                # resuming: the worker was invited by an earlier attempt
+                job = self.get_job(gl_job_id)
+            progress['job_id'] = gl_job_id
+            span.set_attribute('job_id', gl_job_id)
+            if self.mirror: self.mirror.touch('job', gl_job_id, client_id=position.get('client_id'))
+
+            # add ext_id into the job if provided
+            if your_job_id and not checkpoint.done('ext_id'):
+                job['ext_id_scope'] = self.scope()
+                job['ext_id'] = your_job_id
+                self.update_job(job)
+                checkpoint.mark('ext_id')
+
+            # persist contractor address if provided
+            if address and not checkpoint.done('address'):
+                contractor_id = job['contractor_id']
+                self.create_address(address, "contractor", contractor_id)
+                checkpoint.mark('address')
+
+        checkpoint.complete()
+        return job
+
+    def __submit(self, executor, fn, *args):
+        # run fn in the pool under a copy of the caller's context, so its spans nest under the caller's
+        return executor.submit(contextvars.copy_context().run, fn, *args)
 
-    def __approve_timesheet(self, timesheet_id):
-        return self.__request(f'/timesheet/{timesheet_id}/action/approve', method='POST', expected_status=200)
+    def __submit_timesheet(self, timesheet_id, your_timesheet_id = None):
+        resp = self.__request(f'/timesheet/{timesheet_id}/action/submit', method='POST', expected_status=200)
+        self.__invalidate('timesheet', timesheet_id, your_timesheet_id)
+        return resp
+
+    def __approve_timesheet(self, timesheet_id, your_timesheet_id = None):
+        resp = self.__request(f'/timesheet/{timesheet_id}/action/approve', method='POST', expected_status=200)
+        self.__invalidate('timesheet', timesheet_id, your_timesheet_id)
+        return resp
 
     def __add_shift_to_timesheet(self, shift, timesheet_id):
         shift['timesheet_id'] = timesheet_id
@@ -261,46 +678,65 @@ class GreenLight():
         return self.__request('/deliverable', method='POST', body=deliverable)['id']
 
     def __calculate_period_ending(self, shifts=[], deliverables=[]):
-        def first_sunday_on_or_after(dt):
-            days_to_go = 6 - dt.weekday()
-            if days_to_go:
-                dt += timedelta(days_to_go)
-            return dt
-
-        if len(shifts):
-            last_time_in = max([shift['time_in'] for shift in shifts])
-
-        if len(deliverables):        
-            last_deliverable = max([deliverable['date'] for deliverable in deliverables])
-
-        if len(shifts) and len(deliverables):
-            last_date_string = max([last_time_in, last_deliverable])
-        elif len(shifts):
-            last_date_string = last_time_in
-        elif len(deliverables):
-            last_date_string = last_deliverable
-        else:
-            return "2019-12-31T22:59:59"
-
-        last_date = date.fromisoformat(last_date_string[:10])
-        timezone_offset = last_time_in[-6:] if len(shifts) else "-05:00"
-        period_ending_date = first_sunday_on_or_after(last_date)
-
-        # This sample application does not handle DST, so we cheat and set period_ending
-        # to 10:59pm Sunday rather than 11:59.  That way it's still within the week when DST is active.
-        period_ending = period_ending_date.isoformat() + "T22:59:59" + timezone_offset
-        return period_ending
+        return calculate_period_ending(shifts=shifts, deliverables=deliverables)
+
+    def __get_job_extended(self, job_id, scope):
+        # with a scope, job_id is your ext_id: its GreenLight id comes from the id index if it has it,
+        # saving the get_job call, otherwise from get_job
+        if not scope: return self.get_job_extended(job_id)
+        gl_job_id = self.__indexed_id('job', job_id, scope)
+        if gl_job_id:
+            try:
+                job_extended = self.get_job_extended(gl_job_id)
+                if carries_ext_id(job_extended, scope, job_id): return job_extended
+            except GreenLightHTTPError as err:
+                if err.status_code != 404: raise
+            # the job was deleted or given another ext_id since it was indexed
+            self.id_index.forget('job', scope, job_id)
+        return self.get_job_extended(self.get_job(job_id, scope)['id'])
+
+    def __indexed_id(self, endpoint, id, scope):
+        if not self.id_index: return None
+        gl_id = self.id_index.get(endpoint, scope, id)
+        if self.metrics: self.metrics.on_cache('id_index', endpoint, gl_id is not None)
+        return gl_id
 
     def __fetch_endpoint(self, endpoint, id, scope = None, queryparams = {}):
+        if self.cache:
+            record = self.cache.get(endpoint, id, scope, queryparams)
+            if self.metrics: self.metrics.on_cache('record', endpoint, record is not None)
+            if record is not None: return record
+
         allparams = queryparams.copy()
         if scope: allparams['scope'] = scope
         record = self.__request(f'/{endpoint}/{id}', queryparams=allparams)
+        if self.cache: self.cache.put(endpoint, id, scope, queryparams, record)
+        if self.id_index: self.id_index.remember(endpoint, record)
 
         # in future this will return only relevant fields; for now it returns everything
         return record   
 
+    def __invalidate(self, endpoint, *ids):
+        if self.cache: self.cache.invalidate(endpoint, *ids)
+        if self.conditional_cache: self.conditional_cache.invalidate(*[f'/{endpoint}/{id}' for id in ids if id is not None])
+        if self.mirror: self.mirror.touch(endpoint, *ids)
+
+    def __remember(self, endpoint, id, record):
+        if self.id_index: self.id_index.put(endpoint, record.get('ext_id_scope'), record.get('ext_id'), id)
+
+    def __create_session(self, pool_connections, pool_maxsize, pool_block, keep_alive):
+        # pool_connections is the number of hosts kept in the pool, pool_maxsize the number of
+        # connections kept per host; with pool_block the per-host limit is enforced rather than exceeded
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        if not keep_alive: session.headers['Connection'] = 'close'
+        if self.compression: session.headers['Accept-Encoding'] = self.compression.accept_encoding or ACCEPT_ENCODING
+        return session
+
     def __get_api_url(self, path_relative: str, queryparams: dict):
-        url = get_base_url(self.stage).strip('/') + '/' + path_relative.strip('/')
+        url = self.base_url.strip('/') + '/' + path_relative.strip('/')
         querystring = ('?' + urlencode(queryparams)) if queryparams else ''
         return url + querystring
 
@@ -323,23 +759,164 @@ class GreenLight():
 
         if method == 'GET':
             if expected_status == 0: expected_status = 200
-            resp = requests.get(url, headers=headers)
         elif method == 'POST':
             if expected_status == 0: expected_status = 201
-            resp = requests.post(url, json=body, headers=headers)
         elif method == 'DELETE':
             if expected_status == 0: expected_status = 204
-            resp = requests.delete(url, headers=headers)
         elif method == 'PUT':
             if expected_status == 0: expected_status = 204
-            resp = requests.put(url, json=body, headers=headers)
         else:
             raise ValueError(f'Unsupported http method {method}')
 
+        # GETs through the conditional cache are answered from it while fresh, or revalidated with the stored validators
+        conditional_cache = self.conditional_cache if method == 'GET' else None
+        if conditional_cache:
+            cache_key = url[len(self.base_url.strip('/')):]
+            cached = conditional_cache.lookup(cache_key)
+            if cached:
+                if not cached[1]: return self.codec.loads(cached[0])
+                headers.update(cached[1])
+
+        data = raw_data = None
+        if method in ('POST', 'PUT'):
+            data = raw_data = self.codec.dumps(body)
+            headers['Content-Type'] = 'application/json'
+            if self.compression:
+                data, encoding = self.compression.encode(raw_data)
+                if encoding: headers['Content-Encoding'] = encoding
+        if method == 'GET' and self.single_flight:
+            # concurrent identical GETs share one response; each caller decodes its own copy of the body
+            resp = self.single_flight.do(request_key(method, url, headers), lambda: self.__send_read(url, headers))
+        else:
+            resp = self.__send(method, url, headers, data, len(raw_data or b''))
+        if resp.status_code == 415 and 'Content-Encoding' in headers:
+            # the server does not take that coding after all; send the body as it is
+            self.compression.reject(headers.pop('Content-Encoding'))
+            resp = self.__send(method, url, headers, raw_data, len(raw_data))
+
+        if conditional_cache and cached and resp.status_code == 304:
+            return self.codec.loads(conditional_cache.revalidated_body(cache_key, cached[0]))
         if (resp.status_code != expected_status):
-            raise ValueError(f'Unexpected status code {resp.status_code} returned from {method} {url}: {resp.text}')
+            raise GreenLightHTTPError(method, url, resp.status_code, resp.text)
+        if conditional_cache: conditional_cache.store(cache_key, resp.headers, resp.content)
+
+        return self.codec.loads(resp.content) if resp.status_code != 204 else {}
+
+    def __request_stream(self, path_relative: str, queryparams: dict = {}):
+        # GET a JSON array and yield its elements as they are parsed off the wire
+        url = self.__get_api_url(path_relative, queryparams)
+        headers = {'x-api-key': self.apikey}
+
+        if VERBOSE: print('GET', url)
+
+        # with a conditional cache, the body is also collected for it as it streams by
+        conditional_cache = self.conditional_cache
+        cache_key = cached = None
+        if conditional_cache:
+            cache_key = url[len(self.base_url.strip('/')):]
+            cached = conditional_cache.lookup(cache_key)
+            if cached:
+                if not cached[1]:
+                    yield from iter_json_array([cached[0]])
+                    return
+                headers.update(cached[1])
+
+        # streams are not coalesced by single flight: a follower would wait on the leader's consumer,
+        # which may be the same thread making another request inside its loop
+        yield from self.__stream_array(url, headers, cache_key, cached)
+
+    def __stream_array(self, url, headers, cache_key, cached):
+        # yields the elements of a streamed JSON array
+        conditional_cache = self.conditional_cache if cache_key else None
+        with self.__send('GET', url, headers, None, 0, stream=True) as resp:
+            if conditional_cache and cached and resp.status_code == 304:
+                yield from iter_json_array([conditional_cache.revalidated_body(cache_key, cached[0])])
+                return
+            if (resp.status_code != 200):
+                raise GreenLightHTTPError('GET', url, resp.status_code, resp.text)
+
+            chunks = []
+            raw_bytes = 0
+            def read():
+                nonlocal raw_bytes
+                for chunk in resp.iter_content(STREAM_CHUNK_SIZE):
+                    raw_bytes += len(chunk)
+                    if conditional_cache: chunks.append(chunk)
+                    yield chunk
+            yield from iter_json_array(read())
+            if conditional_cache: conditional_cache.store(cache_key, resp.headers, b''.join(chunks))
+            if self.compression: self.compression.record(0, 0, raw_bytes, resp.raw.tell())
+
+    def __send_read(self, url, headers):
+        # a GET whose body is read before the response is shared between threads
+        resp = self.__send('GET', url, headers, None, 0)
+        resp.content
+        return resp
+
+    def __send(self, method, url, headers, data, raw_size, stream = False):
+        # raw_size is the length of data before any content coding
+        # without a rate controller this is a single attempt; with one, it paces and retries the request
+        rate_controller = self.rate_controller
+        attempt = 0
+        while True:
+            if rate_controller: rate_controller.acquire()
+            with self.tracer.span(f'HTTP {method}', {'path': url[len(self.base_url.strip('/')):], 'attempt': attempt}) as span:
+                started = time.monotonic()
+                status = latency = None
+                try:
+                    resp = self.session.request(method, url, data=data, headers=headers, stream=stream)
+                except requests.RequestException:
+                    # connection errors, timeouts, broken or undecodable bodies, redirect loops
+                    latency = time.monotonic() - started
+                    event = self.__record_request(method, url, None, latency, 0, raw_size, None, None, attempt)
+                    if not rate_controller or not rate_controller.should_retry(method, None, attempt): raise
+                    self.__record_retry(event)
+                    delay = rate_controller.retry_delay(attempt)
+                else:
+                    latency = time.monotonic() - started
+                    status = resp.status_code
+                    span.set_attribute('status', status)
+                    event = None
+                    if self.metrics or self.compression:
+                        # a streamed body has not been read yet, so only its declared length is known
+                        if stream:
+                            response_bytes, response_raw_bytes = resp.headers.get('Content-Length'), None
+                        else:
+                            response_raw_bytes = len(resp.content)
+                            response_bytes = resp.raw.tell() or response_raw_bytes
+                        if self.compression:
+                            self.compression.learn(resp.headers)
+                            if not stream: self.compression.record(raw_size, len(data or b''), response_raw_bytes, response_bytes)
+                        event = self.__record_request(method, url, status, latency, len(data or b''), raw_size, response_bytes, response_raw_bytes, attempt)
+                    if not rate_controller or not rate_controller.should_retry(method, status, attempt): return resp
+                    self.__record_retry(event)
+                    resp.close()
+                    delay = rate_controller.retry_delay(attempt, resp.headers.get('Retry-After'))
+                finally:
+                    # every attempt gives its slot back, however it ended
+                    if rate_controller: rate_controller.release(status, latency)
+            time.sleep(delay)
+            attempt += 1
+
+    def __record_request(self, method, url, status, latency, request_bytes, request_raw_bytes, response_bytes, response_raw_bytes, attempt):
+        if not self.metrics: return None
+        event = {
+            'method': method,
+            'endpoint': endpoint_template(url[len(self.base_url.strip('/')):]),
+            'url': url,
+            'status': status,
+            'latency': latency,
+            'request_bytes': request_bytes,
+            'request_raw_bytes': request_raw_bytes,
+            'response_bytes': int(response_bytes) if response_bytes is not None else None,
+            'response_raw_bytes': response_raw_bytes,
+            'attempt': attempt
+        }
+        self.metrics.on_request(event)
+        return event
 
-        return resp.json() if resp.status_code != 204 else {}
+    def __record_retry(self, event):
+        if event: self.metrics.on_retry(event)
 
     def __get_profile(self):
         profiles_json = self.__request('/profile')
@@ -354,12 +931,12 @@ class GreenLight():
         }
 
         if (profile['resource'] == 'admin'):
-            self.admin = self.get_admin(profile['resource_id'])
-            self.client = {}
+            admin = self.get_admin(profile['resource_id'])
+            client = {}
         elif (profile['resource'] == 'client'):
-            self.client = self.get_client(profile['resource_id'])
-            self.admin = self.get_admin(self.client['admin_id'])
+            client = self.get_client(profile['resource_id'])
+            admin = self.get_admin(client['admin_id'])
         else:
             raise ValueError('API is only supported for admin or client user types')
 
-        return profile
+        return profile, admin, client
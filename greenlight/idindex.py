@@ -0,0 +1,110 @@
+from collections import OrderedDict
+import sqlite3
+import threading
+
+
+class IdIndex():
+    """Resolution index from (endpoint, ext_id_scope, ext_id) to GreenLight id.
+
+    Opt in with GreenLight(id_index=IdIndex()); it then remembers the ids of records created,
+    fetched or listed, so resolve_id() and get_background_check_status() can skip the lookup by
+    ext_id.  Held in memory as an LRU of up to maxsize ids; give it a path to also persist it in
+    SQLite, so later processes can resolve your ids without a round trip.  An indexed id is only a
+    hint: a record may be deleted or given another ext_id after it was indexed.
+    """
+
+    def __init__(self, path: str = None, maxsize: int = 100000):
+        self.path = path
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.__ids = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__db = None
+        if path:
+            self.__db = sqlite3.connect(path, check_same_thread=False)
+            self.__db.execute('''CREATE TABLE IF NOT EXISTS id_index (
+                endpoint TEXT NOT NULL,
+                scope TEXT NOT NULL,
+                ext_id TEXT NOT NULL,
+                id TEXT NOT NULL,
+                PRIMARY KEY (endpoint, scope, ext_id)
+            )''')
+            self.__db.commit()
+
+    def get(self, endpoint, scope, ext_id):
+        key = (endpoint, str(scope), str(ext_id))
+        with self.__lock:
+            id = self.__ids.get(key)
+            if id is not None:
+                self.__ids.move_to_end(key)
+            elif self.__db:
+                row = self.__db.execute('SELECT id FROM id_index WHERE endpoint = ? AND scope = ? AND ext_id = ?', key).fetchone()
+                if row: id = self.__store(key, row[0])
+            if id is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return id
+
+    def put(self, endpoint, scope, ext_id, id):
+        self.put_many(endpoint, [(scope, ext_id, id)])
+
+    def put_many(self, endpoint, entries):
+        # entries are (scope, ext_id, id); the new ones are written to SQLite in a single transaction
+        rows = []
+        with self.__lock:
+            for scope, ext_id, id in entries:
+                if not (scope and ext_id and id): continue
+                key = (endpoint, str(scope), str(ext_id))
+                if self.__ids.get(key) == str(id):
+                    self.__ids.move_to_end(key)
+                    continue
+                self.__store(key, str(id))
+                rows.append(key + (str(id),))
+            if self.__db and rows:
+                self.__db.executemany('INSERT OR REPLACE INTO id_index (endpoint, scope, ext_id, id) VALUES (?, ?, ?, ?)', rows)
+                self.__db.commit()
+
+    def remember(self, endpoint, record):
+        self.remember_all(endpoint, [record])
+
+    def remember_all(self, endpoint, records):
+        self.put_many(endpoint, [index_entry(record) for record in records if isinstance(record, dict)])
+
+    def forget(self, endpoint, scope, ext_id):
+        key = (endpoint, str(scope), str(ext_id))
+        with self.__lock:
+            self.__ids.pop(key, None)
+            if self.__db:
+                self.__db.execute('DELETE FROM id_index WHERE endpoint = ? AND scope = ? AND ext_id = ?', key)
+                self.__db.commit()
+
+    def stats(self):
+        with self.__lock:
+            return {'size': len(self.__ids), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+    def close(self):
+        if self.__db:
+            self.__db.close()
+            self.__db = None
+
+    def __store(self, key, id):
+        # the SQLite table keeps every id; only the in-memory copy is bounded
+        self.__ids[key] = id
+        self.__ids.move_to_end(key)
+        while len(self.__ids) > self.maxsize:
+            self.__ids.popitem(last=False)
+            self.evictions += 1
+        return id
+
+
+def index_entry(record):
+    # the (scope, ext_id, id) a record is indexed under
+    return record.get('ext_id_scope'), record.get('ext_id'), record.get('id')
+
+
+def carries_ext_id(record, scope, ext_id):
+    # whether a fetched record still has the (ext_id_scope, ext_id) it was indexed under
+    return isinstance(record, dict) and str(record.get('ext_id_scope')) == str(scope) and str(record.get('ext_id')) == str(ext_id)
@@ -0,0 +1,225 @@
+from .greenlight import GreenLightHTTPError, LineItemUploadError
+from .ratelimit import RETRY_STATUSES
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+import json
+import sqlite3
+import threading
+import time
+
+KINDS = ('timesheet', 'deliverables', 'invite')
+
+
+class Journal():
+    """Durable write-behind queue for timesheet, deliverable and invite mutations.
+
+    add_timesheet, add_deliverables and add_invite only write the mutation to SQLite and return its
+    entry id; flush(greenlight), or a background flusher from start(greenlight), sends them later,
+    concurrency at a time in batches of batch_size.  Each entry needs your id for it (your_timesheet_id
+    or your_job_id), which becomes the record's ext_id: an id already in the journal is not queued
+    again.  Throttling, server errors and connection errors are retried after retry_delay seconds
+    (doubling each attempt) up to max_attempts; other errors mark the entry failed.
+
+    A replay never creates a timesheet or job twice, and an entry is only done once every step of it
+    is.  With a GreenLight that has checkpoints, a retry resumes the interrupted timesheet or invite
+    from its checkpoint; keep them on disk (Checkpoints(path)) to also resume what was in flight when
+    the process died.  Otherwise an entry sent before is looked up by its ext_id, and whatever cannot
+    be confirmed that way fails the entry for you to check instead of being sent again: a draft or
+    unapproved timesheet, an invite whose address may be missing, or an invite that may have been
+    sent before the job got its ext_id.  So without checkpoints, failed invites are not retried at
+    all.  entries() lists the entries with their result or error.
+
+    Only one Journal at a time can have a journal file open: it keeps SQLite's exclusive lock on the
+    file until close(), or until its process exits, and opening it elsewhere raises ValueError.  Each
+    open can therefore send again the entries left in flight by the last one.
+    """
+
+    def __init__(self, path: str = 'journal.sqlite', max_attempts: int = 5, retry_delay: float = 5.0):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.__lock = threading.Lock()
+        self.__wake = threading.Event()
+        self.__stopping = threading.Event()
+        self.__thread = None
+        self.__db = sqlite3.connect(path, timeout=0, check_same_thread=False)
+        self.__db.execute('PRAGMA locking_mode = EXCLUSIVE')
+        try:
+            # in exclusive locking mode the lock is kept after this transaction, until the connection closes
+            self.__db.execute('BEGIN EXCLUSIVE')
+        except sqlite3.OperationalError as err:
+            self.__db.close()
+            raise ValueError(f'Journal {path} is already open, in this or another process ({err})') from err
+        self.__db.execute('''CREATE TABLE IF NOT EXISTS journal (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            due_at REAL NOT NULL DEFAULT 0,
+            result TEXT,
+            error TEXT,
+            created_at REAL NOT NULL,
+            UNIQUE (kind, key)
+        )''')
+        self.__db.execute('CREATE INDEX IF NOT EXISTS journal_due ON journal (status, due_at)')
+        # entries in flight when the last Journal on this file stopped, which held the lock, are sent again
+        self.__db.execute("UPDATE journal SET status = 'pending' WHERE status = 'in_flight'")
+        self.__db.commit()
+
+    def add_timesheet(self, shifts_expenses, your_timesheet_id, approve = False):
+        return self.__add('timesheet', your_timesheet_id, {'shifts_expenses': shifts_expenses, 'approve': approve})
+
+    def add_deliverables(self, deliverables, your_timesheet_id, approve = False):
+        return self.__add('deliverables', your_timesheet_id, {'deliverables': deliverables, 'approve': approve})
+
+    def add_invite(self, position, worker_details, pay_by_project, your_job_id):
+        return self.__add('invite', your_job_id, {'position': position, 'worker_details': worker_details, 'pay_by_project': pay_by_project})
+
+    def flush(self, greenlight, concurrency = 4, batch_size = 32, line_item_concurrency = 1):
+        """Send every entry that is due, and return {'done': n, 'retrying': n, 'failed': n}."""
+        summary = {'done': 0, 'retrying': 0, 'failed': 0}
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            while True:
+                batch = self.__claim(batch_size)
+                if not batch: break
+                outcomes = executor.map(lambda entry: self.__send(greenlight, entry, line_item_concurrency), batch)
+                results = [(entry, outcome) for entry, outcome in zip(batch, outcomes)]
+                self.__finish(results, summary)
+        return summary
+
+    def start(self, greenlight, interval = 1.0, **kwargs):
+        """Flush in a background thread, every interval seconds and soon after each add."""
+        if self.__thread: return
+        self.__stopping.clear()
+        def run():
+            while not self.__stopping.is_set():
+                self.__wake.clear()
+                self.flush(greenlight, **kwargs)
+                self.__wake.wait(interval)
+        self.__thread = threading.Thread(target=run, name='greenlight-journal', daemon=True)
+        self.__thread.start()
+
+    def stop(self, timeout = None):
+        # the flush in progress completes; anything left stays in the journal for the next start or flush
+        if not self.__thread: return
+        self.__stopping.set()
+        self.__wake.set()
+        self.__thread.join(timeout)
+        self.__thread = None
+
+    def entries(self, status = None):
+        query = 'SELECT id, kind, key, status, attempts, result, error FROM journal'
+        with self.__lock:
+            rows = self.__db.execute(query + (' WHERE status = ? ORDER BY id' if status else ' ORDER BY id'), (status,) if status else ()).fetchall()
+        return [dict(zip(('id', 'kind', 'key', 'status', 'attempts', 'result', 'error'), row)) for row in rows]
+
+    def stats(self):
+        with self.__lock:
+            counts = dict(self.__db.execute('SELECT status, COUNT(*) FROM journal GROUP BY status').fetchall())
+        return {status: counts.get(status, 0) for status in ('pending', 'in_flight', 'done', 'failed')}
+
+    def close(self):
+        self.stop()
+        with self.__lock:
+            if self.__db:
+                self.__db.close()
+                self.__db = None
+
+    ## private methods
+    def __add(self, kind, key, payload):
+        if not key:
+            raise ValueError(f'Journaled {kind} mutations need your id for them, used as the ext_id')
+        with self.__lock, self.__db:
+            self.__db.execute('INSERT OR IGNORE INTO journal (kind, key, payload, created_at) VALUES (?, ?, ?, ?)',
+                (kind, str(key), json.dumps(payload, default=_encode), time.time()))
+            id = self.__db.execute('SELECT id FROM journal WHERE kind = ? AND key = ?', (kind, str(key))).fetchone()[0]
+        self.__wake.set()
+        return id
+
+    def __claim(self, batch_size):
+        with self.__lock, self.__db:
+            rows = self.__db.execute("SELECT id, kind, key, payload, attempts FROM journal WHERE status = 'pending' AND due_at <= ? ORDER BY id LIMIT ?",
+                (time.time(), batch_size)).fetchall()
+            self.__db.executemany("UPDATE journal SET status = 'in_flight', attempts = attempts + 1 WHERE id = ?", [(row[0],) for row in rows])
+        return [{'id': id, 'kind': kind, 'key': key, 'payload': json.loads(payload), 'attempts': attempts} for id, kind, key, payload, attempts in rows]
+
+    def __send(self, greenlight, entry, line_item_concurrency):
+        # returns ('done', result) | ('retry', error) | ('failed', error)
+        try:
+            if entry['attempts']:
+                existing = self.__existing(greenlight, entry)
+                if existing: return existing
+            return 'done', self.__apply(greenlight, entry, line_item_concurrency)
+        except GreenLightHTTPError as err:
+            outcome, error = ('retry' if err.status_code in RETRY_STATUSES else 'failed'), str(err)
+        except LineItemUploadError as err:
+            # with checkpoints the next attempt only sends the line items that failed
+            transient = greenlight.checkpoints and all(_transient(failure['error']) for failure in err.failures)
+            outcome, error = ('retry' if transient else 'failed'), str(err)
+        except (ValueError, KeyError, TypeError) as err:
+            return 'failed', str(err)
+        except Exception as err:
+            # connection errors and timeouts
+            outcome, error = 'retry', str(err)
+        if outcome == 'retry' and entry['kind'] == 'invite' and not greenlight.checkpoints:
+            # the job may exist without our ext_id, so only a checkpoint can tell a retry where to resume
+            return 'failed', f'{error} (invites are only retried through a GreenLight with checkpoints)'
+        return outcome, error
+
+    def __existing(self, greenlight, entry):
+        # an earlier attempt may have reached the server: resume it from its checkpoint, or find the record by its ext_id
+        invite = entry['kind'] == 'invite'
+        checkpoints = greenlight.checkpoints
+        if checkpoints and checkpoints.has('invite' if invite else 'timesheet', entry['key']): return None
+        # checkpoints on disk are only dropped once their operation completes, so without one it never
+        # started or is complete; in memory, they may have died with an earlier process
+        complete = bool(checkpoints and checkpoints.path)
+        try:
+            record = greenlight.get_job(entry['key'], greenlight.scope()) if invite else greenlight.get_timesheet(entry['key'], greenlight.scope())
+        except GreenLightHTTPError as err:
+            if err.status_code != 404: raise
+            if invite and not complete:
+                return 'failed', f"The invite for job {entry['key']} may have been sent by an interrupted attempt; check the position before inviting again"
+            return None
+        if complete: return 'done', record['id']
+        if invite:
+            if entry['payload']['worker_details'].get('address'):
+                return 'failed', f"Job {record['id']} was invited by an interrupted attempt, which may not have saved the address"
+        elif record.get('status') == 'draft':
+            return 'failed', f"Timesheet {record['id']} was left in draft by an interrupted attempt"
+        elif entry['payload']['approve'] and record.get('status') != 'approved':
+            return 'failed', f"Timesheet {record['id']} was submitted but not approved by an interrupted attempt"
+        return 'done', record['id']
+
+    def __apply(self, greenlight, entry, line_item_concurrency):
+        payload, key = entry['payload'], entry['key']
+        if entry['kind'] == 'timesheet':
+            return greenlight.create_timesheet_with_shifts_expenses(payload['shifts_expenses'], key, payload['approve'], line_item_concurrency)
+        if entry['kind'] == 'deliverables':
+            return greenlight.create_timesheet_with_deliverables(payload['deliverables'], key, payload['approve'], line_item_concurrency)
+        return greenlight.invite_worker(payload['position'], payload['worker_details'], payload['pay_by_project'], key)['id']
+
+    def __finish(self, results, summary):
+        now = time.time()
+        with self.__lock, self.__db:
+            for entry, (outcome, value) in results:
+                if outcome == 'retry' and entry['attempts'] + 1 >= self.max_attempts: outcome = 'failed'
+                if outcome == 'done':
+                    self.__db.execute("UPDATE journal SET status = 'done', result = ?, error = NULL WHERE id = ?", (value, entry['id']))
+                elif outcome == 'retry':
+                    due_at = now + self.retry_delay * 2 ** entry['attempts']
+                    self.__db.execute("UPDATE journal SET status = 'pending', due_at = ?, error = ? WHERE id = ?", (due_at, value, entry['id']))
+                else:
+                    self.__db.execute("UPDATE journal SET status = 'failed', error = ? WHERE id = ?", (value, entry['id']))
+                summary['retrying' if outcome == 'retry' else outcome] += 1
+
+
+def _transient(error):
+    if isinstance(error, GreenLightHTTPError): return error.status_code in RETRY_STATUSES
+    return not isinstance(error, (ValueError, KeyError, TypeError))
+
+def _encode(obj):
+    if isinstance(obj, date): return obj.isoformat()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
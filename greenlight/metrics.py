@@ -0,0 +1,148 @@
+from urllib.parse import urlsplit, parse_qsl
+import re
+import threading
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+ID_SEGMENT = re.compile(r'\d|^[^/]{21,}$')
+
+
+def endpoint_template(path):
+    """Collapse ids out of a request path, e.g. /job/123?extended=true -> /job/{id}?extended=true
+
+    Path segments and query values that contain a digit (or are very long) are taken to be ids;
+    the scope parameter is dropped, since it does not change which endpoint is called.
+    """
+    parts = urlsplit(path)
+    segments = ['{id}' if ID_SEGMENT.search(segment) else segment for segment in parts.path.strip('/').split('/')]
+    template = '/' + '/'.join(segments)
+    params = [(key, '{id}' if ID_SEGMENT.search(value) else value) for key, value in parse_qsl(parts.query) if key != 'scope']
+    if params:
+        template += '?' + '&'.join(f'{key}={value}' for key, value in sorted(params))
+    return template
+
+
+class MetricsHook():
+    """Interface for request-layer metrics.  Override the methods you need; they may be called from several threads.
+
+    on_request receives one event per HTTP attempt:
+        {'method', 'endpoint', 'url', 'status', 'latency', 'request_bytes', 'request_raw_bytes',
+         'response_bytes', 'response_raw_bytes', 'attempt'}
+    where endpoint is the templated path (see endpoint_template) and status is None if no response arrived.
+    The _bytes counts are as sent on the wire, the _raw_bytes counts before content coding (None if unknown).
+    on_retry receives the same event when that attempt is about to be retried.
+    on_cache is called for every lookup in a client-side cache ('record', 'id_index', ...).
+    """
+
+    def on_request(self, event):
+        pass
+
+    def on_retry(self, event):
+        pass
+
+    def on_cache(self, cache, endpoint, hit):
+        pass
+
+
+class MetricsAggregator(MetricsHook):
+    """In-process aggregation of request metrics per (method, endpoint).
+
+    Every event is also passed to each of `exporters` (callables taking the event dict, with an
+    added 'kind' of 'request', 'retry' or 'cache'), to forward metrics to another system.
+    """
+
+    def __init__(self, exporters = ()):
+        self.exporters = list(exporters)
+        self.__endpoints = {}
+        self.__caches = {}
+        self.__lock = threading.Lock()
+
+    def on_request(self, event):
+        with self.__lock:
+            stats = self.__endpoint_stats(event['method'], event['endpoint'])
+            stats['count'] += 1
+            stats['total_latency'] += event['latency']
+            stats['max_latency'] = max(stats['max_latency'], event['latency'])
+            stats['request_bytes'] += event['request_bytes'] or 0
+            stats['response_bytes'] += event['response_bytes'] or 0
+            stats['request_raw_bytes'] += event.get('request_raw_bytes') or event['request_bytes'] or 0
+            stats['response_raw_bytes'] += event.get('response_raw_bytes') or event['response_bytes'] or 0
+            status = str(event['status']) if event['status'] is not None else 'error'
+            stats['statuses'][status] = stats['statuses'].get(status, 0) + 1
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if event['latency'] <= bound:
+                    stats['latency_histogram'][i] += 1
+                    break
+        self.__export('request', event)
+
+    def on_retry(self, event):
+        with self.__lock:
+            self.__endpoint_stats(event['method'], event['endpoint'])['retries'] += 1
+        self.__export('retry', event)
+
+    def on_cache(self, cache, endpoint, hit):
+        with self.__lock:
+            stats = self.__caches.setdefault(cache, {'hits': 0, 'misses': 0})
+            stats['hits' if hit else 'misses'] += 1
+        self.__export('cache', {'cache': cache, 'endpoint': endpoint, 'hit': hit})
+
+    def snapshot(self):
+        with self.__lock:
+            endpoints = {}
+            for (method, endpoint), stats in self.__endpoints.items():
+                stats = dict(stats, statuses=dict(stats['statuses']), latency_histogram=list(stats['latency_histogram']))
+                stats['mean_latency'] = stats['total_latency'] / stats['count'] if stats['count'] else 0.0
+                stats['p50_latency'] = self.__percentile(stats, 0.5)
+                stats['p99_latency'] = self.__percentile(stats, 0.99)
+                endpoints[f'{method} {endpoint}'] = stats
+            return {
+                'latency_buckets': list(LATENCY_BUCKETS),
+                'endpoints': endpoints,
+                'caches': {cache: dict(stats) for cache, stats in self.__caches.items()}
+            }
+
+    def report(self):
+        # one line per endpoint, the endpoints taking the most wall-clock time first
+        endpoints = sorted(self.snapshot()['endpoints'].items(), key=lambda item: -item[1]['total_latency'])
+        lines = [f"{'endpoint':<50} {'count':>7} {'total s':>9} {'mean ms':>8} {'p99 ms':>8} {'retries':>7} {'resp KiB':>9}"]
+        for name, stats in endpoints:
+            lines.append(
+                f"{name:<50} {stats['count']:>7} {stats['total_latency']:>9.2f} {stats['mean_latency'] * 1000:>8.1f} "
+                f"{stats['p99_latency'] * 1000:>8.1f} {stats['retries']:>7} {stats['response_bytes'] / 1024:>9.1f}"
+            )
+        return '\n'.join(lines)
+
+    def reset(self):
+        with self.__lock:
+            self.__endpoints.clear()
+            self.__caches.clear()
+
+    def __endpoint_stats(self, method, endpoint):
+        key = (method, endpoint)
+        if key not in self.__endpoints:
+            self.__endpoints[key] = {
+                'count': 0,
+                'retries': 0,
+                'total_latency': 0.0,
+                'max_latency': 0.0,
+                'request_bytes': 0,
+                'response_bytes': 0,
+                'request_raw_bytes': 0,
+                'response_raw_bytes': 0,
+                'statuses': {},
+                'latency_histogram': [0] * len(LATENCY_BUCKETS)
+            }
+        return self.__endpoints[key]
+
+    def __percentile(self, stats, fraction):
+        # upper bound of the histogram bucket holding the percentile (max latency for the open bucket)
+        target = fraction * stats['count']
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, stats['latency_histogram']):
+            seen += count
+            if count and seen >= target:
+                return min(bound, stats['max_latency'])
+        return stats['max_latency']
+
+    def __export(self, kind, event):
+        for exporter in self.exporters:
+            exporter(dict(event, kind=kind))
@@ -0,0 +1,277 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS clients (
+    id TEXT PRIMARY KEY,
+    ext_id_scope TEXT,
+    ext_id TEXT,
+    record TEXT NOT NULL,
+    synced_at REAL,
+    dirty INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    client_id TEXT NOT NULL,
+    ext_id_scope TEXT,
+    ext_id TEXT,
+    record TEXT NOT NULL,
+    synced_at REAL,
+    dirty INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS projects (
+    id TEXT PRIMARY KEY,
+    ext_id_scope TEXT,
+    ext_id TEXT,
+    record TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_projects (
+    job_id TEXT NOT NULL,
+    project_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (job_id, project_id)
+);
+CREATE TABLE IF NOT EXISTS mirror_state (
+    name TEXT PRIMARY KEY,
+    synced_at REAL,
+    dirty INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS clients_ext_id ON clients (ext_id_scope, ext_id);
+CREATE INDEX IF NOT EXISTS jobs_ext_id ON jobs (ext_id_scope, ext_id);
+CREATE INDEX IF NOT EXISTS jobs_client_id ON jobs (client_id);
+CREATE INDEX IF NOT EXISTS projects_ext_id ON projects (ext_id_scope, ext_id);
+CREATE INDEX IF NOT EXISTS job_projects_project_id ON job_projects (project_id);
+'''
+TABLES = {'client': 'clients', 'job': 'jobs', 'project': 'projects'}
+DEFAULT_MAX_AGE = 900
+
+
+class Mirror():
+    """Local SQLite copy of the admin's clients, their active jobs and the jobs' projects.
+
+    sync(greenlight) (or await sync_async(async_greenlight)) refreshes it incrementally: the client
+    list, a client's jobs and a job's projects are fetched again only when they are new, were
+    touched by writes through a GreenLight created with mirror=this, are older than max_age
+    seconds, or full=True.  Queries (clients, client_jobs, job_projects, get, find) then read
+    SQLite only, by GreenLight id or by (ext_id_scope, ext_id).  Records are the ones the list
+    endpoints return.  Give it a path to keep the mirror across runs; the default is in memory.
+
+    Changes made by anyone else (the web app, other processes) are only seen once a list is older
+    than max_age, 15 minutes by default: that is how stale the mirror can be.  A smaller max_age
+    with a GreenLight that has a conditional_cache keeps the window short cheaply, since unchanged
+    lists are then answered 304 Not Modified; max_age=None never refreshes them.
+    """
+
+    def __init__(self, path: str = ':memory:', max_age: float = DEFAULT_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self.last_sync = None
+        self.__lock = threading.Lock()
+        self.__db = sqlite3.connect(path, check_same_thread=False)
+        self.__db.executescript(SCHEMA)
+        self.__db.execute("INSERT OR IGNORE INTO mirror_state (name, synced_at, dirty) VALUES ('clients', NULL, 1)")
+        self.__db.commit()
+
+    ## queries
+    def clients(self):
+        return self.__records('SELECT record FROM clients ORDER BY rowid')
+
+    def client_jobs(self, client_id):
+        return self.__records('SELECT record FROM jobs WHERE client_id = ? ORDER BY rowid', (client_id,))
+
+    def job_projects(self, job_id):
+        return self.__records('''SELECT projects.record FROM job_projects JOIN projects ON projects.id = job_projects.project_id
+            WHERE job_projects.job_id = ? ORDER BY job_projects.position''', (job_id,))
+
+    def get(self, endpoint, id):
+        records = self.__records(f'SELECT record FROM {TABLES[endpoint]} WHERE id = ?', (id,))
+        return records[0] if records else None
+
+    def find(self, endpoint, scope, ext_id):
+        records = self.__records(f'SELECT record FROM {TABLES[endpoint]} WHERE ext_id_scope = ? AND ext_id = ?', (scope, str(ext_id)))
+        return records[0] if records else None
+
+    ## change tracking
+    def touch(self, endpoint, *ids, client_id = None):
+        # marks what a write may have changed, to be fetched again by the next sync; ids that are not
+        # GreenLight ids (e.g. your ext_ids) match nothing and are harmless
+        ids = [str(id) for id in ids if id is not None]
+        marks = ','.join('?' * len(ids))
+        with self.__lock:
+            if endpoint == 'client':
+                # a created or deleted client changes the client list
+                self.__db.execute("UPDATE mirror_state SET dirty = 1 WHERE name = 'clients'")
+                self.__db.execute(f'UPDATE clients SET dirty = 1 WHERE id IN ({marks})', ids)
+            elif endpoint == 'job':
+                # the job's projects, and its client's job list (title, ext_id) may have changed
+                self.__db.execute(f'UPDATE jobs SET dirty = 1 WHERE id IN ({marks})', ids)
+                self.__db.execute(f'UPDATE clients SET dirty = 1 WHERE id IN (SELECT client_id FROM jobs WHERE id IN ({marks}))', ids)
+                if client_id: self.__db.execute('UPDATE clients SET dirty = 1 WHERE id = ?', (client_id,))
+            elif endpoint == 'project':
+                self.__db.execute(f'UPDATE jobs SET dirty = 1 WHERE id IN (SELECT job_id FROM job_projects WHERE project_id IN ({marks}))', ids)
+            self.__db.commit()
+
+    ## sync
+    def sync(self, greenlight, full = False, concurrency = 8):
+        """Bring the mirror up to date through a GreenLight.
+
+        Returns how many lists were fetched: {'client_list': 0 or 1, 'job_lists': n, 'project_lists': n,
+        'failed': n, 'seconds': s}.  What failed to fetch stays marked for the next sync.
+        """
+        started = time.time()
+        summary = {'client_list': 0, 'job_lists': 0, 'project_lists': 0, 'failed': 0}
+        if self.__claim_clients(full, started):
+            self.__store_clients(_attempt(greenlight.get_admin_clients), started, summary)
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            client_ids = self.__claim('clients', full, started)
+            jobs = executor.map(lambda id: _attempt(greenlight.get_client_active_jobs, id), client_ids)
+            for client_id, client_jobs in zip(client_ids, jobs):
+                self.__store_jobs(client_id, client_jobs, started, summary)
+
+            job_ids = self.__claim('jobs', full, started)
+            projects = executor.map(lambda id: _attempt(greenlight.get_job_projects, id), job_ids)
+            for job_id, job_projects in zip(job_ids, projects):
+                self.__store_projects(job_id, job_projects, started, summary)
+        return self.__finish(summary, started)
+
+    async def sync_async(self, greenlight, full = False, concurrency = 8):
+        """sync() through an AsyncGreenLight."""
+        started = time.time()
+        summary = {'client_list': 0, 'job_lists': 0, 'project_lists': 0, 'failed': 0}
+        semaphore = asyncio.Semaphore(concurrency)
+        async def attempt(fetch, *args):
+            async with semaphore:
+                try:
+                    return await fetch(*args)
+                except Exception:
+                    return None
+
+        if self.__claim_clients(full, started):
+            self.__store_clients(await attempt(greenlight.get_admin_clients), started, summary)
+
+        client_ids = self.__claim('clients', full, started)
+        jobs = await asyncio.gather(*[attempt(greenlight.get_client_active_jobs, id) for id in client_ids])
+        for client_id, client_jobs in zip(client_ids, jobs):
+            self.__store_jobs(client_id, client_jobs, started, summary)
+
+        job_ids = self.__claim('jobs', full, started)
+        projects = await asyncio.gather(*[attempt(greenlight.get_job_projects, id) for id in job_ids])
+        for job_id, job_projects in zip(job_ids, projects):
+            self.__store_projects(job_id, job_projects, started, summary)
+        return self.__finish(summary, started)
+
+    def stats(self):
+        with self.__lock:
+            counts = {table: self.__db.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0] for table in TABLES.values()}
+        return dict(counts, last_sync=self.last_sync)
+
+    def close(self):
+        with self.__lock:
+            if self.__db:
+                self.__db.close()
+                self.__db = None
+
+    ## private methods
+    def __records(self, query, params = ()):
+        with self.__lock:
+            rows = self.__db.execute(query, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def __stale(self, full, now):
+        # SQL condition for rows to fetch again; dirty is cleared when they are claimed, so a write
+        # made while the sync is running marks them again for the next one
+        if full: return '1'
+        if self.max_age is None: return 'dirty OR synced_at IS NULL'
+        return f'dirty OR synced_at IS NULL OR synced_at < {now - self.max_age!r}'
+
+    def __claim_clients(self, full, now):
+        with self.__lock:
+            stale = self.__db.execute(f"SELECT 1 FROM mirror_state WHERE name = 'clients' AND ({self.__stale(full, now)})").fetchone()
+            if stale:
+                self.__db.execute("UPDATE mirror_state SET dirty = 0 WHERE name = 'clients'")
+                self.__db.commit()
+        return stale is not None
+
+    def __claim(self, table, full, now):
+        with self.__lock:
+            ids = [row[0] for row in self.__db.execute(f'SELECT id FROM {table} WHERE {self.__stale(full, now)} ORDER BY rowid')]
+            self.__db.execute(f'UPDATE {table} SET dirty = 0 WHERE {self.__stale(full, now)}')
+            self.__db.commit()
+        return ids
+
+    def __store_clients(self, clients, now, summary):
+        with self.__lock, self.__db:
+            if clients is None:
+                summary['failed'] += 1
+                self.__db.execute("UPDATE mirror_state SET dirty = 1 WHERE name = 'clients'")
+                return
+            summary['client_list'] += 1
+            ids = [str(client['id']) for client in clients]
+            # clients no longer listed are gone, with their jobs
+            self.__db.execute('CREATE TEMP TABLE IF NOT EXISTS listed (id TEXT PRIMARY KEY)')
+            self.__db.execute('DELETE FROM listed')
+            self.__db.executemany('INSERT OR IGNORE INTO listed (id) VALUES (?)', [(id,) for id in ids])
+            self.__db.execute('DELETE FROM job_projects WHERE job_id IN (SELECT id FROM jobs WHERE client_id NOT IN (SELECT id FROM listed))')
+            self.__db.execute('DELETE FROM jobs WHERE client_id NOT IN (SELECT id FROM listed)')
+            self.__db.execute('DELETE FROM clients WHERE id NOT IN (SELECT id FROM listed)')
+            self.__db.executemany('''INSERT INTO clients (id, ext_id_scope, ext_id, record) VALUES (?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET ext_id_scope = excluded.ext_id_scope, ext_id = excluded.ext_id, record = excluded.record''',
+                [_row(client) for client in clients])
+            self.__db.execute("UPDATE mirror_state SET synced_at = ? WHERE name = 'clients'", (now,))
+
+    def __store_jobs(self, client_id, jobs, now, summary):
+        with self.__lock, self.__db:
+            if jobs is None:
+                summary['failed'] += 1
+                self.__db.execute('UPDATE clients SET dirty = 1 WHERE id = ?', (client_id,))
+                return
+            summary['job_lists'] += 1
+            ids = [str(job['id']) for job in jobs]
+            marks = ','.join('?' * len(ids))
+            self.__db.execute(f'DELETE FROM job_projects WHERE job_id IN (SELECT id FROM jobs WHERE client_id = ? AND id NOT IN ({marks}))', [client_id] + ids)
+            self.__db.execute(f'DELETE FROM jobs WHERE client_id = ? AND id NOT IN ({marks})', [client_id] + ids)
+            # new jobs are inserted dirty, so their projects are fetched in the same sync
+            self.__db.executemany('''INSERT INTO jobs (id, ext_id_scope, ext_id, record, client_id) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET ext_id_scope = excluded.ext_id_scope, ext_id = excluded.ext_id,
+                record = excluded.record, client_id = excluded.client_id''',
+                [_row(job) + (client_id,) for job in jobs])
+            self.__db.execute('UPDATE clients SET synced_at = ? WHERE id = ?', (now, client_id))
+
+    def __store_projects(self, job_id, projects, now, summary):
+        with self.__lock, self.__db:
+            if projects is None:
+                summary['failed'] += 1
+                self.__db.execute('UPDATE jobs SET dirty = 1 WHERE id = ?', (job_id,))
+                return
+            summary['project_lists'] += 1
+            self.__db.execute('DELETE FROM job_projects WHERE job_id = ?', (job_id,))
+            self.__db.executemany('INSERT OR REPLACE INTO projects (id, ext_id_scope, ext_id, record) VALUES (?, ?, ?, ?)',
+                [_row(project) for project in projects])
+            self.__db.executemany('INSERT OR IGNORE INTO job_projects (job_id, project_id, position) VALUES (?, ?, ?)',
+                [(job_id, str(project['id']), position) for position, project in enumerate(projects)])
+            self.__db.execute('UPDATE jobs SET synced_at = ? WHERE id = ?', (now, job_id))
+
+    def __finish(self, summary, started):
+        with self.__lock, self.__db:
+            # projects no job refers to any more
+            self.__db.execute('DELETE FROM projects WHERE id NOT IN (SELECT project_id FROM job_projects)')
+        summary['seconds'] = round(time.time() - started, 3)
+        self.last_sync = summary
+        return summary
+
+
+def _attempt(fetch, *args):
+    # None marks a failed fetch, which is retried on the next sync
+    try:
+        return fetch(*args)
+    except Exception:
+        return None
+
+def _row(record):
+    ext_id = record.get('ext_id')
+    return (str(record['id']), record.get('ext_id_scope'), None if ext_id is None else str(ext_id), json.dumps(record))
@@ -0,0 +1,176 @@
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+import asyncio
+import random
+import threading
+import time
+
+IDEMPOTENT_METHODS = ('GET', 'PUT', 'DELETE')
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+THROTTLE_STATUSES = (429, 503)
+POLL_INTERVAL = 0.01
+
+
+class TokenBucket():
+    """Thread-safe token bucket allowing rate requests per second, with bursts of up to burst."""
+
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.__tokens = self.burst
+        self.__updated = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def reserve(self):
+        # take a token and return 0, or return the seconds until one will be available
+        with self.__lock:
+            now = time.monotonic()
+            self.__tokens = min(self.burst, self.__tokens + (now - self.__updated) * self.rate)
+            self.__updated = now
+            if self.__tokens >= 1:
+                self.__tokens -= 1
+                return 0
+            return (1 - self.__tokens) / self.rate
+
+    def acquire(self):
+        while True:
+            wait = self.reserve()
+            if not wait: return
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        while True:
+            wait = self.reserve()
+            if not wait: return
+            await asyncio.sleep(wait)
+
+
+class RateController():
+    """Adaptive rate and concurrency control for the request layer.
+
+    Requests take a token from a shared bucket and one of `concurrency` in-flight slots.  Each
+    response adjusts both: throttling (429/503), server errors, connection errors or latency above
+    target_latency halve concurrency and cut the rate by a third (at most once per cooldown), while
+    healthy responses grow them back additively up to max_concurrency and max_rate.
+
+    Failed idempotent requests (GET, PUT, DELETE) are retried on 429 and 5xx statuses and on
+    connection errors, timeouts and broken responses, POSTs only on 429, with jittered exponential
+    backoff or the server's Retry-After.  Every attempt releases its slot, however it ends.  Share one controller between clients or threads to limit them together.
+    """
+
+    def __init__(
+        self,
+        rate: float = 10,
+        burst: float = None,
+        min_rate: float = 0.5,
+        max_rate: float = None,
+        concurrency: int = 4,
+        min_concurrency: int = 1,
+        max_concurrency: int = 32,
+        target_latency: float = 2.0,
+        max_retries: int = 5,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30,
+        cooldown: float = 1.0
+    ):
+        self.bucket = TokenBucket(rate, burst)
+        self.min_rate = min_rate
+        self.max_rate = max_rate or rate * 4
+        self.concurrency = float(concurrency)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self.retries = 0
+        self.__last_decrease = 0.0
+        self.__lock = threading.Lock()
+
+    def reserve(self):
+        # take an in-flight slot and a token and return 0, or return the seconds to wait before trying again
+        with self.__lock:
+            if self.in_flight >= int(self.concurrency): return POLL_INTERVAL
+            wait = self.bucket.reserve()
+            if wait: return wait
+            self.in_flight += 1
+            return 0
+
+    def acquire(self):
+        while True:
+            wait = self.reserve()
+            if not wait: return
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        while True:
+            wait = self.reserve()
+            if not wait: return
+            await asyncio.sleep(wait)
+
+    def release(self, status, latency):
+        # status is None when the request failed without a response; latency is None when it never
+        # finished (e.g. it was cancelled), which frees the slot without adjusting rate or concurrency
+        with self.__lock:
+            self.in_flight -= 1
+            if latency is None: return
+            self.requests += 1
+            throttled = status in THROTTLE_STATUSES
+            failed = status is None or status >= 500
+            if throttled: self.throttled += 1
+            if failed: self.errors += 1
+
+            if throttled or failed or latency > self.target_latency:
+                now = time.monotonic()
+                if now - self.__last_decrease >= self.cooldown:
+                    self.__last_decrease = now
+                    self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+                    if throttled or failed:
+                        self.bucket.rate = max(self.min_rate, self.bucket.rate * 2 / 3)
+            else:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+                self.bucket.rate = min(self.max_rate, self.bucket.rate + self.bucket.rate / (10 * self.concurrency))
+
+    def should_retry(self, method, status, attempt):
+        if attempt >= self.max_retries: return False
+        if method in IDEMPOTENT_METHODS: return status is None or status in RETRY_STATUSES
+        return status == 429
+
+    def retry_delay(self, attempt, retry_after = None):
+        delay = _parse_retry_after(retry_after)
+        if delay is None:
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        with self.__lock:
+            self.retries += 1
+        return min(delay, self.backoff_max)
+
+    def stats(self):
+        with self.__lock:
+            return {
+                'rate': self.bucket.rate,
+                'concurrency': int(self.concurrency),
+                'in_flight': self.in_flight,
+                'requests': self.requests,
+                'throttled': self.throttled,
+                'errors': self.errors,
+                'retries': self.retries
+            }
+
+
+def _parse_retry_after(retry_after):
+    if not retry_after: return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None: retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
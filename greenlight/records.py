@@ -0,0 +1,55 @@
+class CompactRecord():
+    """Slotted record holding a fixed subset of an API record's fields.
+
+    Much smaller than the equivalent dict when holding large inventories in memory.  Fields are
+    readable as attributes or, like the dicts the SDK otherwise returns, as record['field'].
+    """
+
+    __slots__ = ()
+    FIELDS = ()
+
+    def __init__(self, *values, **fields):
+        for name, value in zip(self.FIELDS, values):
+            setattr(self, name, value)
+        for name in self.FIELDS[len(values):]:
+            setattr(self, name, fields.pop(name, None))
+        if fields:
+            raise TypeError(f'{type(self).__name__} has no fields {", ".join(fields)}')
+
+    @classmethod
+    def from_dict(cls, record):
+        return cls(*[record.get(name) for name in cls.FIELDS])
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    def __getitem__(self, name):
+        if name not in self.FIELDS: raise KeyError(name)
+        return getattr(self, name)
+
+    def get(self, name, default = None):
+        return getattr(self, name) if name in self.FIELDS else default
+
+    def __contains__(self, name):
+        return name in self.FIELDS
+
+    def __eq__(self, other):
+        if isinstance(other, dict): return self.to_dict() == other
+        return type(other) is type(self) and all(getattr(self, name) == getattr(other, name) for name in self.FIELDS)
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.FIELDS)
+        return f'{type(self).__name__}({fields})'
+
+
+class ClientRecord(CompactRecord):
+    FIELDS = ('name', 'id', 'ext_id_scope', 'ext_id')
+    __slots__ = FIELDS
+
+class JobRecord(CompactRecord):
+    FIELDS = ('title', 'id', 'ext_id_scope', 'ext_id')
+    __slots__ = FIELDS
+
+class ProjectRecord(CompactRecord):
+    FIELDS = ('name', 'id', 'client_id', 'ext_id_scope', 'ext_id')
+    __slots__ = FIELDS
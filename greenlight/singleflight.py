@@ -0,0 +1,121 @@
+import asyncio
+import threading
+
+
+class Flight():
+    """One in-flight call, shared by its leader and any followers."""
+
+    __slots__ = ('key', 'result', 'error', 'landed')
+
+    def __init__(self, key, landed):
+        self.key = key
+        self.result = None
+        self.error = None
+        self.landed = landed
+
+
+class SingleFlight():
+    """Shares one call between concurrent callers with the same key (Go's singleflight).
+
+    The first caller for a key makes the call; callers arriving while it is in flight wait for it
+    and get its result, or its exception.  do() is for threads and do_async() for coroutines; a
+    coroutine leader that is cancelled lands None, and its followers make their own call.  With
+    GreenLight(single_flight=...), concurrent identical GETs (same URL, query parameters and
+    conditional headers) share one request.  Streamed lists (the iter_* methods) are not coalesced:
+    their body is only complete once the caller has consumed it, and waiting on it could deadlock.
+    """
+
+    def __init__(self):
+        self.flights = 0
+        self.coalesced = 0
+        self.abandoned = 0
+        self.__flights = {}
+        self.__async_flights = {}
+        self.__lock = threading.Lock()
+
+    def do(self, key, fn):
+        flight, leader = self.join(key)
+        if not leader: return self.wait(flight)
+        try:
+            result = fn()
+        except BaseException as err:
+            self.land(flight, error=err)
+            raise
+        self.land(flight, result)
+        return result
+
+    def join(self, key):
+        # returns (flight, True) for the caller that must make the call, (flight, False) for followers
+        with self.__lock:
+            flight = self.__flights.get(key)
+            if flight:
+                self.coalesced += 1
+                return flight, False
+            flight = self.__flights[key] = Flight(key, threading.Event())
+            self.flights += 1
+            return flight, True
+
+    def wait(self, flight):
+        flight.landed.wait()
+        if flight.error is not None: raise flight.error
+        return flight.result
+
+    def land(self, flight, result = None, error = None):
+        with self.__lock:
+            del self.__flights[flight.key]
+            if result is None and error is None: self.abandoned += 1
+        flight.result = result
+        flight.error = error
+        flight.landed.set()
+
+    async def do_async(self, key, fn):
+        # a leader that is cancelled lands None, and its followers make their own call
+        while True:
+            flight, leader = self.join_async(key)
+            if not leader:
+                result = await self.wait_async(flight)
+                if result is not None: return result
+                continue
+            try:
+                result = await fn()
+            except asyncio.CancelledError:
+                self.land_async(flight)
+                raise
+            except BaseException as err:
+                self.land_async(flight, error=err)
+                raise
+            self.land_async(flight, result)
+            return result
+
+    def join_async(self, key):
+        # join() for coroutines, whose flights are kept apart and land an asyncio future
+        with self.__lock:
+            flight = self.__async_flights.get(key)
+            if flight:
+                self.coalesced += 1
+                return flight, False
+            flight = self.__async_flights[key] = Flight(key, asyncio.get_running_loop().create_future())
+            self.flights += 1
+            return flight, True
+
+    async def wait_async(self, flight):
+        await asyncio.shield(flight.landed)
+        if flight.error is not None: raise flight.error
+        return flight.result
+
+    def land_async(self, flight, result = None, error = None):
+        with self.__lock:
+            del self.__async_flights[flight.key]
+            if result is None and error is None: self.abandoned += 1
+        flight.result = result
+        flight.error = error
+        if not flight.landed.done(): flight.landed.set_result(None)
+
+    def stats(self):
+        with self.__lock:
+            return {'in_flight': len(self.__flights) + len(self.__async_flights), 'flights': self.flights, 'coalesced': self.coalesced, 'abandoned': self.abandoned}
+
+
+def request_key(method, url, headers):
+    # requests are identical if their method, URL (with its query string) and headers are
+    return (method, url, tuple(sorted(headers.items())))
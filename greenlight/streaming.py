@@ -0,0 +1,77 @@
+import codecs
+import json
+
+STREAM_CHUNK_SIZE = 64 * 1024
+WHITESPACE = ' \t\n\r'
+NUMBER_CHARS = '0123456789.eE+-'
+
+
+class JsonArrayParser():
+    """Incremental parser for a JSON array, returning each element as soon as it is complete.
+
+    Only the unparsed tail of the input is buffered, so memory scales with one element rather
+    than the whole array.  Feed it bytes with feed(); call close() once the input has ended.
+    """
+
+    def __init__(self):
+        self.__decoder = json.JSONDecoder()
+        self.__utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.__buffer = ''
+        self.__pos = 0
+        self.__started = False
+        self.__finished = False
+
+    def feed(self, data: bytes):
+        self.__buffer = self.__buffer[self.__pos:] + self.__utf8.decode(data)
+        self.__pos = 0
+        return self.__parse(final=False)
+
+    def close(self):
+        self.__buffer = self.__buffer[self.__pos:] + self.__utf8.decode(b'', final=True)
+        self.__pos = 0
+        elements = self.__parse(final=True)
+        if not self.__finished:
+            raise ValueError('JSON array ended unexpectedly')
+        return elements
+
+    def __parse(self, final):
+        elements = []
+        buffer = self.__buffer
+        while not self.__finished:
+            pos = self.__skip(buffer, self.__pos, ',' if self.__started else '')
+            if pos == len(buffer): break
+
+            if not self.__started:
+                if buffer[pos] != '[': raise ValueError(f'Expected a JSON array, found {buffer[pos]!r}')
+                self.__started = True
+                self.__pos = pos + 1
+                continue
+
+            if buffer[pos] == ']':
+                self.__finished = True
+                self.__pos = pos + 1
+                break
+
+            try:
+                element, end = self.__decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if final: raise
+                break
+            # a number running to the end of the buffer (or cut before its fraction/exponent) may continue in the next chunk
+            if not final and (end == len(buffer) or (isinstance(element, (int, float)) and buffer[end] in NUMBER_CHARS)): break
+            elements.append(element)
+            self.__pos = end
+        return elements
+
+    def __skip(self, buffer, pos, separators):
+        while pos < len(buffer) and (buffer[pos] in WHITESPACE or buffer[pos] in separators):
+            pos += 1
+        return pos
+
+
+def iter_json_array(chunks):
+    """Yield the elements of a JSON array from an iterable of byte chunks, one at a time."""
+    parser = JsonArrayParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
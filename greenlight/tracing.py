@@ -0,0 +1,124 @@
+from contextvars import ContextVar
+import threading
+import time
+
+
+class Span():
+    """A timed operation.  Used as a context manager; the no-op base class records nothing."""
+
+    def set_attribute(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NOOP_SPAN = Span()
+
+
+class Tracer():
+    """Interface for tracing the SDK's operations.  The base class is a no-op.
+
+    span(name, attributes) returns a Span context manager.  The client opens one span per
+    composite operation (invite_worker, create_position, create_timesheet_with_*, ...) and one
+    'HTTP <method>' span per request attempt inside it, with attributes such as ext_id, job_id,
+    endpoint and status.  Spans opened inside another span are its children; the client carries
+    the current span into its worker threads and asyncio tasks via contextvars.
+    """
+
+    def span(self, name, attributes = None):
+        return NOOP_SPAN
+
+
+NOOP_TRACER = Tracer()
+
+
+class RecordedSpan(Span):
+    def __init__(self, tracer, name, attributes):
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.start = None
+        self.duration = None
+        self.error = None
+        self.children = []
+        self._tracer = tracer
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self._parent = self._tracer._current.get()
+        self._token = self._tracer._current.set(self)
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.duration = time.monotonic() - self.start
+        if exc is not None: self.error = repr(exc)
+        self._tracer._current.reset(self._token)
+        self._tracer._finish(self, self._parent)
+        return False
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'attributes': dict(self.attributes),
+            'duration': self.duration,
+            'error': self.error,
+            'children': [child.to_dict() for child in self.children]
+        }
+
+
+class RecordingTracer(Tracer):
+    """In-process tracer keeping finished span trees, e.g. to find which step makes a slow invite slow.
+
+    Finished root spans are kept in `spans` (the most recent max_spans of them) and passed to each
+    of `exporters`, callables taking the root RecordedSpan.
+    """
+
+    def __init__(self, max_spans = 1000, exporters = ()):
+        self.max_spans = max_spans
+        self.exporters = list(exporters)
+        self.spans = []
+        self._current = ContextVar('greenlight_span', default=None)
+        self.__lock = threading.Lock()
+
+    def span(self, name, attributes = None):
+        return RecordedSpan(self, name, attributes)
+
+    def current_span(self):
+        return self._current.get()
+
+    def report(self):
+        # one indented line per span, the children of each root in the order they finished
+        lines = []
+        def add(span, depth):
+            attributes = ' '.join(f'{key}={value}' for key, value in span.attributes.items())
+            error = f' error={span.error}' if span.error else ''
+            lines.append(f"{'  ' * depth}{span.name} {span.duration * 1000:.1f}ms {attributes}{error}".rstrip())
+            for child in span.children: add(child, depth + 1)
+        for span in self.finished():
+            add(span, 0)
+        return '\n'.join(lines)
+
+    def finished(self):
+        with self.__lock:
+            return list(self.spans)
+
+    def reset(self):
+        with self.__lock:
+            self.spans.clear()
+
+    def _finish(self, span, parent):
+        if parent is not None:
+            with self.__lock:
+                parent.children.append(span)
+            return
+        with self.__lock:
+            self.spans.append(span)
+            del self.spans[:-self.max_spans]
+        for exporter in self.exporters:
+            exporter(span)
@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+
+from fakeserver import FakeGreenLightServer
+from greenlight import GreenLight
+
+WORKER = {'worker': {'first_name': 'Ada', 'last_name': 'Lovelace', 'email': 'ada@example.com', 'phone': '555'}, 'address': {'line1': '1 Main St'}}
+
+
+def shifts_expenses(job_id, count, expenses = 0):
+    # count shifts over the week ending 2020-01-12, and expenses on its Tuesday
+    return {
+        'shifts': [{'job_id': job_id, 'time_in': f'2020-01-{6 + i % 5:02d}T09:00:00-05:00', 'minutes': i + 1} for i in range(count)],
+        'expenses': [{'job_id': job_id, 'expense_date': '2020-01-07', 'amount': 5} for _ in range(expenses)]
+    }
+
+
+@pytest.fixture
+def server():
+    with FakeGreenLightServer() as server:
+        yield server
+
+
+@pytest.fixture
+def greenlight(server):
+    with GreenLight('standin', 'standin-key', base_url=server.base_url) as greenlight:
+        yield greenlight
+
+
+@pytest.fixture
+def job_id(server):
+    server.store.seed(clients=1, jobs_per_client=1)
+    return server.store.find('job')[0]['id']
+
+
+@pytest.fixture
+def position(server):
+    server.store.seed(clients=1, jobs_per_client=0)
+    return dict(server.store.find('position')[0], start_date='2020-01-06')
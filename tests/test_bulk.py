@@ -0,0 +1,104 @@
+import json
+import random
+import threading
+import time
+
+from greenlight.bulk import group_timesheets, bulk_upload, bulk_upload_files, read_records
+
+
+def shift(job_id, day, minutes = 60, **fields):
+    return {'job_id': job_id, 'time_in': f'2020-01-{day:02d}T09:00:00-05:00', 'minutes': minutes, **fields}
+
+
+def test_groups_by_job_kind_and_week_in_any_order():
+    # 2020-01-06 is a Monday: days 6-12 end on Sunday the 12th, day 13 starts the next week
+    records = [shift('job-a', day) for day in (6, 8, 12, 13)] + [shift('job-b', 7)]
+    records += [{'job_id': 'job-a', 'expense_date': '2020-01-09', 'amount': 5}]
+    records += [{'job_id': 'job-a', 'date': '2020-01-10', 'name': 'Report', 'amount': 100}]
+    records += [shift('job-c', 7, your_timesheet_id='mine')]
+    random.Random(1).shuffle(records)
+
+    groups = {(group['job_id'], group['kind'], group['week_ending']): group for group in group_timesheets(records, partitions=2)}
+
+    assert sorted(groups) == [
+        ('job-a', 'deliverables', '2020-01-12'),
+        ('job-a', 'hours', '2020-01-12'),
+        ('job-a', 'hours', '2020-01-19'),
+        ('job-b', 'hours', '2020-01-12'),
+        ('job-c', 'hours', '2020-01-12'),
+    ]
+    week = groups['job-a', 'hours', '2020-01-12']
+    assert sorted(shift['time_in'][8:10] for shift in week['shifts']) == ['06', '08', '12']
+    assert len(week['expenses']) == 1 and week['deliverables'] == []
+    assert week['your_timesheet_id'] == 'job-a-2020-01-12'
+    assert groups['job-a', 'deliverables', '2020-01-12']['your_timesheet_id'] == 'job-a-2020-01-12-d'
+    # your_timesheet_id on a record names its timesheet, and is not sent as a field
+    assert groups['job-c', 'hours', '2020-01-12']['your_timesheet_id'] == 'mine'
+    assert 'your_timesheet_id' not in groups['job-c', 'hours', '2020-01-12']['shifts'][0]
+
+
+def test_csv_rows_become_typed_records(tmp_path):
+    path = tmp_path / 'records.csv'
+    path.write_text('job_id,time_in,minutes,expense_date,amount\njob-a,2020-01-06T09:00:00-05:00,480,,\njob-a,,,2020-01-07,12.5\n')
+
+    assert list(read_records(str(path))) == [
+        {'job_id': 'job-a', 'time_in': '2020-01-06T09:00:00-05:00', 'minutes': 480},
+        {'job_id': 'job-a', 'expense_date': '2020-01-07', 'amount': 12.5},
+    ]
+
+
+class BlockedGreenLight():
+    # stands in for GreenLight: every upload waits until released
+    def __init__(self):
+        self.released = threading.Event()
+
+    def create_timesheet_with_shifts_expenses(self, shifts_expenses, your_timesheet_id, approve, max_concurrency):
+        self.released.wait(10)
+        return f'timesheet-{your_timesheet_id}'
+
+
+def test_groups_are_only_read_as_slots_free_up():
+    greenlight, pulled = BlockedGreenLight(), []
+    def groups():
+        for i in range(20):
+            pulled.append(i)
+            yield {'job_id': f'job-{i}', 'kind': 'hours', 'week_ending': '2020-01-12', 'your_timesheet_id': f'ts-{i}',
+                'shifts': [shift(f'job-{i}', 6)], 'expenses': [], 'deliverables': []}
+
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(bulk_upload(greenlight, groups(), concurrency=2, max_pending=3)))
+    thread.start()
+    deadline = time.monotonic() + 5
+    while len(pulled) < 4 and time.monotonic() < deadline: time.sleep(0.01)
+    time.sleep(0.1)
+    # three groups hold the slots, and the fourth waits for one
+    assert len(pulled) == 4
+    greenlight.released.set()
+    thread.join(10)
+
+    assert len(pulled) == 20
+    assert result == {'uploaded': 20, 'failed': 0}
+
+
+def test_manifest_maps_each_group_to_its_timesheet_or_error(server, greenlight, job_id, tmp_path):
+    records = tmp_path / 'records.ndjson'
+    lines = [shift(job_id, 6), shift(job_id, 7), {'job_id': job_id, 'expense_date': '2020-01-14', 'amount': 5},
+        {'job_id': job_id, 'date': '2020-01-08', 'name': 'Report', 'amount': 100}]
+    records.write_text(''.join(json.dumps(line) + '\n' for line in lines))
+    manifest_path = tmp_path / 'manifest.ndjson'
+
+    with open(manifest_path, 'w') as manifest:
+        summary = bulk_upload_files(greenlight, [str(records)], manifest=manifest)
+
+    assert summary == {'uploaded': 2, 'failed': 1}
+    entries = {entry['ext_id']: entry for entry in map(json.loads, manifest_path.read_text().splitlines())}
+    hours, deliverables = entries[f'{job_id}-2020-01-12'], entries[f'{job_id}-2020-01-12-d']
+    assert hours['status'] == deliverables['status'] == 'ok'
+    assert server.store.get('timesheet', hours['timesheet_id'])['ext_id'] == hours['ext_id']
+    assert server.store.get('timesheet', deliverables['timesheet_id'])['ext_id'] == deliverables['ext_id']
+    assert hours['period_ending'].startswith('2020-01-12T')
+    # the next week has an expense but no shift to hang it on
+    expenses_only = entries[f'{job_id}-2020-01-19']
+    assert expenses_only['status'] == 'error' and expenses_only['timesheet_id'] is None
+    assert 'at least one shift' in expenses_only['error']
+    assert len(server.store.records['timesheet']) == 2
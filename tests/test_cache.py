@@ -0,0 +1,102 @@
+import asyncio
+
+from greenlight import GreenLight, AsyncGreenLight, RecordCache, ConditionalCache
+
+from conftest import shifts_expenses
+
+
+def test_record_cache_drops_every_variant_of_a_record():
+    cache = RecordCache()
+    record = {'id': 'gl-1', 'ext_id': 'job-ext-1', 'ext_id_scope': 'standin'}
+    cache.put('job', 'gl-1', None, {}, record)
+    cache.put('job', 'job-ext-1', 'standin', {}, record)
+    cache.put('job', 'gl-1', None, {'extended': 'true'}, record)
+    cache.put('client', 'gl-1', None, {}, {'id': 'gl-1'})
+
+    cache.invalidate('job', 'gl-1')
+    assert cache.get('job', 'gl-1') is None
+    assert cache.get('job', 'job-ext-1', 'standin') is None
+    assert cache.get('job', 'gl-1', None, {'extended': 'true'}) is None
+    assert cache.get('client', 'gl-1') == {'id': 'gl-1'}
+
+
+def test_record_cache_ttls_are_per_endpoint():
+    cache = RecordCache(ttls={'job': 0})
+    cache.put('job', 'gl-1', None, {}, {'id': 'gl-1'})
+    cache.put('client', 'gl-2', None, {}, {'id': 'gl-2'})
+    assert cache.get('job', 'gl-1') is None
+    assert cache.get('client', 'gl-2') == {'id': 'gl-2'}
+
+
+def test_timesheet_writes_drop_the_cached_timesheet(server, job_id):
+    with GreenLight('standin', 'standin-key', base_url=server.base_url, cache=RecordCache()) as greenlight:
+        timesheet_id = greenlight.create_timesheet_with_shifts_expenses(shifts_expenses(job_id, 1), 'ts-1')
+        assert greenlight.get_timesheet(timesheet_id)['status'] == 'submitted'
+        assert greenlight.get_timesheet('ts-1', greenlight.scope())['status'] == 'submitted'
+        # as when a retried upload approves the timesheet it already submitted
+        greenlight._GreenLight__approve_timesheet(timesheet_id, 'ts-1')
+
+        assert greenlight.get_timesheet(timesheet_id)['status'] == 'approved'
+        assert greenlight.get_timesheet('ts-1', greenlight.scope())['status'] == 'approved'
+
+
+def test_async_timesheet_writes_drop_the_cached_timesheet(server, job_id):
+    async def run():
+        cache = RecordCache()
+        async with AsyncGreenLight('standin', 'standin-key', base_url=server.base_url, cache=cache) as greenlight:
+            timesheet_id = await greenlight.create_timesheet_with_shifts_expenses(shifts_expenses(job_id, 1), 'ts-1')
+            cached = await greenlight.get_timesheet(timesheet_id)
+            await greenlight._AsyncGreenLight__approve_timesheet(timesheet_id, 'ts-1')
+            return cached['status'], (await greenlight.get_timesheet(timesheet_id))['status']
+
+    assert asyncio.run(run()) == ('submitted', 'approved')
+
+
+def test_job_update_drops_the_cached_job(server, job_id):
+    with GreenLight('standin', 'standin-key', base_url=server.base_url, cache=RecordCache()) as greenlight:
+        job = greenlight.get_job(job_id)
+        greenlight.get_job_extended(job_id)
+        greenlight.update_job(dict(job, ext_id='job-ext-1', ext_id_scope=greenlight.scope()))
+
+        assert greenlight.get_job(job_id)['ext_id'] == 'job-ext-1'
+        assert greenlight.get_job_extended(job_id)['ext_id'] == 'job-ext-1'
+        assert greenlight.get_job('job-ext-1', greenlight.scope())['id'] == job_id
+
+
+def test_deleted_client_is_not_served_from_the_cache(server, job_id):
+    client_id = server.store.find('client')[0]['id']
+    with GreenLight('standin', 'standin-key', base_url=server.base_url, cache=RecordCache()) as greenlight:
+        greenlight.get_client(client_id)
+        greenlight.delete_client(client_id)
+        assert greenlight.stats()['cache']['size'] == 0
+
+
+def test_records_without_validators_are_not_served_stale(server, job_id):
+    server.etags = False
+    with GreenLight('standin', 'standin-key', base_url=server.base_url, conditional_cache=ConditionalCache()) as greenlight:
+        timesheet_id = greenlight.create_timesheet_with_shifts_expenses(shifts_expenses(job_id, 1))
+        assert greenlight.get_timesheet(timesheet_id)['status'] == 'submitted'
+        server.store.records['timesheet'][timesheet_id]['status'] = 'approved'
+        assert greenlight.get_timesheet(timesheet_id)['status'] == 'approved'
+
+
+def test_reference_data_without_validators_is_reused(server):
+    server.etags = False
+    cache = ConditionalCache()
+    with GreenLight('standin', 'standin-key', base_url=server.base_url, conditional_cache=cache) as greenlight:
+        greenlight.load_profile()
+        requests_before = server.requests
+        assert greenlight.get_questions_for_client() == greenlight.get_questions_for_client()
+        assert server.requests - requests_before == 1
+        assert cache.stats()['hits'] == 1
+
+
+def test_ttls_are_set_per_endpoint(server, job_id):
+    server.etags = False
+    cache = ConditionalCache(ttls={'job': 60})
+    with GreenLight('standin', 'standin-key', base_url=server.base_url, conditional_cache=cache) as greenlight:
+        greenlight.get_job(job_id)
+        server.store.records['job'][job_id]['status'] = 'ended'
+        # within its TTL the job is reused as it was
+        assert greenlight.get_job(job_id)['status'] == 'active'
+        assert cache.stats()['hits'] == 1
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from greenlight import GreenLight, AsyncGreenLight, Checkpoints, GreenLightHTTPError, LineItemUploadError
+
+from conftest import WORKER, shifts_expenses
+
+
+def fail_nth(server, collection, n):
+    # the stand-in answers 400 to the nth create in collection
+    create, created = server.store.create, []
+    def flaky(name, record):
+        if name == collection:
+            created.append(record)
+            if len(created) == n: raise KeyError('injected')
+        return create(name, record)
+    server.store.create = flaky
+
+
+def test_timesheet_resumes_after_a_failed_line_item(server, job_id, tmp_path):
+    path = str(tmp_path / 'checkpoints.sqlite')
+    fail_nth(server, 'shift', 12)
+    with GreenLight('standin', 'standin-key', base_url=server.base_url, checkpoints=Checkpoints(path)) as greenlight:
+        with pytest.raises(GreenLightHTTPError):
+            greenlight.create_timesheet_with_shifts_expenses(shifts_expenses(job_id, 20, expenses=1), 'ts-1')
+    assert len(server.store.records['timesheet']) == 1
+
+    # a later process picks up where the first stopped
+    checkpoints = Checkpoints(path)
+    with GreenLight('standin', 'standin-key', base_url=server.base_url, checkpoints=checkpoints) as greenlight:
+        requests_before = server.requests
+        timesheet_id = greenlight.create_timesheet_with_shifts_expenses(shifts_expenses(job_id, 20, expenses=1), 'ts-1')
+
+    assert len(server.store.records['timesheet']) == 1
+    assert len(server.store.records['shift']) == 20
+    assert len(server.store.records['expense']) == 1
+    assert server.store.get('timesheet', timesheet_id)['status'] == 'submitted'
+    # shifts 12 to 20, the expense and the submit
+    assert server.requests - requests_before == 9 + 1 + 1
+    assert checkpoints.stats()['pending'] == 0
+
+
+def test_unchanged_steps_are_skipped_and_changed_items_resent(server, job_id):
+    checkpoints = Checkpoints()
+    server.fail_next('POST', '/timesheet/', status=500)  # the submit
+    with GreenLight('standin', 'standin-key', base_url=server.base_url, checkpoints=checkpoints) as greenlight:
+        with pytest.raises(GreenLightHTTPError):
+            greenlight.create_timesheet_with_shifts_expenses(shifts_expenses(job_id, 5, expenses=1), 'ts-2')
+        retried = shifts_expenses(job_id, 5, expenses=1)
+        retried['shifts'][0]['minutes'] = 999
+        greenlight.create_timesheet_with_shifts_expenses(retried, 'ts-2')
+
+    assert len(server.store.records['shift']) == 6
+    assert checkpoints.stats()['steps_skipped'] == 5
+
+
+def test_invite_resumes_after_a_failed_address(server, position):
+    checkpoints = Checkpoints()
+    server.fail_next('POST', '/address', status=500)
+    with GreenLight('standin', 'standin-key', base_url=server.base_url, checkpoints=checkpoints) as greenlight:
+        with pytest.raises(GreenLightHTTPError):
+            greenlight.invite_worker(position, WORKER, [], 'job-ext-1')
+        job = greenlight.invite_worker(position, WORKER, [], 'job-ext-1')
+
+    assert len(server.store.records['job']) == 1
+    assert server.store.get('job', job['id'])['ext_id'] == 'job-ext-1'
+    assert len(server.store.find('address', ref_type='contractor')) == 1
+
+
+def test_async_timesheet_resumes(server, job_id):
+    async def run():
+        checkpoints = Checkpoints()
+        server.fail_next('POST', '/shift', status=500)
+        async with AsyncGreenLight('standin', 'standin-key', base_url=server.base_url, checkpoints=checkpoints) as greenlight:
+            with pytest.raises(LineItemUploadError):
+                await greenlight.create_timesheet_with_shifts_expenses(shifts_expenses(job_id, 10, expenses=1), 'ts-3', max_concurrency=4)
+            return await greenlight.create_timesheet_with_shifts_expenses(shifts_expenses(job_id, 10, expenses=1), 'ts-3', max_concurrency=4)
+
+    timesheet_id = asyncio.run(run())
+    assert len(server.store.records['timesheet']) == 1
+    assert len(server.store.find('shift', timesheet_id=timesheet_id)) == 10
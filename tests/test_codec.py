@@ -0,0 +1,51 @@
+import dataclasses
+import datetime
+import math
+
+import pytest
+
+from greenlight.codec import JsonCodec, OrjsonCodec, orjson
+
+CODECS = [JsonCodec] + ([OrjsonCodec] if orjson is not None else [])
+BODIES = [
+    {'rate': 12.5, 'minutes': 480, 'end_date': None, 'projects': [{'rate': 1e-3}, {'rate': None}]},
+    [None, 'ünïcödé', 2 ** 40, -0.0, True],
+    {'nested': {'deeper': [[1.5, None], {'x': 'y'}]}},
+]
+NON_FINITE = [
+    {'rate': math.nan},
+    {'rate': math.inf, 'end_date': None},
+    [None, {'projects': [{'rate': -math.inf}]}],
+    ({'amount': 1.0}, float('nan')),
+]
+
+
+@pytest.mark.parametrize('codec', CODECS)
+@pytest.mark.parametrize('body', BODIES)
+def test_round_trip(codec, body):
+    assert codec().loads(codec().dumps(body)) == JsonCodec().loads(JsonCodec().dumps(body))
+
+
+@pytest.mark.parametrize('codec', CODECS)
+@pytest.mark.parametrize('body', NON_FINITE)
+def test_non_finite_floats_are_refused(codec, body):
+    with pytest.raises(ValueError):
+        codec().dumps(body)
+
+
+def test_default_codec_does_not_depend_on_what_is_installed(greenlight):
+    assert type(greenlight.codec) is JsonCodec
+
+
+@dataclasses.dataclass
+class Shift:
+    minutes: int
+
+
+@pytest.mark.skipif(orjson is None, reason='orjson is not installed')
+@pytest.mark.parametrize('value', [datetime.date(2020, 1, 6), Shift(60), object()])
+def test_orjson_refuses_what_json_refuses(value):
+    with pytest.raises(TypeError):
+        JsonCodec().dumps({'value': value})
+    with pytest.raises(TypeError):
+        OrjsonCodec().dumps({'value': value})
@@ -0,0 +1,70 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from greenlight.bulk import group_timesheets
+from greenlight.columnar import group_timesheet_columns, week_endings
+from greenlight.common import calculate_period_ending
+
+OFFSETS = ['-08:00', '-05:00', '+00:00', '+05:30', '+13:00']
+
+
+def random_records(seed, count = 3000):
+    rng = random.Random(seed)
+    def day():
+        # around the new year, so weeks cross years and Sundays at both ends of the day are common
+        return (date(2019, 12, 20) + timedelta(rng.randrange(40))).isoformat()
+    records = []
+    for _ in range(count):
+        job_id = f'job-{rng.randrange(15)}'
+        type = rng.choice(['shift', 'shift', 'shift', 'expense', 'deliverable'])
+        if type == 'shift':
+            record = {'job_id': job_id, 'time_in': f'{day()}T{rng.randrange(24):02d}:{rng.randrange(60):02d}:00{rng.choice(OFFSETS)}', 'minutes': rng.randrange(1, 600)}
+        elif type == 'expense':
+            record = {'job_id': job_id, 'expense_date': day(), 'amount': rng.randrange(1, 100)}
+        else:
+            record = {'job_id': job_id, 'date': day(), 'description': 'Deliverable'}
+        records.append((type, record))
+    return records
+
+
+def columns(records):
+    names = sorted({name for record in records for name in record})
+    return {name: [record.get(name) for record in records] for name in names}
+
+
+def period_ending(group):
+    if group['kind'] == 'deliverables': return calculate_period_ending(deliverables=group['deliverables'])
+    return calculate_period_ending(shifts=group['shifts']) if group['shifts'] else None
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_matches_row_by_row_grouping(seed):
+    records = random_records(seed)
+    by_type = {type: [record for record_type, record in records if record_type == type] for type in ('shift', 'expense', 'deliverable')}
+
+    groups = group_timesheet_columns(shifts=columns(by_type['shift']), expenses=columns(by_type['expense']), deliverables=columns(by_type['deliverable']))
+
+    expected = list(group_timesheets([dict(record, type=type) for type, record in records], partitions=4))
+    for group in expected: group['period_ending'] = period_ending(group)
+    expected.sort(key=lambda group: (group['job_id'], group['kind'] == 'deliverables', group['week_ending']))
+    assert groups == expected
+
+
+def test_period_ending_matches_calculate_period_ending():
+    records = random_records(4)
+    shifts = [record for type, record in records if type == 'shift']
+    for group in group_timesheet_columns(shifts=columns(shifts)):
+        assert group['period_ending'] == calculate_period_ending(shifts=group['shifts'])
+        # every shift falls in the week its timesheet ends
+        assert all(0 <= (date.fromisoformat(group['week_ending']) - date.fromisoformat(shift['time_in'][:10])).days < 7 for shift in group['shifts'])
+
+
+def test_week_endings():
+    days = [(date(2020, 1, 1) + timedelta(i)).isoformat() for i in range(30)]
+    expected = [date.fromisoformat(day) + timedelta(6 - date.fromisoformat(day).weekday()) for day in days]
+    assert [week.item() for week in week_endings(days)] == expected
+    assert [week.item() for week in week_endings(np.array(days, dtype='datetime64[D]'))] == expected
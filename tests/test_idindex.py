@@ -0,0 +1,71 @@
+from greenlight import GreenLight, IdIndex
+
+
+def tag_job(server, job_id, ext_id):
+    server.store.records['job'][job_id].update(ext_id_scope='standin', ext_id=ext_id)
+
+
+def count_requests(server, fn):
+    requests_before = server.requests
+    result = fn()
+    return result, server.requests - requests_before
+
+
+def test_index_is_opt_in(greenlight):
+    assert greenlight.id_index is None
+    assert 'id_index' not in greenlight.stats()
+
+
+def test_resolve_id_skips_the_lookup_once_indexed(server, job_id):
+    tag_job(server, job_id, 'job-ext-1')
+    with GreenLight('standin', 'standin-key', base_url=server.base_url, id_index=IdIndex()) as greenlight:
+        greenlight.load_profile()
+        assert count_requests(server, lambda: greenlight.resolve_id('job', 'job-ext-1', 'standin')) == (job_id, 1)
+        assert count_requests(server, lambda: greenlight.resolve_id('job', 'job-ext-1', 'standin')) == (job_id, 0)
+
+
+def test_background_check_status_saves_the_job_lookup(server, job_id):
+    tag_job(server, job_id, 'job-ext-1')
+    with GreenLight('standin', 'standin-key', base_url=server.base_url) as greenlight:
+        greenlight.load_profile()
+        # without the index: get_job for the GreenLight id, then the extended job
+        assert count_requests(server, lambda: greenlight.get_background_check_status('job-ext-1', 'standin')) == ('not_started', 2)
+
+    with GreenLight('standin', 'standin-key', base_url=server.base_url, id_index=IdIndex()) as greenlight:
+        greenlight.load_profile()
+        greenlight.get_client_active_jobs(server.store.records['job'][job_id]['client_id'])
+        assert count_requests(server, lambda: greenlight.get_background_check_status('job-ext-1', 'standin')) == ('not_started', 1)
+
+
+def test_stale_id_is_resolved_again(server, job_id):
+    tag_job(server, job_id, 'job-ext-1')
+    with GreenLight('standin', 'standin-key', base_url=server.base_url, id_index=IdIndex()) as greenlight:
+        greenlight.resolve_id('job', 'job-ext-1', 'standin')
+        # the ext_id moves to another job
+        tag_job(server, job_id, 'renamed')
+        other = server.store.create('job', dict(server.store.records['job'][job_id], ext_id='job-ext-1'))
+        server.store.records['job'][other['id']]['onboarding'] = {'w2_path': {'background_check': 'passed'}}
+
+        assert greenlight.get_background_check_status('job-ext-1', 'standin') == 'passed'
+        assert greenlight.id_index.get('job', 'standin', 'job-ext-1') == other['id']
+
+
+def test_persisted_index_survives_the_process(server, tmp_path):
+    server.store.seed(clients=3, jobs_per_client=0)
+    path = str(tmp_path / 'ids.sqlite')
+    with GreenLight('standin', 'standin-key', base_url=server.base_url, id_index=IdIndex(path)) as greenlight:
+        clients = list(greenlight.iter_admin_clients())
+    greenlight.id_index.close()
+
+    index = IdIndex(path)
+    assert [index.get('client', 'standin', client['ext_id']) for client in clients] == [client['id'] for client in clients]
+
+
+def test_index_is_bounded():
+    index = IdIndex(maxsize=2)
+    for i in range(3):
+        index.put('job', 'scope', f'job-{i}', f'id-{i}')
+
+    assert index.get('job', 'scope', 'job-0') is None
+    assert index.get('job', 'scope', 'job-2') == 'id-2'
+    assert index.stats()['evictions'] == 1
@@ -0,0 +1,35 @@
+import pytest
+
+from greenlight import GreenLight
+
+from conftest import WORKER
+
+@pytest.mark.parametrize('invite_response', ['id', 'partial', 'job'])
+def test_invite_keeps_the_full_job_record(server, position, invite_response):
+    server.invite_response = invite_response
+    with GreenLight('standin', 'standin-key', base_url=server.base_url) as greenlight:
+        greenlight.load_profile()
+        requests_before = server.requests
+        job = greenlight.invite_worker(position, WORKER, [], 'job-ext-1')
+        requests = server.requests - requests_before
+
+    stored = server.store.get('job', job['id'])
+    assert stored['ext_id'] == 'job-ext-1'
+    # the PUT wrote back the whole record, not just the invite response
+    for field in ('position_id', 'client_id', 'contractor_id', 'status', 'first_name', 'email'):
+        assert stored[field] is not None
+        assert job[field] == stored[field]
+    assert server.store.find('address', ref_type='contractor', ref_id=stored['contractor_id'])
+    # invite, job fetch (unless the response is the job), update, address
+    assert requests == (3 if invite_response == 'job' else 4)
+
+
+def test_invite_workers_reports_each_worker(server, position):
+    server.invite_response = 'partial'
+    workers = [dict(WORKER, worker=dict(WORKER['worker'], email=f'worker{i}@example.com')) for i in range(5)]
+    with GreenLight('standin', 'standin-key', base_url=server.base_url) as greenlight:
+        results = greenlight.invite_workers(position, workers, [], [f'job-ext-{i}' for i in range(5)])
+
+    assert [result['status'] for result in results] == ['invited'] * 5
+    assert sorted(job['ext_id'] for job in server.store.records['job'].values()) == [f'job-ext-{i}' for i in range(5)]
+    assert all(result['job']['contractor_id'] and result['job']['position_id'] == position['id'] for result in results)
@@ -0,0 +1,133 @@
+import sqlite3
+
+import pytest
+
+from greenlight import GreenLight, Checkpoints, Journal
+
+from conftest import WORKER, shifts_expenses
+
+
+def test_transient_failure_is_retried_without_a_second_timesheet(server, job_id, tmp_path):
+    journal = Journal(str(tmp_path / 'journal.sqlite'), retry_delay=0)
+    journal.add_timesheet(shifts_expenses(job_id, 10), 'ts-1')
+    server.fail_next('POST', '/shift', status=503)
+    with GreenLight('standin', 'standin-key', base_url=server.base_url, checkpoints=Checkpoints()) as greenlight:
+        # with no retry delay the same flush sends it again
+        assert journal.flush(greenlight) == {'done': 1, 'retrying': 1, 'failed': 0}
+
+    assert journal.entries()[0]['attempts'] == 2
+    timesheet_id = journal.entries()[0]['result']
+    assert list(server.store.records['timesheet']) == [timesheet_id]
+    assert len(server.store.find('shift', timesheet_id=timesheet_id)) == 10
+    assert server.store.get('timesheet', timesheet_id)['status'] == 'submitted'
+
+
+def test_entry_sent_by_a_process_that_died_is_not_sent_twice(server, job_id, tmp_path):
+    path = str(tmp_path / 'journal.sqlite')
+    journal = Journal(path)
+    journal.add_timesheet(shifts_expenses(job_id, 3), 'ts-2')
+    journal.add_timesheet(shifts_expenses(job_id, 3), 'ts-2')
+    journal.close()
+    # the first process claimed the entry and uploaded it, then died before recording the result
+    with sqlite3.connect(path) as db:
+        db.execute("UPDATE journal SET status = 'in_flight', attempts = 1")
+    with GreenLight('standin', 'standin-key', base_url=server.base_url) as greenlight:
+        timesheet_id = greenlight.create_timesheet_with_shifts_expenses(shifts_expenses(job_id, 3), 'ts-2')
+
+        journal = Journal(path)
+        assert journal.flush(greenlight) == {'done': 1, 'retrying': 0, 'failed': 0}
+
+    assert journal.entries()[0]['result'] == timesheet_id
+    assert len(server.store.records['timesheet']) == 1
+    assert len(server.store.records['shift']) == 3
+
+
+def test_interrupted_upload_without_checkpoints_fails_instead_of_duplicating(server, job_id, tmp_path):
+    journal = Journal(str(tmp_path / 'journal.sqlite'), retry_delay=0)
+    journal.add_timesheet(shifts_expenses(job_id, 3), 'ts-3')
+    server.fail_next('POST', '/shift', status=503)
+    with GreenLight('standin', 'standin-key', base_url=server.base_url) as greenlight:
+        assert journal.flush(greenlight) == {'done': 0, 'retrying': 1, 'failed': 1}
+
+    assert 'draft' in journal.entries('failed')[0]['error']
+    assert len(server.store.records['timesheet']) == 1
+
+
+def test_invite_retried_after_a_failed_update_creates_one_job(server, position, tmp_path):
+    journal = Journal(str(tmp_path / 'journal.sqlite'), retry_delay=0)
+    journal.add_invite(position, WORKER, [], 'job-ext-1')
+    jobs_before = len(server.store.records['job'])
+    server.fail_next('PUT', '/job/', status=503)
+    with GreenLight('standin', 'standin-key', base_url=server.base_url, checkpoints=Checkpoints()) as greenlight:
+        assert journal.flush(greenlight) == {'done': 1, 'retrying': 1, 'failed': 0}
+
+    assert len(server.store.records['job']) == jobs_before + 1
+    job = server.store.get('job', journal.entries()[0]['result'])
+    assert job['ext_id'] == 'job-ext-1'
+    assert server.store.find('address', ref_type='contractor', ref_id=job['contractor_id'])
+
+
+def test_interrupted_invite_without_checkpoints_fails_instead_of_duplicating(server, position, tmp_path):
+    journal = Journal(str(tmp_path / 'journal.sqlite'), retry_delay=0)
+    journal.add_invite(position, WORKER, [], 'job-ext-2')
+    jobs_before = len(server.store.records['job'])
+    server.fail_next('PUT', '/job/', status=503)
+    with GreenLight('standin', 'standin-key', base_url=server.base_url) as greenlight:
+        assert journal.flush(greenlight) == {'done': 0, 'retrying': 0, 'failed': 1}
+
+    assert 'checkpoints' in journal.entries('failed')[0]['error']
+    assert len(server.store.records['job']) == jobs_before + 1
+
+
+def test_invite_found_by_ext_id_is_not_done_while_its_address_is_unconfirmed(server, position, tmp_path):
+    path = str(tmp_path / 'journal.sqlite')
+    journal = Journal(path)
+    journal.add_invite(position, WORKER, [], 'job-ext-3')
+    journal.close()
+    with sqlite3.connect(path) as db:
+        db.execute("UPDATE journal SET status = 'in_flight', attempts = 1")
+    # the first process got as far as the ext_id, then died before saving the address
+    server.fail_next('POST', '/address', status=400)
+    with GreenLight('standin', 'standin-key', base_url=server.base_url) as greenlight:
+        try:
+            greenlight.invite_worker(position, WORKER, [], 'job-ext-3')
+        except Exception:
+            pass
+        jobs_before = len(server.store.records['job'])
+
+        journal = Journal(path)
+        assert journal.flush(greenlight) == {'done': 0, 'retrying': 0, 'failed': 1}
+
+    assert 'address' in journal.entries('failed')[0]['error']
+    assert len(server.store.records['job']) == jobs_before
+
+
+def test_unapproved_timesheet_found_by_ext_id_fails_the_entry(server, job_id, tmp_path):
+    path = str(tmp_path / 'journal.sqlite')
+    journal = Journal(path)
+    journal.add_timesheet(shifts_expenses(job_id, 3), 'ts-4', approve=True)
+    journal.close()
+    with sqlite3.connect(path) as db:
+        db.execute("UPDATE journal SET status = 'in_flight', attempts = 1")
+    with GreenLight('standin', 'standin-key', base_url=server.base_url) as greenlight:
+        # the first process died between submitting and approving
+        greenlight.create_timesheet_with_shifts_expenses(shifts_expenses(job_id, 3), 'ts-4', approve=False)
+
+        journal = Journal(path)
+        assert journal.flush(greenlight) == {'done': 0, 'retrying': 0, 'failed': 1}
+
+    assert 'not approved' in journal.entries('failed')[0]['error']
+    assert len(server.store.records['timesheet']) == 1
+
+
+def test_journal_is_open_in_one_place_at_a_time(job_id, tmp_path):
+    path = str(tmp_path / 'journal.sqlite')
+    journal = Journal(path)
+    journal.add_timesheet(shifts_expenses(job_id, 3), 'ts-5')
+    # a second opener would send the first one's entries in flight again
+    with pytest.raises(ValueError, match='open'):
+        Journal(path)
+    assert journal.stats()['pending'] == 1
+
+    journal.close()
+    assert Journal(path).stats()['pending'] == 1
@@ -0,0 +1,36 @@
+import time
+
+from greenlight import GreenLight, Mirror, ConditionalCache
+
+
+def test_changes_made_elsewhere_are_seen_after_max_age(server):
+    server.store.seed(clients=2, jobs_per_client=2)
+    mirror = Mirror(max_age=0.2)
+    with GreenLight('standin', 'standin-key', base_url=server.base_url, mirror=mirror) as greenlight:
+        mirror.sync(greenlight)
+        job = server.store.find('job')[0]
+        # another writer renames a job
+        server.store.update('job', job['id'], dict(job, title='Renamed'))
+
+        assert mirror.sync(greenlight)['job_lists'] == 0
+        assert mirror.get('job', job['id'])['title'] != 'Renamed'
+
+        time.sleep(0.3)
+        assert mirror.sync(greenlight)['job_lists'] == 2
+        assert mirror.get('job', job['id'])['title'] == 'Renamed'
+
+
+def test_refreshes_of_unchanged_lists_are_revalidated(server):
+    server.store.seed(clients=2, jobs_per_client=2)
+    mirror, cache = Mirror(max_age=0), ConditionalCache()
+    with GreenLight('standin', 'standin-key', base_url=server.base_url, mirror=mirror, conditional_cache=cache) as greenlight:
+        first = mirror.sync(greenlight)
+        second = mirror.sync(greenlight)
+
+    assert second['job_lists'] == first['job_lists'] == 2
+    # the client list, 2 job lists and 4 project lists, all answered 304
+    assert cache.stats()['revalidated'] == 1 + 2 + 4
+
+
+def test_default_max_age_is_finite():
+    assert Mirror().max_age is not None
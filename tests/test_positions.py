@@ -0,0 +1,37 @@
+import asyncio
+from datetime import date
+
+from greenlight import GreenLight, AsyncGreenLight
+
+ANSWERS = [{'question_id': 'question-1', 'answer': True}]
+
+
+def new_positions(client_id, count):
+    return [{'client_id': client_id, 'title': f'Position {i}', 'start_date': date(2020, 1, 6)} for i in range(count)]
+
+
+def check_created(server, results):
+    assert [result['status'] for result in results] == ['created'] * len(results)
+    for result in results:
+        stored = server.store.get('position', result['id'])
+        # the answers PUT keeps the fields the server set on create and approve
+        assert stored['status'] == 'approved'
+        assert stored['classify_client_result'] == 'w2-or-ic'
+        assert stored['classify_client_answers'] == {'answers': ANSWERS}
+
+
+def test_create_positions_with_answers(server):
+    server.store.seed(clients=1, jobs_per_client=0)
+    client_id = server.store.find('client')[0]['id']
+    with GreenLight('standin', 'standin-key', base_url=server.base_url) as greenlight:
+        results = greenlight.create_positions(new_positions(client_id, 4), [f'pos-{i}' for i in range(4)], [ANSWERS] * 4)
+    check_created(server, results)
+
+
+def test_async_create_positions_with_answers(server):
+    server.store.seed(clients=1, jobs_per_client=0)
+    client_id = server.store.find('client')[0]['id']
+    async def run():
+        async with AsyncGreenLight('standin', 'standin-key', base_url=server.base_url) as greenlight:
+            return await greenlight.create_positions(new_positions(client_id, 4), [f'pos-{i}' for i in range(4)], [ANSWERS] * 4)
+    check_created(server, asyncio.run(run()))
@@ -0,0 +1,60 @@
+import asyncio
+import json
+
+import pytest
+
+from greenlight import GreenLight, AsyncGreenLight
+
+
+def test_construction_makes_no_requests(server):
+    with GreenLight('standin', 'standin-key', base_url=server.base_url):
+        pass
+    asyncio.run(AsyncGreenLight('standin', 'standin-key', base_url=server.base_url).close())
+
+    assert server.requests == 0
+
+
+def test_profile_is_loaded_once_when_first_needed(server, greenlight):
+    assert server.requests == 0
+    assert greenlight.role_type() == 'admin'
+    requests = server.requests
+    assert requests > 0
+
+    greenlight.scope()
+    greenlight.admin
+    assert server.requests == requests
+
+
+def test_snapshot_round_trips_without_requests(server, greenlight):
+    # the snapshot is plain JSON
+    snapshot = json.loads(json.dumps(greenlight.export_profile()))
+    requests = server.requests
+
+    with GreenLight('standin', 'standin-key', base_url=server.base_url, profile_snapshot=snapshot) as restored:
+        assert restored.export_profile() == snapshot
+        assert (restored.role_type(), restored.scope(), restored.admin) == (greenlight.role_type(), greenlight.scope(), greenlight.admin)
+    assert server.requests == requests
+
+
+def test_async_client_takes_the_same_snapshot(server, greenlight):
+    snapshot = greenlight.export_profile()
+    requests = server.requests
+
+    async def run():
+        async with AsyncGreenLight('standin', 'standin-key', base_url=server.base_url, profile_snapshot=snapshot) as restored:
+            return restored.scope()
+
+    assert asyncio.run(run()) == greenlight.scope()
+    assert server.requests == requests
+
+
+def test_snapshot_from_another_version_is_refused(server, greenlight):
+    snapshot = dict(greenlight.export_profile(), version=0)
+    with pytest.raises(ValueError, match='version'):
+        GreenLight('standin', 'standin-key', base_url=server.base_url, profile_snapshot=snapshot)
+
+
+def test_snapshot_from_another_stage_is_refused(server, greenlight):
+    snapshot = greenlight.export_profile()
+    with pytest.raises(ValueError, match='stage standin'):
+        GreenLight('production', 'standin-key', base_url=server.base_url, profile_snapshot=snapshot)
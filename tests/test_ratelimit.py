@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+import requests
+import aiohttp
+
+from greenlight import GreenLight, AsyncGreenLight, RateController
+
+
+def rate_controller(**kwargs):
+    return RateController(rate=1000, max_retries=1, backoff_base=0.01, **kwargs)
+
+
+def test_truncated_body_releases_its_slot(server):
+    controller = rate_controller(concurrency=1)
+    with GreenLight('standin', 'standin-key', base_url=server.base_url, rate_controller=controller) as greenlight:
+        server.truncate_rate = 1.0
+        with pytest.raises(requests.RequestException):
+            greenlight.get_admin('admin-1')
+        assert controller.stats()['in_flight'] == 0
+        assert controller.stats()['retries'] == 1
+
+        server.truncate_rate = 0.0
+        assert greenlight.get_admin('admin-1')['id'] == 'admin-1'
+        assert controller.stats()['in_flight'] == 0
+
+
+def test_truncated_body_is_retried(server):
+    controller = RateController(rate=1000, backoff_base=0.01)
+    with GreenLight('standin', 'standin-key', base_url=server.base_url, rate_controller=controller) as greenlight:
+        greenlight.load_profile()
+        for _ in range(10):
+            server.truncate_next()
+            assert greenlight.get_admin('admin-1')['id'] == 'admin-1'
+    assert controller.stats()['retries'] == 10
+    assert controller.stats()['in_flight'] == 0
+
+
+def test_async_truncated_body_releases_its_slot(server):
+    async def run():
+        controller = rate_controller(concurrency=1)
+        async with AsyncGreenLight('standin', 'standin-key', base_url=server.base_url, rate_controller=controller) as greenlight:
+            server.truncate_rate = 1.0
+            with pytest.raises(aiohttp.ClientError):
+                await greenlight.get_admin('admin-1')
+            with pytest.raises(aiohttp.ClientError):
+                await greenlight.get_admin_clients()
+            assert controller.stats()['in_flight'] == 0
+
+            server.truncate_rate = 0.0
+            assert (await greenlight.get_admin('admin-1'))['id'] == 'admin-1'
+            assert controller.stats()['in_flight'] == 0
+
+    asyncio.run(run())
+
+
+def test_cancelled_requests_release_their_slots(server):
+    async def run():
+        controller = rate_controller(concurrency=2)
+        async with AsyncGreenLight('standin', 'standin-key', base_url=server.base_url, rate_controller=controller) as greenlight:
+            server.latency = 0.5
+            for _ in range(2):
+                with pytest.raises(asyncio.TimeoutError):
+                    await asyncio.wait_for(greenlight.get_admin('admin-1'), 0.05)
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(greenlight.get_admin_clients(), 0.05)
+            assert controller.stats()['in_flight'] == 0
+            # a cancelled request says nothing about the server, so it does not shrink the window
+            assert controller.stats()['concurrency'] == 2
+
+            server.latency = 0.0
+            assert (await asyncio.wait_for(greenlight.get_admin('admin-1'), 5))['id'] == 'admin-1'
+
+    asyncio.run(run())
@@ -0,0 +1,109 @@
+import asyncio
+import threading
+
+import pytest
+
+from greenlight import GreenLight, AsyncGreenLight, GreenLightHTTPError, SingleFlight
+
+
+def run_threads(count, fn):
+    results = [None] * count
+    def run(i):
+        try:
+            results[i] = fn()
+        except Exception as err:
+            results[i] = err
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    return results
+
+
+def test_concurrent_gets_share_one_request(server):
+    server.latency = 0.1
+    single_flight = SingleFlight()
+    with GreenLight('standin', 'standin-key', base_url=server.base_url, single_flight=single_flight, pool_maxsize=20) as greenlight:
+        requests_before = server.requests
+        results = run_threads(20, lambda: greenlight.get_admin('admin-1'))
+
+    assert all(result == results[0] for result in results)
+    assert server.requests - requests_before == 1
+    assert single_flight.stats()['coalesced'] == 19
+
+
+def test_errors_are_shared(server):
+    server.latency = 0.1
+    single_flight = SingleFlight()
+    with GreenLight('standin', 'standin-key', base_url=server.base_url, single_flight=single_flight, pool_maxsize=20) as greenlight:
+        requests_before = server.requests
+        results = run_threads(10, lambda: greenlight.get_admin('missing'))
+
+    assert all(isinstance(result, GreenLightHTTPError) and result.status_code == 404 for result in results)
+    assert server.requests - requests_before == 1
+    assert single_flight.stats()['in_flight'] == 0
+
+
+def test_async_errors_are_shared(server):
+    async def run():
+        async with AsyncGreenLight('standin', 'standin-key', base_url=server.base_url, single_flight=SingleFlight()) as greenlight:
+            server.latency = 0.1
+            requests_before = server.requests
+            results = await asyncio.gather(*[greenlight.get_admin('missing') for _ in range(10)], return_exceptions=True)
+            return results, server.requests - requests_before
+
+    results, requests = asyncio.run(run())
+    assert all(isinstance(result, GreenLightHTTPError) and result.status_code == 404 for result in results)
+    assert requests == 1
+
+
+def test_cancelled_leader_does_not_fail_followers(server):
+    async def run():
+        async with AsyncGreenLight('standin', 'standin-key', base_url=server.base_url, single_flight=SingleFlight()) as greenlight:
+            server.latency = 0.1
+            leader = asyncio.ensure_future(greenlight.get_admin('admin-1'))
+            await asyncio.sleep(0.01)
+            follower = asyncio.ensure_future(greenlight.get_admin('admin-1'))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await leader
+            return await follower
+
+    assert asyncio.run(run())['id'] == 'admin-1'
+
+
+def test_request_inside_a_streamed_loop_does_not_wait_on_the_stream(server, job_id):
+    # job_id seeds a client, so the loop body runs
+    results = []
+    def run():
+        with GreenLight('standin', 'standin-key', base_url=server.base_url, single_flight=SingleFlight()) as greenlight:
+            for client in greenlight.iter_admin_clients():
+                results.append(greenlight.get_admin_clients())
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(10)
+
+    assert not thread.is_alive()
+    assert results and all(len(clients) == len(results) for clients in results)
+
+
+def test_async_request_inside_a_streamed_loop_does_not_wait_on_the_stream(server, job_id):
+    async def run():
+        async with AsyncGreenLight('standin', 'standin-key', base_url=server.base_url, single_flight=SingleFlight()) as greenlight:
+            return [await greenlight.get_admin_clients() async for client in greenlight.iter_admin_clients()]
+
+    results = asyncio.run(asyncio.wait_for(run(), 10))
+    assert results and all(len(clients) == len(results) for clients in results)
+
+
+def test_concurrent_list_reads_share_one_request(server):
+    server.latency = 0.1
+    single_flight = SingleFlight()
+    with GreenLight('standin', 'standin-key', base_url=server.base_url, single_flight=single_flight, pool_maxsize=10) as greenlight:
+        greenlight.load_profile()
+        requests_before = server.requests
+        results = run_threads(10, lambda: greenlight.get_questions_for_client('p'))
+
+    assert all(result == results[0] for result in results)
+    assert server.requests - requests_before == 1
+    assert single_flight.stats()['coalesced'] == 9
@@ -0,0 +1,56 @@
+import json
+import random
+
+import pytest
+
+from greenlight.streaming import JsonArrayParser, iter_json_array
+
+ARRAYS = [
+    [],
+    [1, -2.5, 3e10, 0, 12345678901234567890, -0.001],
+    ['', 'plain', 'quote " and \\ backslash', 'ünïcödé', '日本語', '😀 emoji', ' '],
+    [None, True, False, [], {}, [[]], {'a': {'b': [1, {'c': None}]}}],
+    [{'id': f'job-{i}', 'title': f'Title {i} é', 'rate': i * 1.25, 'projects': [{'rate': i}] * (i % 3)} for i in range(50)],
+]
+
+
+def split(data, cuts):
+    cuts = sorted(set(cuts))
+    return [data[start:end] for start, end in zip([0] + cuts, cuts + [len(data)])]
+
+
+@pytest.mark.parametrize('array', ARRAYS)
+@pytest.mark.parametrize('indent', [None, 2])
+def test_every_two_way_split(array, indent):
+    data = json.dumps(array, indent=indent, ensure_ascii=False).encode()
+    for cut in range(len(data) + 1):
+        assert list(iter_json_array(split(data, [cut]))) == array
+
+
+@pytest.mark.parametrize('array', ARRAYS)
+def test_random_splits(array):
+    rng = random.Random(42)
+    data = json.dumps(array, ensure_ascii=False).encode()
+    for _ in range(200):
+        cuts = [rng.randrange(len(data) + 1) for _ in range(rng.randrange(1, 12))]
+        assert list(iter_json_array(split(data, cuts))) == array
+
+
+def test_byte_at_a_time():
+    array = ARRAYS[-1]
+    data = json.dumps(array, ensure_ascii=False).encode()
+    assert list(iter_json_array(data[i:i + 1] for i in range(len(data)))) == array
+
+
+def test_elements_are_returned_as_they_complete():
+    parser = JsonArrayParser()
+    assert parser.feed(b'[{"a": 1}, {"b"') == [{'a': 1}]
+    assert parser.feed(b': 2}, 3') == [{'b': 2}]
+    assert parser.feed(b'4]') == [34]
+    assert parser.close() == []
+
+
+@pytest.mark.parametrize('data', [b'[1, 2', b'[{"a": 1}', b'{"a": 1}', b'[1, tru'])
+def test_malformed_input_raises(data):
+    with pytest.raises(ValueError):
+        list(iter_json_array([data]))
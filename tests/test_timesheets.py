@@ -0,0 +1,24 @@
+import pytest
+
+from greenlight import LineItemUploadError
+
+from conftest import shifts_expenses
+
+
+def test_concurrent_upload_reports_exactly_the_failed_line_items(server, greenlight, job_id):
+    server.fail_next('POST', '/shift', count=3, status=503)
+    with pytest.raises(LineItemUploadError) as raised:
+        greenlight.create_timesheet_with_shifts_expenses(shifts_expenses(job_id, 20, expenses=1), 'ts-1', max_concurrency=4)
+
+    failures = raised.value.failures
+    assert len(failures) == 3
+    assert all(failure['type'] == 'shift' and failure['error'].status_code == 503 for failure in failures)
+    # each failure names the shift by its index in the list passed in; minutes are index + 1
+    assert all(failure['item']['minutes'] == failure['index'] + 1 for failure in failures)
+    stored = {shift['minutes'] - 1 for shift in server.store.records['shift'].values()}
+    assert stored == set(range(20)) - {failure['index'] for failure in failures}
+    assert len(server.store.records['expense']) == 1
+
+    timesheet = server.store.get('timesheet', raised.value.timesheet_id)
+    assert timesheet['status'] == 'draft'
+    assert str(raised.value).startswith(f"3 line items failed to upload to timesheet {timesheet['id']}")